@@ -0,0 +1,293 @@
+"""
+Архивирование старых заказов с листа "Заказы" на помесячные листы архива.
+
+Чтение листа (get_all_values) и форматирование столбцов выполняются каждый цикл
+и дорожают пропорционально числу строк. Заказы с датой производства старше
+horizon_days переносятся на листы "Архив ГГГГ-ММ" той же таблицы, поэтому
+рабочий лист остается ограниченного размера, и цикл синхронизации обрабатывает
+только его.
+
+Перенос выполняется пакетами по batch_rows строк. Каждый пакет - один вызов
+spreadsheets:batchUpdate: создание недостающих листов архива (с копией строки
+заголовков), копирование строк (copyPaste - значения, форматы и формулы без
+передачи данных через клиент) и удаление перенесенных строк с рабочего листа.
+Вызов применяется атомарно, поэтому строка не может оказаться сразу на двух
+листах или потеряться.
+
+Размеры листов берутся из метаданных таблицы, прочитанных перед сборкой пакета, а не
+из кэша открытого листа (столбцы могли быть добавлены после его открытия). Номера строк
+вычисляются по снимку листа, поэтому перед отправкой пакета столбец с номером заказа
+читается заново: если синхронизация успела изменить лист (например, добавить строки),
+пакет не отправляется и собирается заново по новому снимку.
+
+Заказы на листах архива синхронизацией больше не обновляются.
+
+Пример:
+    python archive.py --horizon-days 90 --dry-run
+"""
+import argparse
+import logging
+import sys
+from datetime import date, datetime, timedelta
+from gspread.utils import absolute_range_name
+from config import ARCHIVE_CONFIG
+from google_sheets import (col_idx_to_letter, get_sheets_targets, load_orders_snapshot, reset_sheets_cache,
+                           snapshot_cell_value)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def archive_worksheet_name(proddate: date) -> str:
+    """Возвращает название листа архива для месяца даты производства."""
+    return ARCHIVE_CONFIG['worksheet_name_template'].format(year=proddate.year, month=proddate.month)
+
+
+def _parse_proddate(value) -> date | None:
+    """Разбирает дату производства из ячейки листа (ДД.ММ.ГГГГ)."""
+    try:
+        return datetime.strptime(str(value).strip(), '%d.%m.%Y').date()
+    except ValueError:
+        return None
+
+
+def select_rows_to_archive(snapshot: dict, horizon: date, batch_rows: int) -> list[tuple[int, date]]:
+    """
+    Выбирает строки рабочего листа с датой производства раньше horizon.
+
+    Args:
+        snapshot: Снимок листа из load_orders_snapshot.
+        horizon: Граница: заказы с датой производства раньше нее переносятся в архив.
+        batch_rows: Максимальное число строк в пакете.
+
+    Returns:
+        Список (номер строки, дата производства) самых старых заказов, не более batch_rows.
+    """
+    proddate_col = snapshot['columns']['PRODDATE']
+    candidates = []
+    for row_number in snapshot['order_to_row_map'].values():
+        proddate = _parse_proddate(snapshot_cell_value(snapshot, row_number, proddate_col))
+        if proddate is not None and proddate < horizon:
+            candidates.append((proddate, row_number))
+
+    candidates.sort()
+    return [(row_number, proddate) for proddate, row_number in candidates[:batch_rows]]
+
+
+def _contiguous_runs(row_numbers: list[int]) -> list[tuple[int, int]]:
+    """Объединяет отсортированные номера строк в непрерывные диапазоны (первая, последняя)."""
+    runs = []
+    for row_number in row_numbers:
+        if runs and runs[-1][1] == row_number - 1:
+            runs[-1] = (runs[-1][0], row_number)
+        else:
+            runs.append((row_number, row_number))
+    return runs
+
+
+def _archive_used_rows(spreadsheet, titles: list[str], order_col_idx: int) -> dict[str, int]:
+    """
+    Возвращает число занятых строк на существующих листах архива (по столбцу с номером заказа).
+    """
+    if not titles:
+        return {}
+    column = col_idx_to_letter(order_col_idx)
+    response = spreadsheet.values_batch_get([absolute_range_name(title, f'{column}:{column}') for title in titles])
+    return {title: len(value_range.get('values', [])) for title, value_range in zip(titles, response['valueRanges'])}
+
+
+def rows_unchanged(snapshot: dict, rows: list[tuple[int, date]]) -> bool:
+    """
+    Перечитывает столбец с номером заказа и проверяет, что выбранные строки по-прежнему
+    содержат те же заказы, что и в снимке (лист не изменился после чтения снимка).
+    """
+    sheet = snapshot['sheet']
+    column = col_idx_to_letter(snapshot['order_col_idx'])
+    response = snapshot['spreadsheet'].values_batch_get([absolute_range_name(sheet.title, f'{column}:{column}')])
+    values = response['valueRanges'][0].get('values', [])
+    row_to_order = {row_number: order_no for order_no, row_number in snapshot['order_to_row_map'].items()}
+    for row_number, _ in rows:
+        cell = values[row_number - 1] if row_number - 1 < len(values) else []
+        if not cell or str(cell[0]).strip() != row_to_order.get(row_number):
+            return False
+    return True
+
+
+def build_archive_requests(snapshot: dict, rows: list[tuple[int, date]]) -> tuple[list[dict], dict[str, int]]:
+    """
+    Формирует запросы spreadsheets:batchUpdate для переноса строк в архив.
+
+    Args:
+        snapshot: Снимок рабочего листа из load_orders_snapshot.
+        rows: Строки для переноса из select_rows_to_archive.
+
+    Returns:
+        Кортеж (запросы, число строк по листам архива).
+    """
+    spreadsheet = snapshot['spreadsheet']
+    sheet = snapshot['sheet']
+
+    # Свежие метаданные листов: размеры открытого листа в кэше могли устареть
+    worksheets = spreadsheet.worksheets()
+    current = next((ws for ws in worksheets if ws.id == sheet.id), sheet)
+    column_count = max(current.col_count, len(snapshot['header']))
+
+    by_archive = {}
+    for row_number, proddate in rows:
+        by_archive.setdefault(archive_worksheet_name(proddate), []).append(row_number)
+
+    existing = {ws.title: ws.id for ws in worksheets}
+    existing_columns = {ws.title: ws.col_count for ws in worksheets}
+    used_rows = _archive_used_rows(spreadsheet, [title for title in by_archive if title in existing],
+                                   snapshot['order_col_idx'])
+    next_sheet_id = max(existing.values(), default=0) + 1
+
+    requests = []
+    for title, row_numbers in sorted(by_archive.items()):
+        row_numbers.sort()
+        if title in existing:
+            archive_id = existing[title]
+            start_index = used_rows.get(title, 0)
+            requests.append({'appendDimension': {'sheetId': archive_id, 'dimension': 'ROWS', 'length': len(row_numbers)}})
+            if existing_columns[title] < column_count:
+                # На рабочий лист добавили столбцы - лист архива расширяется, чтобы копия поместилась
+                requests.append({'appendDimension': {'sheetId': archive_id, 'dimension': 'COLUMNS',
+                                                     'length': column_count - existing_columns[title]}})
+        else:
+            archive_id = next_sheet_id
+            next_sheet_id += 1
+            start_index = 1
+            logging.info(f"Создание листа архива '{title}'...")
+            requests.append({'addSheet': {'properties': {
+                'sheetId': archive_id,
+                'title': title,
+                'gridProperties': {'rowCount': 1 + len(row_numbers), 'columnCount': column_count, 'frozenRowCount': 1}
+            }}})
+            # Строка заголовков копируется с рабочего листа
+            requests.append({'copyPaste': {
+                'source': {'sheetId': sheet.id, 'startRowIndex': 0, 'endRowIndex': 1,
+                           'startColumnIndex': 0, 'endColumnIndex': column_count},
+                'destination': {'sheetId': archive_id, 'startRowIndex': 0, 'endRowIndex': 1,
+                                'startColumnIndex': 0, 'endColumnIndex': column_count},
+                'pasteType': 'PASTE_NORMAL'
+            }})
+
+        for first, last in _contiguous_runs(row_numbers):
+            length = last - first + 1
+            requests.append({'copyPaste': {
+                'source': {'sheetId': sheet.id, 'startRowIndex': first - 1, 'endRowIndex': last,
+                           'startColumnIndex': 0, 'endColumnIndex': column_count},
+                'destination': {'sheetId': archive_id, 'startRowIndex': start_index, 'endRowIndex': start_index + length,
+                                'startColumnIndex': 0, 'endColumnIndex': column_count},
+                'pasteType': 'PASTE_NORMAL'
+            }})
+            start_index += length
+
+    # Удаляем строки снизу вверх, чтобы номера еще не удаленных строк не сдвигались
+    for first, last in reversed(_contiguous_runs(sorted(row_number for row_number, _ in rows))):
+        requests.append({'deleteDimension': {'range': {
+            'sheetId': sheet.id, 'dimension': 'ROWS', 'startIndex': first - 1, 'endIndex': last
+        }}})
+
+    return requests, {title: len(row_numbers) for title, row_numbers in by_archive.items()}
+
+
+def archive_target(target: dict = None, horizon_days: int = None, batch_rows: int = None,
+                   max_batches: int = None, dry_run: bool = False) -> int | None:
+    """
+    Переносит старые заказы рабочего листа цели в помесячные листы архива.
+
+    Args:
+        target: Цель записи из get_sheets_targets (по умолчанию - основная таблица).
+        horizon_days: Заказы с датой производства старше стольких дней переносятся в архив.
+        batch_rows: Максимальное число строк в одном пакете.
+        max_batches: Максимальное число пакетов за запуск.
+        dry_run: Только показать, что будет перенесено.
+
+    Returns:
+        Число перенесенных строк или None в случае ошибки.
+    """
+    horizon = date.today() - timedelta(days=horizon_days or ARCHIVE_CONFIG['horizon_days'])
+    batch_rows = batch_rows or ARCHIVE_CONFIG['batch_rows']
+    max_batches = max_batches or ARCHIVE_CONFIG['max_batches']
+
+    moved = 0
+    try:
+        for _ in range(max_batches):
+            snapshot = load_orders_snapshot(unformatted=True, target=target)
+            if snapshot is None:
+                return None
+            if 'PRODDATE' not in snapshot['columns']:
+                logging.warning(f"На листе цели '{snapshot['target']['name']}' нет даты производства, архивирование пропущено.")
+                return 0
+
+            rows = select_rows_to_archive(snapshot, horizon, batch_rows)
+            if not rows:
+                break
+
+            requests, counts = build_archive_requests(snapshot, rows)
+            summary = ", ".join(f"{title}: {count}" for title, count in sorted(counts.items()))
+            if dry_run:
+                logging.info(f"[dry-run] Будет перенесено строк: {len(rows)} ({summary}), запросов в пакете: {len(requests)}.")
+                return len(rows)
+
+            # Номера строк взяты из снимка: если лист изменился, пакет собирается заново
+            if not rows_unchanged(snapshot, rows):
+                logging.warning(f"Лист '{snapshot['sheet'].title}' изменился во время архивирования, пакет будет собран заново.")
+                continue
+            snapshot['spreadsheet'].batch_update({'requests': requests})
+            moved += len(rows)
+            logging.info(f"Перенесено в архив строк: {len(rows)} ({summary}).")
+
+            if len(rows) < batch_rows:
+                break
+
+    except Exception as e:
+        logging.error(f"Ошибка при архивировании листа 'Заказы': {e}", exc_info=True)
+        reset_sheets_cache()
+        return None
+
+    logging.info(f"Архивирование завершено: перенесено строк {moved}, граница {horizon.strftime('%d.%m.%Y')}.")
+    return moved
+
+
+def archive_all_targets(dry_run: bool = False) -> bool:
+    """
+    Архивирует рабочие листы всех целей записи.
+
+    Returns:
+        True, если архивирование всех целей прошло без ошибок.
+    """
+    ok = True
+    for target in get_sheets_targets():
+        logging.info(f"Архивирование цели '{target['name']}'...")
+        if archive_target(target, dry_run=dry_run) is None:
+            ok = False
+    return ok
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Перенос старых заказов с листа 'Заказы' в помесячный архив.")
+    parser.add_argument('--horizon-days', type=int, default=ARCHIVE_CONFIG['horizon_days'],
+                        help="Переносить заказы с датой производства старше стольких дней.")
+    parser.add_argument('--batch-rows', type=int, default=ARCHIVE_CONFIG['batch_rows'], help="Строк в одном пакете.")
+    parser.add_argument('--max-batches', type=int, default=ARCHIVE_CONFIG['max_batches'], help="Максимум пакетов за запуск.")
+    parser.add_argument('--target', help="Имя цели записи (по умолчанию - все цели).")
+    parser.add_argument('--dry-run', action='store_true', help="Только показать, что будет перенесено.")
+    args = parser.parse_args(argv)
+
+    targets = get_sheets_targets()
+    if args.target:
+        targets = [t for t in targets if t['name'] == args.target]
+        if not targets:
+            parser.error(f"Цель '{args.target}' не найдена.")
+
+    ok = True
+    for target in targets:
+        logging.info(f"Архивирование цели '{target['name']}'...")
+        if archive_target(target, args.horizon_days, args.batch_rows, args.max_batches, args.dry_run) is None:
+            ok = False
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
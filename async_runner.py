@@ -0,0 +1,204 @@
+"""
+Асинхронный режим синхронизации листа "Заказы".
+
+Цикл синхронизации строится на asyncio: запросы к Firebird выполняются параллельно
+в ограниченном пуле потоков (каждый запрос в своем соединении), а чтение листа
+выполняется одновременно с выгрузкой из БД. Запись значений (вместе со временем
+обновления) и форматирование отправляются параллельно, так как не зависят друг от друга.
+Одна выгрузка раскладывается по всем целям записи (см. SHEETS_TARGETS_CONFIG):
+листы целей читаются и записываются параллельно.
+В результате длительность цикла определяется самой медленной зависимостью,
+а не суммой всех шагов.
+
+Пример:
+    python async_runner.py
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from config import (ASYNC_CONFIG, CHANGE_FEED_CONFIG, DAILY_SUMMARY_CONFIG, DEBOUNCE_CONFIG, ORDERS_APPEND_CONFIG,
+                    PRIORITY_LANES_CONFIG, SNAPSHOT_CONFIG, SYNC_WINDOW)
+from change_feed import commit_change_feed, compute_change_feed, records_to_publish
+from daily_summary import publish_daily_summary
+from debounce import coalesce_orders
+from database import extraction_plan, fetch_query_by_order, merge_query_results_by_order
+from snapshots import save_snapshot
+from google_sheets import (append_missing_orders, build_orders_updates, build_orders_write_calls,
+                           execute_orders_value_calls, execute_orders_write_call, get_sheets_targets,
+                           load_orders_snapshot)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+async def extract_orders(start_date: date, end_date: date, executor: ThreadPoolExecutor) -> list[dict] | None:
+    """
+    Выполняет все запросы плана метрик параллельно и объединяет результаты.
+
+    Args:
+        start_date: Начальная дата для выборки.
+        end_date: Конечная дата для выборки.
+        executor: Пул потоков для работы с БД (ограничивает число соединений).
+
+    Returns:
+        Список словарей с данными по заказам или None, если хотя бы один запрос не выполнен.
+    """
+    loop = asyncio.get_running_loop()
+    keys = list(extraction_plan())
+    results = await asyncio.gather(*(
+        loop.run_in_executor(executor, fetch_query_by_order, key, start_date, end_date) for key in keys
+    ))
+
+    if any(result is None for result in results):
+        return None
+
+    data = merge_query_results_by_order(dict(zip(keys, results)))
+    logging.info(f"Получено и объединено данных по {len(data)} заказам.")
+    return data
+
+
+async def write_target(snapshot: dict, data: list[dict], executor: ThreadPoolExecutor) -> tuple[bool, list[str]]:
+    """
+    Записывает данные по заказам на лист одной цели.
+
+    Args:
+        snapshot: Снимок листа цели из load_orders_snapshot.
+        data: Список словарей с данными по заказам.
+        executor: Пул потоков для запросов к Google Sheets API.
+
+    Returns:
+        Кортеж (True, если все вызовы записи выполнены, иначе False; номера заказов,
+        пропущенных из-за отсутствия строки на листе).
+    """
+    loop = asyncio.get_running_loop()
+    name = snapshot['target']['name']
+    if ORDERS_APPEND_CONFIG['enabled']:
+        # Строки новых заказов должны появиться до записи значений
+        try:
+            await loop.run_in_executor(executor, append_missing_orders, data, snapshot)
+        except Exception as e:
+            logging.error(f"Не удалось добавить новые заказы на лист 'Заказы' (цель '{name}'): {e}")
+
+    updates, updated_count, skipped_orders = build_orders_updates(data, snapshot)
+    calls = build_orders_write_calls(snapshot, updates)
+
+    # Вызовы записи значений и форматирования не зависят друг от друга; полосы публикации значений
+    # выполняются по порядку, чтобы при нехватке квоты первыми были записаны приоритетные ячейки
+    if PRIORITY_LANES_CONFIG['enabled']:
+        value_calls = [call for call in calls if call['kind'] == 'values']
+        calls = [call for call in calls if call['kind'] != 'values']
+        writes = [loop.run_in_executor(executor, execute_orders_value_calls, snapshot, value_calls)]
+    else:
+        writes = []
+    writes.extend(loop.run_in_executor(executor, execute_orders_write_call, snapshot, call) for call in calls)
+    results = await asyncio.gather(*writes, return_exceptions=True)
+    errors = [result for result in results if isinstance(result, BaseException) or result is False]
+    for error in errors:
+        if error is not False:
+            logging.error(f"Ошибка при записи на лист 'Заказы' (цель '{name}'): {error}")
+
+    logging.info(f"Цель '{name}': обновлено заказов: {updated_count}, Пропущено: {len(skipped_orders)}, "
+                 f"ошибок записи: {len(errors)}")
+    return not errors, skipped_orders
+
+
+async def run_cycle(start_date: date, end_date: date, db_executor: ThreadPoolExecutor,
+                    sheets_executor: ThreadPoolExecutor) -> bool:
+    """
+    Выполняет один цикл синхронизации листа "Заказы" во всех целях записи.
+
+    Args:
+        start_date: Начальная дата для выборки.
+        end_date: Конечная дата для выборки.
+        db_executor: Пул потоков для запросов к БД.
+        sheets_executor: Пул потоков для запросов к Google Sheets API.
+
+    Returns:
+        True, если данные записаны во все цели, иначе False.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    targets = get_sheets_targets()
+
+    # Чтение листов не зависит от данных из БД, поэтому выполняется одновременно с выгрузкой
+    data, *snapshots = await asyncio.gather(
+        extract_orders(start_date, end_date, db_executor),
+        *(loop.run_in_executor(sheets_executor, load_orders_snapshot, False, target) for target in targets),
+        return_exceptions=True
+    )
+
+    if isinstance(data, BaseException) or data is None:
+        logging.warning(f"Пропускаем обновление основной таблицы (лист 'Заказы'), так как данные из БД не были получены: {data}")
+        return False
+
+    writes = []
+    if SNAPSHOT_CONFIG['enabled']:
+        # Снимок выгрузки сохраняется параллельно с записью в таблицы
+        writes.append(loop.run_in_executor(None, save_snapshot, data))
+    if DAILY_SUMMARY_CONFIG['enabled']:
+        # Сводка "Общий" считается из полной выгрузки и записывается параллельно с листами "Заказы"
+        writes.append(loop.run_in_executor(sheets_executor, publish_daily_summary, data))
+
+    if DEBOUNCE_CONFIG['enabled']:
+        # Заказы, которые сейчас редактируются, публикуются после затишья
+        data, _ = coalesce_orders(data)
+
+    feed = None
+    if CHANGE_FEED_CONFIG['enabled']:
+        # Публикуем только новые и измененные с прошлого цикла заказы
+        feed = compute_change_feed(data)
+        data = records_to_publish(feed, data)
+        if not data:
+            await asyncio.gather(*writes)
+            logging.info(f"Цикл завершен за {time.monotonic() - started:.1f} с. Изменений с прошлого цикла нет, "
+                         f"запись в таблицы пропущена.")
+            return True
+
+    ready = []
+    for target, snapshot in zip(targets, snapshots):
+        if isinstance(snapshot, BaseException) or snapshot is None:
+            logging.error(f"Не удалось прочитать лист 'Заказы' цели '{target['name']}': {snapshot}")
+        else:
+            ready.append(snapshot)
+
+    results = await asyncio.gather(*(write_target(snapshot, data, sheets_executor) for snapshot in ready), *writes)
+    results = results[:len(ready)]
+    ok_count = sum(1 for ok, _ in results if ok)
+    if feed is not None and ok_count == len(targets):
+        commit_change_feed(feed, {order_no for _, skipped_orders in results for order_no in skipped_orders})
+
+    logging.info(f"Цикл завершен за {time.monotonic() - started:.1f} с. "
+                 f"Обновлено целей: {ok_count} из {len(targets)}.")
+    return ok_count == len(targets)
+
+
+async def run_forever(interval_minutes: int = None):
+    """
+    Запускает цикл синхронизации сразу и затем с заданным интервалом.
+    Следующий запуск отсчитывается от начала предыдущего, без опроса расписания каждую секунду.
+    """
+    interval = (interval_minutes or SYNC_WINDOW['interval_minutes']) * 60
+
+    with ThreadPoolExecutor(max_workers=ASYNC_CONFIG['db_workers'], thread_name_prefix='db') as db_executor, \
+            ThreadPoolExecutor(max_workers=ASYNC_CONFIG['sheets_workers'], thread_name_prefix='sheets') as sheets_executor:
+        while True:
+            started = time.monotonic()
+            today = date.today()
+            start_date = today - timedelta(days=SYNC_WINDOW['days_back'])
+            end_date = today + timedelta(days=SYNC_WINDOW['days_ahead'])
+
+            logging.info("Запуск задачи по обновлению данных (асинхронный режим)...")
+            try:
+                await run_cycle(start_date, end_date, db_executor, sheets_executor)
+            except Exception as e:
+                logging.error(f"Непредвиденная ошибка в цикле синхронизации: {e}", exc_info=True)
+
+            delay = max(0.0, interval - (time.monotonic() - started))
+            logging.info(f"Задача завершена. Следующий запуск через {delay / 60:.1f} минут.")
+            await asyncio.sleep(delay)
+
+
+if __name__ == '__main__':
+    logging.info("Приложение запущено в асинхронном режиме. Первая выгрузка данных начнется немедленно.")
+    asyncio.run(run_forever())
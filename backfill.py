@@ -0,0 +1,230 @@
+"""
+Историческая догрузка заказов на лист "Заказы".
+
+Разбивает большой диапазон дат (по o.datemodified) на партиции, выгружает их
+параллельно в отдельных процессах (у каждого свое соединение с Firebird),
+объединяет результаты и записывает их в таблицу крупными пакетами.
+Завершенные партиции сохраняются в файл контрольной точки, поэтому прерванную
+догрузку можно продолжить повторным запуском с теми же параметрами.
+
+Пример:
+    python backfill.py --since 2024-01-01 --until 2024-06-30 --workers 4
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from config import BACKFILL_CONFIG
+from database import get_data_from_db_by_order
+from google_sheets import update_google_sheet_targets
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def split_date_range(since: date, until: date, partition_days: int) -> list[tuple[date, date]]:
+    """
+    Разбивает диапазон дат на последовательные партиции.
+
+    Границы соседних партиций совпадают (запросы используют BETWEEN), а конец
+    последней партиции сдвинут на день вперед, чтобы день until попал в выборку целиком.
+
+    Args:
+        since: Начальная дата диапазона.
+        until: Конечная дата диапазона (включительно).
+        partition_days: Размер партиции в днях.
+
+    Returns:
+        Список пар (начало, конец) для каждой партиции.
+    """
+    if partition_days < 1:
+        raise ValueError("Размер партиции должен быть не меньше 1 дня.")
+
+    end_of_range = until + timedelta(days=1)
+    partitions = []
+    start = since
+    while start < end_of_range:
+        end = min(start + timedelta(days=partition_days), end_of_range)
+        partitions.append((start, end))
+        start = end
+    return partitions
+
+
+def load_checkpoint(path: str, since: date, until: date, partition_days: int) -> set[str]:
+    """
+    Загружает список завершенных партиций из файла контрольной точки.
+
+    Контрольная точка используется только если она создана с теми же параметрами
+    (диапазон и размер партиции), иначе догрузка начинается с начала.
+
+    Returns:
+        Множество дат начала завершенных партиций в формате ISO.
+    """
+    if not os.path.exists(path):
+        return set()
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Не удалось прочитать контрольную точку {path}: {e}. Начинаем с начала.")
+        return set()
+
+    if (checkpoint.get('since') != since.isoformat() or checkpoint.get('until') != until.isoformat()
+            or checkpoint.get('partition_days') != partition_days):
+        logging.warning(f"Контрольная точка {path} создана с другими параметрами, игнорируем ее.")
+        return set()
+
+    return set(checkpoint.get('completed', []))
+
+
+def save_checkpoint(path: str, since: date, until: date, partition_days: int, completed: set[str]):
+    """
+    Атомарно сохраняет список завершенных партиций в файл контрольной точки.
+    """
+    checkpoint = {
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'partition_days': partition_days,
+        'completed': sorted(completed),
+        'updated_at': datetime.now().isoformat(timespec='seconds')
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _merge_partition_data(merged: dict, rows: list[dict]):
+    """
+    Добавляет строки партиции в общий словарь с ключом (дата производства, номер заказа).
+    """
+    for row in rows:
+        merged[(row.get('PRODDATE'), row.get('ORDERNO'))] = row
+
+
+def run_backfill(since: date, until: date, partition_days: int = None, workers: int = None,
+                 partitions_per_write: int = None, checkpoint_file: str = None) -> bool:
+    """
+    Выполняет историческую догрузку заказов за указанный диапазон дат.
+
+    Партиции выгружаются параллельно; по мере готовности их данные накапливаются
+    и записываются на лист "Заказы" одним пакетом на каждые partitions_per_write партиций.
+    После успешной записи партиции отмечаются в контрольной точке.
+
+    Args:
+        since: Начальная дата диапазона.
+        until: Конечная дата диапазона (включительно).
+        partition_days: Размер партиции в днях.
+        workers: Количество параллельных процессов выгрузки.
+        partitions_per_write: Сколько партиций объединять в одну запись.
+        checkpoint_file: Путь к файлу контрольной точки.
+
+    Returns:
+        True, если все партиции выгружены и записаны, иначе False.
+    """
+    partition_days = partition_days or BACKFILL_CONFIG['partition_days']
+    workers = workers or BACKFILL_CONFIG['workers']
+    partitions_per_write = partitions_per_write or BACKFILL_CONFIG['partitions_per_write']
+    checkpoint_file = checkpoint_file or BACKFILL_CONFIG['checkpoint_file']
+
+    partitions = split_date_range(since, until, partition_days)
+    completed = load_checkpoint(checkpoint_file, since, until, partition_days)
+    pending = [p for p in partitions if p[0].isoformat() not in completed]
+
+    logging.info(f"Догрузка за период {since} - {until}: партиций {len(partitions)}, "
+                 f"уже выполнено {len(partitions) - len(pending)}, осталось {len(pending)}.")
+    if not pending:
+        logging.info("Все партиции уже выгружены. Нечего делать.")
+        return True
+
+    failed = []
+    buffer = {}
+    buffered_partitions = []
+    done_count = len(partitions) - len(pending)
+
+    def flush():
+        """Записывает накопленные партиции в таблицу и обновляет контрольную точку."""
+        if not buffered_partitions:
+            return
+        logging.info(f"Запись {len(buffer)} заказов из {len(buffered_partitions)} партиций на лист 'Заказы'...")
+        results = update_google_sheet_targets(list(buffer.values()))[0] if buffer else {}
+        if buffer and not (results and all(results.values())):
+            logging.error("Не удалось записать данные в таблицу. Партиции не отмечены как выполненные.")
+            failed.extend(buffered_partitions)
+        else:
+            completed.update(p[0].isoformat() for p in buffered_partitions)
+            save_checkpoint(checkpoint_file, since, until, partition_days, completed)
+        buffer.clear()
+        buffered_partitions.clear()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Партиция - это период по дате изменения заказа, поэтому политика окна выгрузки не применяется;
+        # хранилище метрик рассчитано на один процесс, и процессы догрузки его не используют
+        futures = {executor.submit(get_data_from_db_by_order, start, end, 'datemodified', False): (start, end)
+                   for start, end in pending}
+        for future in as_completed(futures):
+            partition = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                logging.error(f"Ошибка выгрузки партиции {partition[0]} - {partition[1]}: {e}")
+                rows = None
+
+            done_count += 1
+            if rows is None:
+                failed.append(partition)
+                logging.error(f"[{done_count}/{len(partitions)}] Партиция {partition[0]} - {partition[1]} не выгружена.")
+                continue
+
+            logging.info(f"[{done_count}/{len(partitions)}] Партиция {partition[0]} - {partition[1]}: {len(rows)} заказов.")
+            _merge_partition_data(buffer, rows)
+            buffered_partitions.append(partition)
+
+            if len(buffered_partitions) >= partitions_per_write:
+                flush()
+
+    flush()
+
+    if failed:
+        logging.error(f"Догрузка завершена с ошибками: не обработано партиций {len(failed)}. "
+                      f"Повторный запуск продолжит с контрольной точки {checkpoint_file}.")
+        return False
+
+    logging.info(f"Догрузка за период {since} - {until} успешно завершена.")
+    return True
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Историческая догрузка заказов на лист 'Заказы'.")
+    parser.add_argument('--since', type=_parse_date, required=True, help="Начальная дата (ГГГГ-ММ-ДД).")
+    parser.add_argument('--until', type=_parse_date, default=date.today(), help="Конечная дата (ГГГГ-ММ-ДД), по умолчанию сегодня.")
+    parser.add_argument('--partition-days', type=int, default=BACKFILL_CONFIG['partition_days'], help="Размер партиции в днях.")
+    parser.add_argument('--workers', type=int, default=BACKFILL_CONFIG['workers'], help="Количество параллельных процессов.")
+    parser.add_argument('--partitions-per-write', type=int, default=BACKFILL_CONFIG['partitions_per_write'],
+                        help="Сколько партиций объединять в одну запись в таблицу.")
+    parser.add_argument('--checkpoint', default=BACKFILL_CONFIG['checkpoint_file'], help="Файл контрольной точки.")
+    parser.add_argument('--restart', action='store_true', help="Игнорировать контрольную точку и начать заново.")
+    args = parser.parse_args(argv)
+
+    if args.since > args.until:
+        parser.error("--since не может быть позже --until.")
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    ok = run_backfill(args.since, args.until, args.partition_days, args.workers,
+                      args.partitions_per_write, args.checkpoint)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
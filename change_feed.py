@@ -0,0 +1,144 @@
+"""
+Лента изменений между последовательными выгрузками по заказам.
+
+Соседние выгрузки почти совпадают, поэтому для каждой записи заказа считается хэш,
+и по сравнению с хэшами прошлого цикла определяются новые (inserted), измененные
+(changed) и выпавшие из окна выгрузки (removed) заказы. Публикуются только новые
+и измененные заказы; раз в full_publish_minutes публикуется вся выгрузка, чтобы
+исправить ручные правки на листе и обновить окно отображения.
+
+Хэши сохраняются только после успешной публикации (commit_change_feed), поэтому
+при ошибке записи изменения будут опубликованы в следующем цикле. Хэши заказов,
+которых нет на листе (запись пропущена), не сохраняются: такой заказ публикуется
+в каждом цикле, и его строка заполнится сразу после того, как ее добавят на лист. При заданном
+state_file хэши переживают перезапуск приложения.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from config import CHANGE_FEED_CONFIG
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# {'hashes': номер заказа -> хэш записи, 'full_published_at': datetime} после последней публикации
+_state = {}
+_state_lock = threading.Lock()
+
+
+def _order_key(row_dict: dict) -> str:
+    return str(row_dict.get('ORDERNO', '')).strip()
+
+
+def record_hash(row_dict: dict) -> str:
+    """
+    Возвращает хэш записи заказа (не зависит от порядка полей).
+    """
+    payload = json.dumps(row_dict, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _load_state_file(path: str):
+    """Загружает сохраненные хэши, если состояние еще не загружено."""
+    if _state or not path or not os.path.exists(path):
+        return
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        _state['hashes'] = saved['hashes']
+        _state['full_published_at'] = datetime.fromisoformat(saved['full_published_at'])
+        logging.info(f"Загружены хэши ленты изменений: {len(_state['hashes'])} заказов.")
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"Не удалось прочитать состояние ленты изменений {path}: {e}. Будет выполнена полная публикация.")
+        _state.clear()
+
+
+def compute_change_feed(data: list[dict]) -> dict:
+    """
+    Сравнивает выгрузку с последней опубликованной.
+
+    Args:
+        data: Список словарей с данными по заказам.
+
+    Returns:
+        Словарь с ключами inserted, changed (записи заказов), removed (номера заказов),
+        full (нужна полная публикация), hashes (хэши текущей выгрузки для commit_change_feed).
+    """
+    hashes = {}
+    records = {}
+    for row_dict in data:
+        order_no = _order_key(row_dict)
+        if order_no:
+            hashes[order_no] = record_hash(row_dict)
+            records[order_no] = row_dict
+
+    with _state_lock:
+        _load_state_file(CHANGE_FEED_CONFIG['state_file'])
+        previous = _state.get('hashes')
+        full_published_at = _state.get('full_published_at')
+
+    full = (previous is None or full_published_at is None
+            or (datetime.now() - full_published_at).total_seconds() >= CHANGE_FEED_CONFIG['full_publish_minutes'] * 60)
+    previous = previous or {}
+
+    feed = {
+        'inserted': [records[order_no] for order_no in hashes if order_no not in previous],
+        'changed': [records[order_no] for order_no, value in hashes.items()
+                    if order_no in previous and previous[order_no] != value],
+        'removed': [order_no for order_no in previous if order_no not in hashes],
+        'full': full,
+        'hashes': hashes
+    }
+    logging.info(f"Лента изменений: новых {len(feed['inserted'])}, измененных {len(feed['changed'])}, "
+                 f"выпавших из окна {len(feed['removed'])}, без изменений "
+                 f"{len(hashes) - len(feed['inserted']) - len(feed['changed'])}"
+                 f"{' (полная публикация)' if full else ''}.")
+    return feed
+
+
+def records_to_publish(feed: dict, data: list[dict]) -> list[dict]:
+    """
+    Возвращает записи, которые нужно опубликовать: всю выгрузку при полной публикации,
+    иначе только новые и измененные заказы.
+    """
+    return data if feed['full'] else feed['inserted'] + feed['changed']
+
+
+def commit_change_feed(feed: dict, skipped_orders=None):
+    """
+    Запоминает выгрузку как опубликованную (вызывается после успешной записи).
+
+    Args:
+        feed: Лента изменений из compute_change_feed.
+        skipped_orders: Номера заказов, запись которых пропущена (нет строки на листе);
+            их хэши не сохраняются.
+    """
+    skipped_orders = set(skipped_orders or ())
+    with _state_lock:
+        _state['hashes'] = {order_no: value for order_no, value in feed['hashes'].items()
+                            if order_no not in skipped_orders}
+        if feed['full']:
+            _state['full_published_at'] = datetime.now()
+
+        path = CHANGE_FEED_CONFIG['state_file']
+        if not path:
+            return
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'hashes': _state['hashes'],
+                           'full_published_at': _state['full_published_at'].isoformat(timespec='seconds')}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Не удалось сохранить состояние ленты изменений {path}: {e}")
+
+
+def reset_change_feed():
+    """Сбрасывает хэши, чтобы следующая выгрузка была опубликована полностью."""
+    with _state_lock:
+        _state.clear()
+        path = CHANGE_FEED_CONFIG['state_file']
+        if path and os.path.exists(path):
+            os.remove(path)
@@ -28,6 +28,180 @@ GOOGLE_SHEETS_MAIN_CONFIG = {
     'worksheet_name_orders': os.getenv('GOOGLE_MAIN_WORKSHEET_ORDERS', 'Заказы')
 }
 
+# Добавление на лист "Заказы" заказов, которых на нем еще нет
+ORDERS_APPEND_CONFIG = {
+    # Если выключено, такие заказы пропускаются (строки добавляются вручную)
+    'enabled': os.getenv('ORDERS_APPEND_MISSING', '0') == '1'
+}
+
+# Окно отображения листа "Заказы": строки с датой производства вне окна скрываются
+DISPLAY_WINDOW_CONFIG = {
+    'enabled': os.getenv('DISPLAY_WINDOW_ENABLED', '0') == '1',
+    'days_before': int(os.getenv('DISPLAY_WINDOW_DAYS_BEFORE', '2')),
+    'days_after': int(os.getenv('DISPLAY_WINDOW_DAYS_AFTER', '5')),
+    # Как часто отправлять видимость всех строк, а не только изменившихся
+    # (например, если строки скрыли или показали вручную)
+    'full_refresh_minutes': int(os.getenv('DISPLAY_WINDOW_FULL_REFRESH_MINUTES', '60'))
+}
+
+# Снимки выгрузки по заказам (snapshots.py): данные каждого цикла в сжатом CSV
+SNAPSHOT_CONFIG = {
+    'enabled': os.getenv('SNAPSHOT_ENABLED', '0') == '1',
+    'directory': os.getenv('SNAPSHOT_DIR', 'snapshots'),
+    # Сколько последних снимков хранить (288 - сутки при интервале 5 минут)
+    'keep_files': int(os.getenv('SNAPSHOT_KEEP_FILES', '288'))
+}
+
+# Лента изменений (change_feed.py): публикуются только новые и измененные заказы
+CHANGE_FEED_CONFIG = {
+    'enabled': os.getenv('CHANGE_FEED_ENABLED', '0') == '1',
+    # Как часто публиковать всю выгрузку (исправляет ручные правки, обновляет время обновления на листе)
+    'full_publish_minutes': int(os.getenv('CHANGE_FEED_FULL_PUBLISH_MINUTES', '60')),
+    # Файл для сохранения хэшей между перезапусками (пусто - только в памяти)
+    'state_file': os.getenv('CHANGE_FEED_STATE_FILE', '')
+}
+
+# Отложенная публикация (debounce.py): заказы, которые сейчас редактируются, публикуются после затишья
+DEBOUNCE_CONFIG = {
+    'enabled': os.getenv('DEBOUNCE_ENABLED', '0') == '1',
+    # Сколько секунд дата изменения заказа должна оставаться неизменной перед публикацией
+    'quiet_seconds': int(os.getenv('DEBOUNCE_QUIET_SECONDS', '120')),
+    # Максимальная задержка публикации непрерывно меняющегося заказа
+    'max_delay_seconds': int(os.getenv('DEBOUNCE_MAX_DELAY_SECONDS', '600'))
+}
+
+# Цели записи листа "Заказы": одна выгрузка из БД за цикл раскладывается по всем целям параллельно.
+# Файл целей - JSON-список объектов с полями name, spreadsheet_id, worksheet_name,
+# необязательными credentials_file и columns (карта ключ метрики -> название столбца на листе;
+# если задана, заполняются только перечисленные столбцы). Если файла нет,
+# единственная цель - основная таблица из GOOGLE_SHEETS_MAIN_CONFIG.
+SHEETS_TARGETS_CONFIG = {
+    'targets_file': os.getenv('SHEETS_TARGETS_FILE', 'sheets_targets.json'),
+    # Сколько целей обновлять одновременно
+    'workers': int(os.getenv('SHEETS_TARGETS_WORKERS', '4'))
+}
+
+# Архивирование старых заказов с листа "Заказы" на помесячные листы (archive.py)
+ARCHIVE_CONFIG = {
+    'enabled': os.getenv('ARCHIVE_ENABLED', '0') == '1',
+    # Заказы с датой производства старше стольких дней переносятся в архив
+    'horizon_days': int(os.getenv('ARCHIVE_HORIZON_DAYS', '90')),
+    # Название листа архива
+    'worksheet_name_template': os.getenv('ARCHIVE_WORKSHEET_TEMPLATE', 'Архив {year}-{month:02d}'),
+    # Строк в одном пакете (один вызов batchUpdate) и максимум пакетов за запуск
+    'batch_rows': int(os.getenv('ARCHIVE_BATCH_ROWS', '500')),
+    'max_batches': int(os.getenv('ARCHIVE_MAX_BATCHES', '20')),
+    # Время ежедневного запуска в основном режиме (main.py)
+    'run_at': os.getenv('ARCHIVE_RUN_AT', '03:00')
+}
+
+# Окно выгрузки для регулярной синхронизации (по дате изменения заказа)
+SYNC_WINDOW = {
+    'days_back': int(os.getenv('SYNC_DAYS_BACK', '7')),
+    'days_ahead': int(os.getenv('SYNC_DAYS_AHEAD', '1')),
+    'interval_minutes': int(os.getenv('SYNC_INTERVAL_MINUTES', '5'))
+}
+
+# Политика окна выгрузки по заказам (window_policy.py): datemodified, proddate, union или intersection.
+# Окно по дате изменения задает SYNC_WINDOW (или аргументы запуска), диапазон дат производства -
+# proddate_days_back/proddate_days_ahead относительно сегодняшнего дня.
+WINDOW_POLICY_CONFIG = {
+    'policy': os.getenv('WINDOW_POLICY', 'datemodified'),
+    'proddate_days_back': int(os.getenv('WINDOW_PRODDATE_DAYS_BACK', '1')),
+    'proddate_days_ahead': int(os.getenv('WINDOW_PRODDATE_DAYS_AHEAD', '7'))
+}
+
+# Настройки асинхронного режима синхронизации (async_runner.py)
+ASYNC_CONFIG = {
+    # Максимум одновременных соединений с Firebird (каждый запрос - в своем соединении)
+    'db_workers': int(os.getenv('ASYNC_DB_WORKERS', '3')),
+    # Максимум одновременных запросов к Google Sheets API
+    'sheets_workers': int(os.getenv('ASYNC_SHEETS_WORKERS', '4'))
+}
+
+# Настройки исторической догрузки (backfill.py)
+BACKFILL_CONFIG = {
+    # Размер одной партиции диапазона дат (в днях)
+    'partition_days': int(os.getenv('BACKFILL_PARTITION_DAYS', '7')),
+    # Количество параллельных процессов (у каждого свое соединение с БД)
+    'workers': int(os.getenv('BACKFILL_WORKERS', '4')),
+    # Сколько выгруженных партиций объединять в одну запись в таблицу
+    'partitions_per_write': int(os.getenv('BACKFILL_PARTITIONS_PER_WRITE', '8')),
+    # Файл контрольной точки для продолжения прерванной догрузки
+    'checkpoint_file': os.getenv('BACKFILL_CHECKPOINT_FILE', 'backfill_checkpoint.json')
+}
+
+# Настройки HTTP-соединений с Google Sheets API
+SHEETS_HTTP_CONFIG = {
+    # Количество пулов (по хостам) и соединений keep-alive в каждом пуле
+    'pool_connections': int(os.getenv('SHEETS_POOL_CONNECTIONS', '4')),
+    'pool_maxsize': int(os.getenv('SHEETS_POOL_MAXSIZE', '10')),
+    'user_agent': os.getenv('SHEETS_USER_AGENT', 'AltawinGoogleSheetsFMO'),
+    # Таймаут одного HTTP-запроса к API (секунды), чтобы зависшее соединение не блокировало цикл
+    'timeout_seconds': float(os.getenv('SHEETS_HTTP_TIMEOUT_SECONDS', '120'))
+}
+
+# Сторожевой процесс (cycle_worker.py): цикл выполняется в отдельном процессе-исполнителе,
+# который принудительно завершается и перезапускается, если этап цикла не уложился в свой таймаут
+WATCHDOG_CONFIG = {
+    'enabled': os.getenv('WATCHDOG_ENABLED', '0') == '1',
+    # Таймауты этапов цикла в секундах
+    'stage_timeouts': {
+        'db': int(os.getenv('WATCHDOG_DB_TIMEOUT_SECONDS', '600')),
+        'sheets': int(os.getenv('WATCHDOG_SHEETS_TIMEOUT_SECONDS', '600')),
+        'archive': int(os.getenv('WATCHDOG_ARCHIVE_TIMEOUT_SECONDS', '1800'))
+    },
+    # Таймаут для прочих этапов (запуск исполнителя, снимок выгрузки и т.п.)
+    'default_timeout_seconds': int(os.getenv('WATCHDOG_DEFAULT_TIMEOUT_SECONDS', '300')),
+    # Сколько ждать завершения исполнителя после terminate перед kill
+    'kill_grace_seconds': int(os.getenv('WATCHDOG_KILL_GRACE_SECONDS', '10'))
+}
+
+# Локальное хранилище агрегатов метрик по заказам (metric_store.py): агрегаты пересчитываются
+# в Firebird только для заказов, у которых изменилась o.datemodified
+METRIC_STORE_CONFIG = {
+    'enabled': os.getenv('METRIC_STORE_ENABLED', '0') == '1',
+    'path': os.getenv('METRIC_STORE_PATH', 'metric_store.sqlite3'),
+    # Как часто пересчитывать все заказы окна (минуты)
+    'full_refresh_minutes': int(os.getenv('METRIC_STORE_FULL_REFRESH_MINUTES', '360'))
+}
+
+# Сводка по датам производства на листе "Общий" (daily_summary.py): считается из выгрузки цикла
+# по заказам; при включенной сводке окно выгрузки по умолчанию дополняется ее диапазоном дат производства
+DAILY_SUMMARY_CONFIG = {
+    'enabled': os.getenv('DAILY_SUMMARY_ENABLED', '0') == '1',
+    # Диапазон дат производства относительно сегодняшнего дня
+    'days_back': int(os.getenv('DAILY_SUMMARY_DAYS_BACK', '7')),
+    'days_ahead': int(os.getenv('DAILY_SUMMARY_DAYS_AHEAD', '5'))
+}
+
+# Полосы публикации: значения листа "Заказы" записываются по приоритету отдельными вызовами
+# (состояние/готовность и заказы на сегодня, затем количества, затем старые заказы).
+# При исчерпании квоты API (HTTP 429) оставшиеся полосы откладываются до следующего цикла.
+PRIORITY_LANES_CONFIG = {
+    'enabled': os.getenv('PRIORITY_LANES_ENABLED', '0') == '1'
+}
+
+# Настройки записи в Google Sheets
+SHEETS_WRITE_CONFIG = {
+    # Максимальный размер тела одного запроса на запись (рекомендация Google - не более 2 МБ)
+    'max_payload_bytes': int(os.getenv('SHEETS_MAX_PAYLOAD_BYTES', str(2 * 1024 * 1024)))
+}
+
+# Кэш справочных данных (reference_data.py): наборы grgoodsid/setid для запросов iron и sandwiches
+REFERENCE_DATA_CONFIG = {
+    'enabled': os.getenv('REFERENCE_CACHE_ENABLED', '1') == '1',
+    # Через сколько минут наборы перечитываются в любом случае
+    'ttl_minutes': int(os.getenv('REFERENCE_CACHE_TTL_MINUTES', '720')),
+    # Как часто проверять отпечаток справочников (количество и максимальный id) на изменения
+    'check_interval_minutes': int(os.getenv('REFERENCE_CACHE_CHECK_MINUTES', '60'))
+}
+
+# Настройки профилирования запросов (python database.py --profile)
+PROFILE_CONFIG = {
+    'report_file': os.getenv('DB_PROFILE_REPORT_FILE', 'query_profile.json')
+}
+
 # SQL-запросы
 SQL_QUERIES = {
     'izd_pvh': """
@@ -125,134 +299,11 @@ SQL_QUERIES = {
     """
 }
 
-# SQL-запросы с группировкой по заказам
+# SQL-запросы с группировкой по заказам, которые не сводятся к агрегатам метрик.
+# Количества, сумма и id заказа описаны в реестре метрик (metrics.py) и собираются
+# планировщиком в запросы по общим путям соединения.
+# {window_condition} - условие окна выгрузки по политике WINDOW_POLICY_CONFIG (window_policy.py).
 SQL_QUERIES_BY_ORDER = {
-    'izd_pvh': """
-        SELECT
-            o.proddate,
-            o.orderno,
-            SUM(oi.qty) AS qty_izd_pvh
-        FROM orders o
-        JOIN orderitems oi ON oi.orderid = o.orderid
-        JOIN models m ON m.orderitemsid = oi.orderitemsid
-        JOIN r_systems rs ON rs.rsystemid = m.sysprofid
-        WHERE o.datemodified BETWEEN ? AND ?
-            AND o.proddate IS NOT NULL
-            AND rs.systemtype = 0
-            AND rs.rsystemid <> 8
-            AND rs.rsystemid <> 27
-        GROUP BY o.proddate, o.orderno
-    """,
-    'razdv': """
-        SELECT
-            o.proddate,
-            o.orderno,
-            SUM(oi.qty) AS qty_razdv
-        FROM orders o
-        JOIN orderitems oi ON oi.orderid = o.orderid
-        JOIN models m ON m.orderitemsid = oi.orderitemsid
-        JOIN r_systems rs ON rs.rsystemid = m.sysprofid
-        WHERE o.datemodified BETWEEN ? AND ?
-            AND o.proddate IS NOT NULL
-            AND ((rs.systemtype = 1) OR (rs.rsystemid = 8))
-        GROUP BY o.proddate, o.orderno
-    """,
-    'mosnet': """
-        SELECT
-            o.proddate,
-            o.orderno,
-            SUM(oi.qty * itd.qty) AS qty_mosnet
-        FROM orders o
-        JOIN orderitems oi ON oi.orderid = o.orderid
-        JOIN itemsdetail itd ON itd.orderitemsid = oi.orderitemsid
-        WHERE o.datemodified BETWEEN ? AND ?
-            AND o.proddate IS NOT NULL
-            AND itd.grgoodsid = 46110
-        GROUP BY o.proddate, o.orderno
-    """,
-    'glass_packs': """
-        select
-            o.proddate,
-            o.orderno,
-            sum(oi.qty) as qty_glass_packs
-        from orders o
-        join orderitems oi on oi.orderid = o.orderid
-        join models m on m.orderitemsid = oi.orderitemsid
-        join modelparts mp on mp.modelid = m.modelid
-        join modelfillings mf on mf.modelpartid = mp.modelpartid
-        join gpackettypes gp on gp.gptypeid = mf.gptypeid
-        join r_systems rs on rs.rsystemid = gp.rsystemid
-        where o.datemodified between ? and ?
-        and o.proddate is not null
-        and rs.rsystemid in (3, 21)
-        group by o.proddate, o.orderno
-    """,
-    'sandwiches': """
-        SELECT
-            o.proddate,
-            o.orderno,
-            SUM(oi.qty * itd.qty) AS qty_sandwiches
-        FROM orders o
-        JOIN orderitems oi ON oi.orderid = o.orderid
-        JOIN itemsdetail itd ON itd.orderitemsid = oi.orderitemsid
-        join groupgoods gg on gg.grgoodsid = itd.grgoodsid
-        join groupgoodstypes ggt on ggt.ggtypeid = gg.ggtypeid
-        WHERE o.datemodified BETWEEN ? AND ?
-            AND o.proddate IS NOT NULL
-            AND ggt.code in ('Sand', 'SandDop')
-        GROUP BY o.proddate, o.orderno
-    """,
-    'windowsills': """
-        select
-            o.proddate,
-            o.orderno,
-            sum(i.qty * oi.qty) as qty_windowsills
-        from orderitems oi
-        join orders o on o.orderid = oi.orderid
-        join itemsdetail i on i.orderitemsid = oi.orderitemsid
-        join goods g on i.goodsid = g.goodsid
-        join groupgoods gg on i.grgoodsid = gg.grgoodsid
-        where o.datemodified between ? and ?
-        and o.proddate is not null
-        and gg.ggtypeid = 42
-        group by
-            o.proddate, o.orderno
-    """,
-    'iron': """
-        select
-            o.proddate,
-            o.orderno,
-            sum(oi.qty * its.qty) as qty_iron
-        from orderitems oi
-        join orders o on o.orderid = oi.orderid
-        join itemssets its on its.orderitemsid = oi.orderitemsid
-        join groupgoods gg on gg.grgoodsid = its.setid
-        where o.datemodified between ? and ?
-        and o.proddate is not null
-        and gg.isggset = 1
-        and ((gg.marking like '%Водоотлив%') or (gg.marking like '%Железо%') or (gg.marking like '%Козырек%') or (gg.marking like '%Нащельник%'))
-        group by o.proddate, o.orderno
-    """,
-    'totalprice': """
-        select
-            o.proddate,
-            o.orderno,
-            o.totalprice
-        from orders o
-        where o.datemodified between ? and ?
-        and o.proddate is not null
-        group by o.proddate, o.orderno, o.totalprice
-    """,
-    'orderid': """
-        select
-            o.proddate,
-            o.orderno,
-            o.orderid
-        from orders o
-        where o.datemodified between ? and ?
-        and o.proddate is not null
-        group by o.proddate, o.orderno, o.orderid
-    """,
     'readiness': """
         select
             o.proddate,
@@ -267,8 +318,7 @@ SQL_QUERIES_BY_ORDER = {
         join models m on m.orderitemsid = oi.orderitemsid
         left join ct_elements el on el.modelid = m.modelid and el.cttypeelemsid = 2
         left join ct_whdetail wd on wd.ctelementsid = el.ctelementsid
-        where o.datemodified between ? and ?
-        and o.proddate is not null
+        where {window_condition}
         group by o.proddate, o.orderno
     """,
     'order_state': """
@@ -280,8 +330,7 @@ SQL_QUERIES_BY_ORDER = {
         from orders o
         left join ORDERSTATESREG osr on osr.ORDERID = o.ORDERID
         left join ORDERSTATES os on os.ORDERSTATEID = osr.ORDERSTATEID
-        where o.datemodified between ? and ?
-        and o.proddate is not null
+        where {window_condition}
         order by o.orderno, osr.STATEPOSIT desc
     """
 }
@@ -297,3 +346,66 @@ SQL_QUERY_CHECK_ORDER_READINESS = """
     where o.orderid = ?
     and el.cttypeelemsid = 2
 """
+
+# SQL-запрос счетчиков ввода-вывода и чтения записей для текущего соединения (таблицы мониторинга MON$)
+SQL_QUERY_MON_STATS = """
+    select
+        io.mon$page_reads as page_reads,
+        io.mon$page_writes as page_writes,
+        io.mon$page_fetches as page_fetches,
+        io.mon$page_marks as page_marks,
+        rs.mon$record_seq_reads as record_seq_reads,
+        rs.mon$record_idx_reads as record_idx_reads
+    from mon$attachments a
+    join mon$io_stats io on io.mon$stat_id = a.mon$stat_id
+    join mon$record_stats rs on rs.mon$stat_id = a.mon$stat_id
+    where a.mon$attachment_id = current_connection
+"""
+
+# SQL-запросы справочных наборов для кэша reference_data.py
+SQL_REFERENCE_QUERIES = {
+    'iron_set_ids': """
+        select gg.grgoodsid
+        from groupgoods gg
+        where gg.isggset = 1
+        and ((gg.marking like '%Водоотлив%') or (gg.marking like '%Железо%') or (gg.marking like '%Козырек%') or (gg.marking like '%Нащельник%'))
+    """,
+    'sandwich_group_ids': """
+        select gg.grgoodsid
+        from groupgoods gg
+        join groupgoodstypes ggt on ggt.ggtypeid = gg.ggtypeid
+        where ggt.code in ('Sand', 'SandDop')
+    """
+}
+
+# Отпечаток справочников: меняется при добавлении или удалении групп и типов групп
+SQL_REFERENCE_FINGERPRINT = """
+    select
+        (select count(*) from groupgoods) as groupgoods_count,
+        (select max(grgoodsid) from groupgoods) as groupgoods_max_id,
+        (select count(*) from groupgoodstypes) as groupgoodstypes_count
+    from rdb$database
+"""
+
+# Заказы окна выгрузки для хранилища метрик
+SQL_WINDOW_ORDERS = """
+    select o.orderid, o.proddate, o.orderno, o.datemodified
+    from orders o
+    where {window_condition}
+"""
+
+# orderid заказов по номерам (выборочный запуск main.py --orders); подставляются параметры номеров
+SQL_ORDER_IDS_BY_NUMBER = """
+    select o.orderid
+    from orders o
+    where o.orderno in ({placeholders})
+"""
+
+# Заказы по списку orderid для сверки хранилища метрик с Firebird (удаленные заказы
+# и заказы без даты производства в результат не попадают)
+SQL_ORDERS_BY_ID = """
+    select o.orderid, o.proddate, o.orderno, o.datemodified
+    from orders o
+    where {orderid_condition}
+    and o.proddate is not null
+"""
@@ -0,0 +1,166 @@
+"""
+Выполнение цикла синхронизации в отдельном процессе под контролем сторожа.
+
+Ни fdb, ни сокеты Firebird не ограничивают время ожидания ответа, поэтому зависшее
+соединение с БД (или с Google Sheets API) блокирует цикл навсегда. Здесь задача цикла
+передается в постоянный процесс-исполнитель, а основной процесс следит за этапами,
+о которых исполнитель сообщает через report_stage ('db', 'sheets', 'archive' и т.п.).
+Если этап не уложился в свой таймаут из WATCHDOG_CONFIG, исполнитель принудительно
+завершается, цикл считается неудачным, а следующий цикл запускается в новом
+исполнителе по расписанию. Поэтому худшая задержка обновления ограничена суммой
+таймаутов этапов и интервалом синхронизации.
+
+Исключение в задаче не путается с таймаутом: run_supervised возвращает итог FAILED
+с трассировкой исключения из исполнителя (или кодом завершения упавшего процесса),
+а по таймауту этапа - итог TIMED_OUT с названием этапа.
+
+Исполнитель живет между циклами, поэтому кэши (соединения с Google Sheets, справочники,
+лента изменений) сохраняются, пока он не будет перезапущен.
+"""
+import logging
+import multiprocessing
+import threading
+import time
+import traceback
+from config import WATCHDOG_CONFIG
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Этап, который считается начавшимся при передаче задачи исполнителю
+START_STAGE = 'start'
+
+# Итоги run_supervised
+DONE = 'done'
+FAILED = 'failed'
+TIMED_OUT = 'timeout'
+
+# Состояние в основном процессе: {'process', 'conn'} текущего исполнителя
+_worker = {}
+_worker_lock = threading.Lock()
+
+# Соединение с основным процессом внутри исполнителя (None вне исполнителя)
+_stage_conn = None
+_stage_lock = threading.Lock()
+
+
+def report_stage(stage: str):
+    """
+    Сообщает сторожу о начале этапа цикла. Вне процесса-исполнителя ничего не делает.
+    """
+    if _stage_conn is None:
+        return
+    with _stage_lock:
+        _stage_conn.send(('stage', stage))
+
+
+def _worker_loop(conn):
+    """Цикл процесса-исполнителя: выполняет задачи и отправляет результаты."""
+    global _stage_conn
+    _stage_conn = conn
+    while True:
+        try:
+            func, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            result = func(*args)
+            message = ('done', result)
+        except Exception as e:
+            logging.error(f"Ошибка при выполнении задачи {func.__name__} в исполнителе: {e}")
+            message = ('error', traceback.format_exc())
+        with _stage_lock:
+            conn.send(message)
+
+
+def _start_worker():
+    """Запускает процесс-исполнитель (spawn - одинаково в Windows, Linux и в собранном exe)."""
+    context = multiprocessing.get_context('spawn')
+    parent_conn, child_conn = context.Pipe()
+    process = context.Process(target=_worker_loop, args=(child_conn,), name='cycle-worker', daemon=True)
+    process.start()
+    child_conn.close()
+    _worker['process'] = process
+    _worker['conn'] = parent_conn
+    logging.info(f"Запущен процесс-исполнитель цикла (pid {process.pid}).")
+
+
+def stop_worker():
+    """Принудительно завершает процесс-исполнитель (следующая задача запустит новый)."""
+    process = _worker.pop('process', None)
+    conn = _worker.pop('conn', None)
+    if conn is not None:
+        conn.close()
+    if process is None or not process.is_alive():
+        return
+    process.terminate()
+    process.join(WATCHDOG_CONFIG['kill_grace_seconds'])
+    if process.is_alive():
+        logging.warning(f"Процесс-исполнитель (pid {process.pid}) не завершился, выполняется kill.")
+        process.kill()
+        process.join()
+
+
+def _stage_timeout(stage: str) -> int:
+    return WATCHDOG_CONFIG['stage_timeouts'].get(stage, WATCHDOG_CONFIG['default_timeout_seconds'])
+
+
+def run_supervised(func, *args):
+    """
+    Выполняет функцию в процессе-исполнителе с контролем времени этапов.
+
+    Args:
+        func: Функция уровня модуля (передается в исполнитель по имени).
+        *args: Аргументы функции (должны сериализоваться pickle).
+
+    Returns:
+        Кортеж (итог, значение):
+        (DONE, результат функции);
+        (FAILED, трассировка исключения или описание ошибки) - задача завершилась исключением,
+        задачу не удалось передать или исполнитель завершился аварийно;
+        (TIMED_OUT, этап) - этап превысил таймаут (исполнитель в этом случае перезапускается).
+    """
+    with _worker_lock:
+        try:
+            if 'process' not in _worker or not _worker['process'].is_alive():
+                stop_worker()
+                _start_worker()
+            conn = _worker['conn']
+            process = _worker['process']
+            conn.send((func, args))
+        except Exception as e:
+            logging.error(f"Не удалось передать задачу {func.__name__} исполнителю: {e}", exc_info=True)
+            stop_worker()
+            return FAILED, str(e)
+
+        stage = START_STAGE
+        stage_started = time.monotonic()
+        while True:
+            try:
+                if conn.poll(1.0):
+                    kind, value = conn.recv()
+                    if kind == 'stage':
+                        stage = value
+                        stage_started = time.monotonic()
+                        continue
+                    if kind == 'done':
+                        return DONE, value
+                    logging.error(f"Задача {func.__name__} завершилась ошибкой в исполнителе "
+                                  f"на этапе '{stage}':\n{value}")
+                    return FAILED, value
+            except (EOFError, OSError):
+                # Исполнитель закрыл соединение - ждем его завершения
+                process.join(WATCHDOG_CONFIG['kill_grace_seconds'])
+
+            if not process.is_alive():
+                error = f"Процесс-исполнитель завершился на этапе '{stage}' с кодом {process.exitcode}."
+                logging.error(error)
+                stop_worker()
+                return FAILED, error
+
+            elapsed = time.monotonic() - stage_started
+            timeout = _stage_timeout(stage)
+            if elapsed > timeout:
+                logging.error(f"Этап '{stage}' задачи {func.__name__} выполняется {elapsed:.0f} с "
+                              f"(таймаут {timeout} с). Процесс-исполнитель будет перезапущен.")
+                stop_worker()
+                return TIMED_OUT, stage
@@ -0,0 +1,81 @@
+"""
+Сводка по датам производства для листа "Общий".
+
+Раньше сводка выгружалась отдельными запросами SQL_QUERIES (по запросу на показатель
+за диапазон дат производства). Теперь она считается в процессе суммированием данных
+по заказам, которые цикл уже получил для листа "Заказы", поэтому нагрузка на Firebird
+не растет. Показатели считаются по тем же метрикам, что и столбцы листа "Заказы".
+
+Выгрузка по заказам ограничена окном выгрузки (см. WINDOW_POLICY_CONFIG), и по окну
+по дате изменения в нее попадают не все заказы с датой производства из диапазона
+сводки. Поэтому при включенной сводке окно выгрузки по умолчанию дополняется диапазоном
+дат сводки (window_policy.summary_proddate_range), и итоги считаются из одной выгрузки
+цикла по запросам планировщика метрик. Выборочный запуск и догрузка (явно заданное окно)
+сводку не обновляют.
+"""
+import logging
+from datetime import date, datetime, timedelta
+from config import DAILY_SUMMARY_CONFIG
+from window_policy import summary_proddate_range
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Показатели сводки (ключи метрик), суммируются по дате производства
+SUMMARY_KEYS = ['QTY_IZD_PVH', 'QTY_RAZDV', 'QTY_MOSNET', 'QTY_GLASS_PACKS', 'QTY_SANDWICHES',
+                'QTY_WINDOWSILLS', 'QTY_IRON']
+
+
+def summary_window() -> tuple[date, date]:
+    """Возвращает диапазон дат производства сводки (включительно)."""
+    return summary_proddate_range()
+
+
+def build_daily_summary(data: list[dict], start_date: date, end_date: date) -> list[dict]:
+    """
+    Суммирует показатели заказов по датам производства.
+
+    Args:
+        data: Список словарей с данными по заказам.
+        start_date: Начальная дата производства.
+        end_date: Конечная дата производства (включительно).
+
+    Returns:
+        Список словарей (PRODDATE и показатели) на каждую дату диапазона;
+        для дат без заказов показатели равны 0.
+    """
+    totals = {start_date + timedelta(days=x): dict.fromkeys(SUMMARY_KEYS, 0)
+              for x in range((end_date - start_date).days + 1)}
+    for row_dict in data:
+        proddate = row_dict.get('PRODDATE')
+        # Firebird может возвращать datetime, а мы сравниваем с date
+        if isinstance(proddate, datetime):
+            proddate = proddate.date()
+        day = totals.get(proddate)
+        if day is None:
+            continue
+        for key in SUMMARY_KEYS:
+            day[key] += row_dict.get(key) or 0
+
+    return [{'PRODDATE': proddate, **values} for proddate, values in totals.items()]
+
+
+def publish_daily_summary(data: list[dict]) -> bool:
+    """
+    Считает сводку по датам производства и записывает ее на лист "Общий".
+
+    Args:
+        data: Список словарей с данными по заказам (выгрузка цикла по окну по умолчанию).
+
+    Returns:
+        True, если сводка записана, иначе False.
+    """
+    from google_sheets import update_google_sheet_summary
+
+    if not DAILY_SUMMARY_CONFIG['enabled']:
+        # Без DAILY_SUMMARY_CONFIG окно выгрузки не дополняется датами сводки, и итоги были бы неполными
+        logging.error("Сводка выключена (DAILY_SUMMARY_CONFIG): выгрузка не покрывает даты сводки, "
+                      "лист 'Общий' не обновлен.")
+        return False
+    start_date, end_date = summary_window()
+    summary = build_daily_summary(data, start_date, end_date)
+    return update_google_sheet_summary(summary)
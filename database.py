@@ -1,7 +1,16 @@
+import argparse
 import fdb
+import json
 import logging
-from config import DB_CONFIG, SQL_QUERIES, SQL_QUERIES_BY_ORDER
-from datetime import date, datetime
+import sqlite3
+import time
+from config import (DB_CONFIG, METRIC_STORE_CONFIG, PROFILE_CONFIG, SQL_ORDER_IDS_BY_NUMBER, SQL_QUERIES,
+                    SQL_QUERY_MON_STATS, SYNC_WINDOW, WINDOW_POLICY_CONFIG)
+from datetime import date, datetime, timedelta
+from metric_store import METRIC_STORE_QUERY, get_store_rows
+from metrics import MAX_IN_LIST_SIZE, plan_metric_queries, plan_metric_queries_for_orders, standalone_metric_queries
+from reference_data import get_reference_sets
+from window_policy import WINDOW_POLICIES, window_params
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -59,7 +68,121 @@ def get_data_from_db(start_date: date, end_date: date) -> list[dict] | None:
             con.close()
             logging.info("Соединение с базой данных закрыто.")
 
-def get_data_from_db_by_order(start_date: date, end_date: date) -> list[dict] | None:
+def _merge_rows_by_order(all_data: dict, key: str, columns: list[str], rows: list):
+    """
+    Добавляет результат одного запроса по заказам в общий словарь
+    с ключом (дата производства, номер заказа).
+
+    Args:
+        all_data: Общий словарь с данными по заказам.
+        key: Имя запроса из плана метрик (см. plan_metric_queries).
+        columns: Названия столбцов результата.
+        rows: Строки результата.
+    """
+    for row in rows:
+        row_dict = dict(zip(columns, row))
+        proddate = row_dict.pop('PRODDATE')
+        orderno = row_dict.pop('ORDERNO')
+
+        if isinstance(proddate, datetime):
+            proddate = proddate.date()
+
+        data_key = (proddate, orderno)
+
+        if data_key not in all_data:
+            all_data[data_key] = {'PRODDATE': proddate, 'ORDERNO': orderno}
+
+        # Для запроса order_state берем только первую запись (она уже отсортирована по STATEPOSIT DESC)
+        if key == 'order_state':
+            if 'ORDER_STATE_NAME' not in all_data[data_key]:
+                all_data[data_key].update(row_dict)
+        else:
+            all_data[data_key].update(row_dict)
+
+
+def extraction_plan(reference_sets: dict | None = None, policy: str = None,
+                    use_metric_store: bool = True) -> dict[str, str | None]:
+    """
+    Возвращает план выгрузки: имя запроса -> SQL.
+    При включенном METRIC_STORE_CONFIG запросы с условными агрегатами заменяются
+    одним псевдозапросом METRIC_STORE_QUERY (SQL - None), который читает агрегаты из хранилища.
+    policy - политика окна выгрузки (по умолчанию из WINDOW_POLICY_CONFIG);
+    use_metric_store=False - выгрузка без хранилища, даже если оно включено.
+    """
+    if not (METRIC_STORE_CONFIG['enabled'] and use_metric_store):
+        return plan_metric_queries(reference_sets, policy)
+    queries = {METRIC_STORE_QUERY: None}
+    standalone = standalone_metric_queries()
+    queries.update((key, query) for key, query in plan_metric_queries(reference_sets, policy).items()
+                   if key in standalone)
+    return queries
+
+
+def _execute_query_by_order(con, cur, key: str, query: str, date1_str: str, date2_str: str,
+                            policy: str = None) -> tuple[list[str], list]:
+    """
+    Выполняет запрос из плана метрик и возвращает (названия столбцов, строки).
+    Агрегаты при включенном METRIC_STORE_CONFIG берутся из хранилища метрик (metric_store.py).
+    """
+    if key == METRIC_STORE_QUERY:
+        return get_store_rows(con, date1_str, date2_str, policy)
+
+    cur.execute(query, window_params(date1_str, date2_str, policy))
+    columns = [desc[0] for desc in cur.description]
+    return columns, cur.fetchall()
+
+
+def fetch_query_by_order(key: str, start_date: date, end_date: date) -> tuple[list[str], list] | None:
+    """
+    Выполняет один запрос из плана метрик в отдельном соединении.
+    Используется для параллельной выгрузки, где каждый запрос работает в своем потоке.
+
+    Args:
+        key: Имя запроса из плана метрик (см. plan_metric_queries).
+        start_date: Начальная дата для выборки.
+        end_date: Конечная дата для выборки.
+
+    Returns:
+        Кортеж (названия столбцов, строки) или None в случае ошибки.
+    """
+    try:
+        con = fdb.connect(**DB_CONFIG)
+        cur = con.cursor()
+        logging.info(f"Выполнение SQL-запроса по заказам для: {key}...")
+        query = extraction_plan(get_reference_sets(con))[key]
+        return _execute_query_by_order(con, cur, key, query, start_date.strftime('%Y-%m-%d'),
+                                       end_date.strftime('%Y-%m-%d'))
+
+    except fdb.Error as e:
+        logging.error(f"Ошибка при выполнении запроса {key} в базе данных Firebird: {e}")
+        return None
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка хранилища метрик при выполнении запроса {key}: {e}")
+        return None
+    finally:
+        if 'con' in locals() and con:
+            cur.close()
+            con.close()
+
+
+def merge_query_results_by_order(results: dict[str, tuple[list[str], list]]) -> list[dict]:
+    """
+    Объединяет результаты отдельных запросов по заказам (см. fetch_query_by_order).
+
+    Args:
+        results: Словарь имя запроса -> (названия столбцов, строки).
+
+    Returns:
+        Список словарей с данными по заказам.
+    """
+    all_data = {}
+    for key, (columns, rows) in results.items():
+        _merge_rows_by_order(all_data, key, columns, rows)
+    return list(all_data.values())
+
+
+def get_data_from_db_by_order(start_date: date, end_date: date, policy: str = None,
+                              use_metric_store: bool = True) -> list[dict] | None:
     """
     Подключается к базе данных Firebird, выполняет запросы с группировкой по заказам,
     объединяет результаты и возвращает их.
@@ -67,6 +190,11 @@ def get_data_from_db_by_order(start_date: date, end_date: date) -> list[dict] |
     Args:
         start_date: Начальная дата для выборки.
         end_date: Конечная дата для выборки.
+        policy: Политика окна выгрузки (по умолчанию из WINDOW_POLICY_CONFIG). Для явно
+            заданного периода (догрузка, выборочный запуск) передается 'datemodified',
+            чтобы выгружался именно этот период.
+        use_metric_store: Использовать хранилище метрик, если оно включено. Хранилище рассчитано
+            на один процесс, поэтому параллельная догрузка выполняется без него.
 
     Returns:
         Список словарей с данными или None в случае ошибки.
@@ -81,34 +209,64 @@ def get_data_from_db_by_order(start_date: date, end_date: date) -> list[dict] |
         
         all_data = {}
 
-        for key, query in SQL_QUERIES_BY_ORDER.items():
+        for key, query in extraction_plan(get_reference_sets(con), policy, use_metric_store).items():
             logging.info(f"Выполнение SQL-запроса по заказам для: {key}...")
-            cur.execute(query, (date1_str, date2_str))
+            columns, rows = _execute_query_by_order(con, cur, key, query, date1_str, date2_str, policy)
+            _merge_rows_by_order(all_data, key, columns, rows)
 
-            columns = [desc[0] for desc in cur.description]
+        logging.info(f"Получено и объединено данных по {len(all_data)} заказам.")
+        
+        return list(all_data.values())
 
-            for row in cur.fetchall():
-                row_dict = dict(zip(columns, row))
-                proddate = row_dict.pop('PRODDATE')
-                orderno = row_dict.pop('ORDERNO')
+    except fdb.Error as e:
+        logging.error(f"Ошибка при работе с базой данных Firebird: {e}")
+        return None
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка хранилища метрик: {e}")
+        return None
+    finally:
+        if 'con' in locals() and con:
+            cur.close()
+            con.close()
+            logging.info("Соединение с базой данных закрыто.")
 
-                if isinstance(proddate, datetime):
-                    proddate = proddate.date()
 
-                data_key = (proddate, orderno)
+def _find_orderids(cur, order_numbers: list[str]) -> list[int]:
+    """Возвращает orderid заказов с указанными номерами."""
+    orderids = []
+    for i in range(0, len(order_numbers), MAX_IN_LIST_SIZE):
+        chunk = order_numbers[i:i + MAX_IN_LIST_SIZE]
+        cur.execute(SQL_ORDER_IDS_BY_NUMBER.format(placeholders=', '.join('?' * len(chunk))), chunk)
+        orderids.extend(orderid for (orderid,) in cur.fetchall())
+    return orderids
 
-                if data_key not in all_data:
-                    all_data[data_key] = {'PRODDATE': proddate, 'ORDERNO': orderno}
 
-                # Для запроса order_state берем только первую запись (она уже отсортирована по STATEPOSIT DESC)
-                if key == 'order_state':
-                    if 'ORDER_STATE_NAME' not in all_data[data_key]:
-                        all_data[data_key].update(row_dict)
-                else:
-                    all_data[data_key].update(row_dict)
+def get_data_from_db_for_orders(order_numbers: list[str]) -> list[dict] | None:
+    """
+    Подключается к базе данных Firebird и выгружает данные по указанным номерам заказов
+    независимо от окна выгрузки (выборочный запуск main.py --orders).
 
-        logging.info(f"Получено и объединено данных по {len(all_data)} заказам.")
-        
+    Args:
+        order_numbers: Номера заказов.
+
+    Returns:
+        Список словарей с данными (заказы без даты производства не попадают) или None в случае ошибки.
+    """
+    try:
+        logging.info("Подключение к базе данных Firebird для получения данных по номерам заказов...")
+        con = fdb.connect(**DB_CONFIG)
+        cur = con.cursor()
+
+        all_data = {}
+        orderids = _find_orderids(cur, order_numbers)
+        if orderids:
+            for key, query in plan_metric_queries_for_orders(orderids, get_reference_sets(con), standalone=True).items():
+                logging.info(f"Выполнение SQL-запроса по заказам для: {key}...")
+                cur.execute(query)
+                columns = [desc[0] for desc in cur.description]
+                _merge_rows_by_order(all_data, key, columns, cur.fetchall())
+
+        logging.info(f"Получено и объединено данных по {len(all_data)} заказам из {len(order_numbers)} запрошенных.")
         return list(all_data.values())
 
     except fdb.Error as e:
@@ -121,14 +279,128 @@ def get_data_from_db_by_order(start_date: date, end_date: date) -> list[dict] |
             logging.info("Соединение с базой данных закрыто.")
 
 
+def _read_mon_stats(con) -> dict | None:
+    """
+    Читает счетчики ввода-вывода и чтения записей текущего соединения из таблиц MON$.
+
+    Таблицы мониторинга фиксируют снимок на время транзакции, поэтому каждый раз
+    используется новая транзакция.
+
+    Returns:
+        Словарь счетчиков или None, если таблицы мониторинга недоступны.
+    """
+    transaction = con.trans()
+    try:
+        cur = transaction.cursor()
+        cur.execute(SQL_QUERY_MON_STATS)
+        columns = [desc[0].lower() for desc in cur.description]
+        row = cur.fetchone()
+        return dict(zip(columns, row)) if row else None
+    except fdb.Error as e:
+        logging.warning(f"Не удалось прочитать счетчики MON$: {e}")
+        return None
+    finally:
+        transaction.commit()
+
+
+def profile_queries_by_order(start_date: date, end_date: date, report_file: str = None,
+                             policy: str = None) -> list[dict] | None:
+    """
+    Профилирует запросы плана метрик и сохраняет отчет в JSON-файл.
+
+    Для каждого запроса фиксируются план Firebird, время выполнения, время выборки,
+    количество строк и прирост счетчиков MON$ (чтения/записи страниц,
+    последовательные и индексные чтения записей).
+
+    Args:
+        start_date: Начальная дата для выборки.
+        end_date: Конечная дата для выборки.
+        report_file: Путь к файлу отчета.
+        policy: Политика окна выгрузки (по умолчанию из WINDOW_POLICY_CONFIG).
+
+    Returns:
+        Список результатов по запросам или None в случае ошибки.
+    """
+    report_file = report_file or PROFILE_CONFIG['report_file']
+    try:
+        logging.info("Подключение к базе данных Firebird для профилирования запросов...")
+        con = fdb.connect(**DB_CONFIG)
+        cur = con.cursor()
+
+        params = window_params(start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'), policy)
+        results = []
+
+        for key, query in plan_metric_queries(get_reference_sets(con), policy).items():
+            logging.info(f"Профилирование SQL-запроса по заказам для: {key}...")
+            stats_before = _read_mon_stats(con)
+
+            started = time.perf_counter()
+            cur.execute(query, params)
+            executed = time.perf_counter()
+            rows = cur.fetchall()
+            fetched = time.perf_counter()
+
+            stats_after = _read_mon_stats(con)
+            io_stats = None
+            if stats_before is not None and stats_after is not None:
+                io_stats = {name: stats_after[name] - stats_before[name] for name in stats_after}
+
+            results.append({
+                'query': key,
+                'plan': cur.plan,
+                'execute_seconds': round(executed - started, 4),
+                'fetch_seconds': round(fetched - executed, 4),
+                'rows': len(rows),
+                'io': io_stats
+            })
+            logging.info(f"  {key}: выполнение {executed - started:.3f} с, выборка {fetched - executed:.3f} с, строк {len(rows)}")
+
+        report = {
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'window': {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(),
+                       'policy': policy or WINDOW_POLICY_CONFIG['policy'], 'params': list(params)},
+            'total_seconds': round(sum(r['execute_seconds'] + r['fetch_seconds'] for r in results), 4),
+            'queries': sorted(results, key=lambda r: r['execute_seconds'] + r['fetch_seconds'], reverse=True)
+        }
+        with open(report_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logging.info(f"Отчет о профилировании сохранен в {report_file}.")
+
+        return results
+
+    except fdb.Error as e:
+        logging.error(f"Ошибка при работе с базой данных Firebird: {e}")
+        return None
+    finally:
+        if 'con' in locals() and con:
+            cur.close()
+            con.close()
+            logging.info("Соединение с базой данных закрыто.")
+
+
 if __name__ == '__main__':
-    # Пример использования: получить данные за текущий месяц
+    parser = argparse.ArgumentParser(description="Выгрузка данных из Altawin.")
+    parser.add_argument('--profile', action='store_true',
+                        help="Профилировать запросы по заказам и сохранить отчет.")
+    parser.add_argument('--days-back', type=int, default=SYNC_WINDOW['days_back'], help="Сколько дней назад от сегодня захватывать.")
+    parser.add_argument('--days-ahead', type=int, default=SYNC_WINDOW['days_ahead'], help="Сколько дней вперед от сегодня захватывать.")
+    parser.add_argument('--report', default=PROFILE_CONFIG['report_file'], help="Файл отчета о профилировании.")
+    parser.add_argument('--window-policy', choices=WINDOW_POLICIES, default=WINDOW_POLICY_CONFIG['policy'],
+                        help="Политика окна выгрузки для профилирования.")
+    args = parser.parse_args()
+
     today = date.today()
-    first_day_of_month = today.replace(day=1)
-    
-    db_data = get_data_from_db(first_day_of_month, today)
-    
-    if db_data:
-        print("Данные успешно получены:")
-        for row in db_data:
-            print(row)
+
+    if args.profile:
+        profile_queries_by_order(today - timedelta(days=args.days_back),
+                                 today + timedelta(days=args.days_ahead), args.report, args.window_policy)
+    else:
+        # Пример использования: получить данные за текущий месяц
+        first_day_of_month = today.replace(day=1)
+
+        db_data = get_data_from_db(first_day_of_month, today)
+
+        if db_data:
+            print("Данные успешно получены:")
+            for row in db_data:
+                print(row)
@@ -0,0 +1,87 @@
+"""
+Отложенная публикация часто меняющихся заказов.
+
+Пока заказ редактируется в Altawin, его o.datemodified и количества меняются по
+несколько раз за минуты, и каждый цикл записывал бы промежуточные значения.
+Заказ, у которого дата изменения сменилась менее quiet_seconds назад, в этом цикле
+не публикуется; он будет опубликован, когда правки утихнут, но не позже чем через
+max_delay_seconds после того, как его начали откладывать.
+
+Время изменения берется из o.datemodified только для заказа, впервые увиденного
+после запуска; далее - по моменту, когда приложение заметило новую дату изменения
+(так расхождение часов сервера БД и приложения не влияет на задержку).
+"""
+import logging
+import threading
+from datetime import datetime
+from config import DEBOUNCE_CONFIG
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# номер заказа -> {'datemodified', 'changed_at', 'held_since'}
+_state = {}
+_state_lock = threading.Lock()
+
+
+def coalesce_orders(data: list[dict], now: datetime = None) -> tuple[list[dict], list[str]]:
+    """
+    Отбирает заказы, которые можно публиковать в этом цикле.
+
+    Args:
+        data: Список словарей с данными по заказам (с полем DATEMODIFIED).
+        now: Текущее время (для воспроизводимых проверок).
+
+    Returns:
+        Кортеж (записи для публикации, номера отложенных заказов).
+    """
+    now = now or datetime.now()
+    quiet_seconds = DEBOUNCE_CONFIG['quiet_seconds']
+    max_delay_seconds = DEBOUNCE_CONFIG['max_delay_seconds']
+
+    ready = []
+    held = []
+    forced = 0
+    seen = set()
+    with _state_lock:
+        for row_dict in data:
+            order_no = str(row_dict.get('ORDERNO', '')).strip()
+            datemodified = row_dict.get('DATEMODIFIED')
+            seen.add(order_no)
+
+            state = _state.get(order_no)
+            if state is None:
+                changed_at = datemodified if isinstance(datemodified, datetime) else None
+                state = _state[order_no] = {'datemodified': datemodified, 'changed_at': changed_at, 'held_since': None}
+            elif state['datemodified'] != datemodified:
+                state['datemodified'] = datemodified
+                state['changed_at'] = now
+
+            if state['changed_at'] is None or (now - state['changed_at']).total_seconds() >= quiet_seconds:
+                state['held_since'] = None
+                ready.append(row_dict)
+                continue
+
+            if state['held_since'] is None:
+                state['held_since'] = now
+            if (now - state['held_since']).total_seconds() >= max_delay_seconds:
+                # Заказ меняется дольше max_delay - публикуем текущее значение и начинаем ожидание заново
+                state['held_since'] = None
+                forced += 1
+                ready.append(row_dict)
+            else:
+                held.append(order_no)
+
+        # Заказы, выпавшие из окна выгрузки, больше не отслеживаются
+        for order_no in set(_state) - seen:
+            del _state[order_no]
+
+    if held or forced:
+        logging.info(f"Отложенная публикация: отложено заказов {len(held)}, "
+                     f"опубликовано по истечении max_delay {forced}.")
+    return ready, held
+
+
+def reset_debounce():
+    """Сбрасывает состояние, чтобы следующая выгрузка была опубликована без задержки."""
+    with _state_lock:
+        _state.clear()
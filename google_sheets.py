@@ -1,12 +1,100 @@
+import functools
 import gspread
+import json
 import logging
 import math
-from oauth2client.service_account import ServiceAccountCredentials
-from config import GOOGLE_SHEETS_CONFIG, GOOGLE_SHEETS_MAIN_CONFIG
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from google.auth.transport.requests import AuthorizedSession
+from gspread.utils import absolute_range_name, convert_credentials
+from requests.adapters import HTTPAdapter
+from config import (ARCHIVE_CONFIG, DISPLAY_WINDOW_CONFIG, GOOGLE_SHEETS_CONFIG, GOOGLE_SHEETS_MAIN_CONFIG,
+                    ORDERS_APPEND_CONFIG, PRIORITY_LANES_CONFIG, SHEETS_HTTP_CONFIG, SHEETS_TARGETS_CONFIG,
+                    SHEETS_WRITE_CONFIG)
 from datetime import date, datetime, timedelta
+from metrics import sheet_columns
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+SHEETS_SCOPE = ["https://spreadsheets.google.com/feeds", 'https://www.googleapis.com/auth/spreadsheets',
+                "https://www.googleapis.com/auth/drive.file", "https://www.googleapis.com/auth/drive"]
+
+# Авторизованные клиенты и открытые листы переиспользуются между циклами,
+# чтобы не устанавливать заново TLS-соединения и не запрашивать метаданные таблицы.
+_sheets_clients = {}
+_worksheets_cache = {}
+_sheets_lock = threading.Lock()
+
+
+def get_sheets_client(credentials_file: str) -> gspread.Client:
+    """
+    Возвращает общий авторизованный клиент Google Sheets для файла учетных данных.
+
+    Клиент работает через одну HTTP-сессию с пулом keep-alive соединений
+    и запрашивает ответы в сжатом виде (gzip), поэтому все вызовы API в цикле
+    и между циклами используют уже открытые соединения.
+
+    Args:
+        credentials_file: Путь к JSON-файлу сервисного аккаунта.
+
+    Returns:
+        Авторизованный клиент gspread.
+    """
+    with _sheets_lock:
+        client = _sheets_clients.get(credentials_file)
+        if client is None:
+            # oauth2client нужен только для авторизации, поэтому импортируется здесь (ускоряет запуск)
+            from oauth2client.service_account import ServiceAccountCredentials
+
+            logging.info("Авторизация в Google Sheets...")
+            creds = ServiceAccountCredentials.from_json_keyfile_name(credentials_file, SHEETS_SCOPE)
+            session = AuthorizedSession(convert_credentials(creds))
+            adapter = HTTPAdapter(pool_connections=SHEETS_HTTP_CONFIG['pool_connections'],
+                                  pool_maxsize=SHEETS_HTTP_CONFIG['pool_maxsize'])
+            session.mount('https://', adapter)
+            # Google API отдает сжатые ответы, только если User-Agent содержит "gzip"
+            session.headers.update({
+                'Accept-Encoding': 'gzip',
+                'User-Agent': f"{SHEETS_HTTP_CONFIG['user_agent']} (gzip)"
+            })
+            client = gspread.Client(None, session=session)
+            client.set_timeout(SHEETS_HTTP_CONFIG['timeout_seconds'])
+            _sheets_clients[credentials_file] = client
+        return client
+
+
+def open_worksheet(credentials_file: str, spreadsheet_id: str, worksheet_name: str):
+    """
+    Открывает лист таблицы по ID, переиспользуя ранее открытые таблицу и лист.
+
+    Returns:
+        Кортеж (spreadsheet, sheet).
+    """
+    cache_key = (credentials_file, spreadsheet_id, worksheet_name)
+    cached = _worksheets_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    client = get_sheets_client(credentials_file)
+    logging.info(f"Открытие таблицы по ID '{spreadsheet_id}'...")
+    spreadsheet = client.open_by_key(spreadsheet_id)
+    sheet = spreadsheet.worksheet(worksheet_name)
+    with _sheets_lock:
+        _worksheets_cache[cache_key] = (spreadsheet, sheet)
+    return spreadsheet, sheet
+
+
+def reset_sheets_cache():
+    """
+    Сбрасывает открытые таблицы и листы (например, после ошибки API),
+    чтобы при следующем обращении они были открыты заново.
+    """
+    with _sheets_lock:
+        _worksheets_cache.clear()
+
 
 def round_up_to_10(value: float) -> float:
     """
@@ -27,6 +115,79 @@ def round_up_to_10(value: float) -> float:
     """
     return round(value / 10) * 10
 
+
+# Размер кэша отформатированных дат: в цикле встречается немного разных дат производства
+# и смены состояния, поэтому одна и та же строка не собирается для каждого заказа заново
+DATE_FORMAT_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=DATE_FORMAT_CACHE_SIZE)
+def _format_date(value: date) -> str:
+    return value.strftime('%d.%m.%Y')
+
+
+@functools.lru_cache(maxsize=DATE_FORMAT_CACHE_SIZE)
+def _format_datetime(value: date) -> str:
+    return value.strftime('%d.%m.%Y %H:%M:%S')
+
+
+def _convert_integer(value):
+    # Количественные показатели (если нет данных - ставим 0)
+    return value or 0
+
+
+def _convert_money(value):
+    # Преобразуем Decimal в float для JSON сериализации и округляем до 10 рублей
+    return round_up_to_10(float(value)) if value else 0
+
+
+def _convert_date(value):
+    if isinstance(value, (date, datetime)):
+        return _format_date(value)
+    return str(value) if value else ''
+
+
+def _convert_datetime(value):
+    if isinstance(value, (date, datetime)):
+        return _format_datetime(value)
+    return str(value) if value else ''
+
+
+def _convert_text(value):
+    return value or ''
+
+
+# Тип столбца (поле 'type' метрики) -> преобразование значения из БД в значение ячейки.
+# Используется для всех целей записи; столбцы неизвестного типа записываются как текст.
+VALUE_CONVERTERS = {
+    'integer': _convert_integer,
+    'money': _convert_money,
+    'date': _convert_date,
+    'datetime': _convert_datetime,
+    'text': _convert_text
+}
+
+
+def register_value_converter(column_type: str, converter):
+    """
+    Добавляет (или заменяет) преобразование значений для типа столбца.
+
+    Args:
+        column_type: Тип столбца, как в поле 'type' метрики.
+        converter: Функция значение из БД -> значение ячейки.
+    """
+    VALUE_CONVERTERS[column_type] = converter
+
+
+def _column_converters() -> list[tuple[str, object, bool]]:
+    """
+    Возвращает для столбцов реестра метрик кортежи (ключ поля, преобразование, количественный ли столбец).
+    Вычисляется один раз на запись, а не для каждого заказа.
+    """
+    return [(column['key'], VALUE_CONVERTERS.get(column['type'], _convert_text), column['type'] == 'integer')
+            for column in sheet_columns()]
+
+
 def update_google_sheet(data: list[dict]):
     """
     Авторизуется в Google Sheets и обновляет данные на листе,
@@ -38,14 +199,7 @@ def update_google_sheet(data: list[dict]):
         data: Полный список словарей с данными для загрузки.
     """
     try:
-        logging.info("Авторизация в Google Sheets...")
-        scope = ["https://spreadsheets.google.com/feeds", 'https://www.googleapis.com/auth/spreadsheets',
-                 "https://www.googleapis.com/auth/drive.file", "https://www.googleapis.com/auth/drive"]
-        
-        creds = ServiceAccountCredentials.from_json_keyfile_name(
-            GOOGLE_SHEETS_CONFIG['credentials_file'], scope
-        )
-        client = gspread.authorize(creds)
+        client = get_sheets_client(GOOGLE_SHEETS_CONFIG['credentials_file'])
 
         logging.info(f"Открытие таблицы '{GOOGLE_SHEETS_CONFIG['spreadsheet_name']}'...")
         spreadsheet = client.open(GOOGLE_SHEETS_CONFIG['spreadsheet_name'])
@@ -375,19 +529,213 @@ def update_google_sheet(data: list[dict]):
     except Exception as e:
         logging.error(f"Произошла ошибка при работе с Google Sheets: {e}")
 
+# Столбцы листа "Общий": ключ поля сводки -> заголовок столбца (строка 2 листа)
+SUMMARY_COLUMNS = {
+    'PRODDATE': 'Дата',
+    'QTY_IZD_PVH': 'Изделия',
+    'QTY_RAZDV': 'Раздвижки',
+    'QTY_MOSNET': 'МС',
+    'QTY_GLASS_PACKS': 'СП и стекла',
+    'QTY_SANDWICHES': 'Сэндвичи',
+    'QTY_WINDOWSILLS': 'Подоконники',
+    'QTY_IRON': 'Железо'
+}
+
+# Дата, для которой на листе "Общий" применены выделение текущего дня и окно отображения
+_summary_state = {}
+
+
+def _open_summary_worksheet():
+    """
+    Открывает лист "Общий" (таблица по названию из GOOGLE_SHEETS_CONFIG), переиспользуя ранее открытый лист.
+
+    Returns:
+        Кортеж (spreadsheet, sheet).
+    """
+    cache_key = (GOOGLE_SHEETS_CONFIG['credentials_file'], 'name', GOOGLE_SHEETS_CONFIG['spreadsheet_name'],
+                 GOOGLE_SHEETS_CONFIG['worksheet_name'])
+    cached = _worksheets_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    client = get_sheets_client(GOOGLE_SHEETS_CONFIG['credentials_file'])
+    logging.info(f"Открытие таблицы '{GOOGLE_SHEETS_CONFIG['spreadsheet_name']}'...")
+    spreadsheet = client.open(GOOGLE_SHEETS_CONFIG['spreadsheet_name'])
+    sheet = spreadsheet.worksheet(GOOGLE_SHEETS_CONFIG['worksheet_name'])
+    with _sheets_lock:
+        _worksheets_cache[cache_key] = (spreadsheet, sheet)
+    return spreadsheet, sheet
+
+
+def _summary_cell_value(key: str, value):
+    """Преобразует значение сводки в значение ячейки листа "Общий"."""
+    if key == 'PRODDATE':
+        return _format_date(value)
+    value = value or 0
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def _build_summary_format_requests(sheet_id: int, date_rows: dict[str, int], total_rows: int) -> list[dict]:
+    """
+    Формирует запросы форматирования листа "Общий": шрифт 14 жирный, выделение строки текущего дня
+    и окно отображения (показываются даты от 2 дней назад до 5 дней вперед).
+
+    Args:
+        sheet_id: ID листа.
+        date_rows: Карта дата (ДД.ММ.ГГГГ) -> номер строки.
+        total_rows: Количество занятых строк листа.
+    """
+    text_format = {'textFormat': {'fontSize': 14, 'bold': True}}
+    white = {'backgroundColor': {'red': 1.0, 'green': 1.0, 'blue': 1.0}, **text_format}
+    green = {'backgroundColor': {'red': 0.85, 'green': 0.92, 'blue': 0.83}, **text_format}
+    fields = 'userEnteredFormat.backgroundColor,userEnteredFormat.textFormat.fontSize,userEnteredFormat.textFormat.bold'
+    width = len(SUMMARY_COLUMNS)
+
+    requests = [{'repeatCell': {
+        'range': {'sheetId': sheet_id, 'startRowIndex': 1, 'endRowIndex': total_rows},
+        'cell': {'userEnteredFormat': text_format},
+        'fields': 'userEnteredFormat.textFormat.fontSize,userEnteredFormat.textFormat.bold'
+    }}]
+    if total_rows > 2:
+        requests.append({'repeatCell': {
+            'range': {'sheetId': sheet_id, 'startRowIndex': 2, 'endRowIndex': total_rows,
+                      'startColumnIndex': 0, 'endColumnIndex': width},
+            'cell': {'userEnteredFormat': white},
+            'fields': fields
+        }})
+
+    today = date.today()
+    today_row = date_rows.get(_format_date(today))
+    if today_row is not None:
+        requests.append({'repeatCell': {
+            'range': {'sheetId': sheet_id, 'startRowIndex': today_row - 1, 'endRowIndex': today_row,
+                      'startColumnIndex': 0, 'endColumnIndex': width},
+            'cell': {'userEnteredFormat': green},
+            'fields': fields
+        }})
+
+    visible_from = today - timedelta(days=2)
+    visible_to = today + timedelta(days=5)
+    # Строки без распознаваемой даты скрываются
+    rows = dict.fromkeys(range(3, total_rows + 1), True)
+    for date_str, row_number in date_rows.items():
+        try:
+            row_date = datetime.strptime(date_str, '%d.%m.%Y').date()
+        except ValueError:
+            continue
+        rows[row_number] = not (visible_from <= row_date <= visible_to)
+    for first, last, hidden in _group_rows_by_visibility(rows):
+        requests.append({'updateDimensionProperties': {
+            'range': {'sheetId': sheet_id, 'dimension': 'ROWS', 'startIndex': first - 1, 'endIndex': last},
+            'properties': {'hiddenByUser': hidden},
+            'fields': 'hiddenByUser'
+        }})
+    return requests
+
+
+def update_google_sheet_summary(summary: list[dict]) -> bool:
+    """
+    Записывает сводку по датам производства на лист "Общий", изменяя только отличающиеся ячейки.
+
+    Строки ищутся по дате (столбец "Дата", заголовки в строке 2); отсутствующие даты
+    добавляются в конец листа с наследованием форматирования. Выделение текущего дня
+    и окно отображения применяются, когда меняется дата или добавляются строки.
+
+    Args:
+        summary: Сводка из daily_summary.build_daily_summary (по строке на дату).
+
+    Returns:
+        True, если сводка записана, иначе False.
+    """
+    try:
+        spreadsheet, sheet = _open_summary_worksheet()
+        try:
+            sheet_values = sheet.get_all_values(value_render_option='UNFORMATTED_VALUE',
+                                                date_time_render_option='FORMATTED_STRING')
+        except gspread.exceptions.GSpreadException as e:
+            logging.warning(f"Не удалось прочитать лист '{GOOGLE_SHEETS_CONFIG['worksheet_name']}' (возможно, он пуст): {e}")
+            sheet_values = []
+
+        now = datetime.now().strftime('%d.%m.%Y %H:%M:%S')
+        value_data = [{'range': absolute_range_name(sheet.title, 'F1'), 'values': [[f"Последнее обновление: {now}"]]}]
+
+        if len(sheet_values) < 2:
+            # Пустой лист: заголовок в строке 2, данные с третьей строки
+            header = list(SUMMARY_COLUMNS.values())
+            rows = [header] + [[_summary_cell_value(key, row_dict.get(key)) for key in SUMMARY_COLUMNS]
+                               for row_dict in summary]
+            value_data.append({'range': absolute_range_name(sheet.title, 'A2'), 'values': rows})
+            spreadsheet.values_batch_update({'valueInputOption': 'USER_ENTERED', 'data': value_data})
+            logging.info(f"Лист '{GOOGLE_SHEETS_CONFIG['worksheet_name']}' был пуст, записано дат: {len(summary)}.")
+            _summary_state.clear()
+            return True
+
+        header = [str(h).strip() for h in sheet_values[1]]
+        if 'Дата' not in header:
+            logging.error("На листе в строке 2 отсутствует столбец 'Дата'. Невозможно выполнить обновление.")
+            return False
+        columns = {key: header.index(title) for key, title in SUMMARY_COLUMNS.items() if title in header}
+        date_col = columns['PRODDATE']
+        date_rows = {str(row[date_col]).strip(): i for i, row in enumerate(sheet_values[2:], start=3)
+                     if date_col < len(row) and str(row[date_col]).strip()}
+
+        new_rows = []
+        changed_cells = 0
+        for row_dict in summary:
+            values = {key: _summary_cell_value(key, row_dict.get(key)) for key in SUMMARY_COLUMNS}
+            row_number = date_rows.get(values['PRODDATE'])
+            if row_number is None:
+                row = [''] * len(header)
+                for key, col_idx in columns.items():
+                    row[col_idx] = values[key]
+                new_rows.append(row)
+                continue
+
+            sheet_row = sheet_values[row_number - 1]
+            for key, col_idx in columns.items():
+                old_value = sheet_row[col_idx] if col_idx < len(sheet_row) else ''
+                if key != 'PRODDATE' and _cell_value_changed(old_value, values[key]):
+                    value_data.append({'range': absolute_range_name(sheet.title, f'{col_idx_to_letter(col_idx)}{row_number}'),
+                                       'values': [[values[key]]]})
+                    changed_cells += 1
+
+        spreadsheet.values_batch_update({'valueInputOption': 'USER_ENTERED', 'data': value_data})
+
+        total_rows = len(sheet_values)
+        if new_rows:
+            new_rows.sort(key=lambda r: datetime.strptime(r[date_col], '%d.%m.%Y'))
+            sheet.insert_rows(new_rows, row=total_rows + 1, value_input_option='USER_ENTERED', inherit_from_before=True)
+            for row in new_rows:
+                total_rows += 1
+                date_rows[row[date_col]] = total_rows
+
+        if new_rows or _summary_state.get('formatted_for') != date.today():
+            sheet_id = sheet.id if hasattr(sheet, 'id') else sheet._properties.get('sheetId')
+            spreadsheet.batch_update({'requests': _build_summary_format_requests(sheet_id, date_rows, total_rows)})
+            _summary_state['formatted_for'] = date.today()
+
+        logging.info(f"Лист '{GOOGLE_SHEETS_CONFIG['worksheet_name']}': изменено ячеек {changed_cells}, "
+                     f"добавлено дат {len(new_rows)}.")
+        return True
+
+    except FileNotFoundError:
+        logging.error(f"Файл {GOOGLE_SHEETS_CONFIG['credentials_file']} не найден.")
+        return False
+    except Exception as e:
+        logging.error(f"Произошла ошибка при работе с Google Sheets (лист '{GOOGLE_SHEETS_CONFIG['worksheet_name']}'): {e}",
+                      exc_info=True)
+        reset_sheets_cache()
+        return False
+
+
 def update_google_sheet_by_order(data: list[dict]):
     """
     Авторизуется в Google Sheets и обновляет данные на листе "Расшифр по заказам".
     """
     try:
-        logging.info("Авторизация в Google Sheets для обновления данных по заказам...")
-        scope = ["https://spreadsheets.google.com/feeds", 'https://www.googleapis.com/auth/spreadsheets',
-                 "https://www.googleapis.com/auth/drive.file", "https://www.googleapis.com/auth/drive"]
-        
-        creds = ServiceAccountCredentials.from_json_keyfile_name(
-            GOOGLE_SHEETS_CONFIG['credentials_file'], scope
-        )
-        client = gspread.authorize(creds)
+        client = get_sheets_client(GOOGLE_SHEETS_CONFIG['credentials_file'])
 
         logging.info(f"Открытие таблицы '{GOOGLE_SHEETS_CONFIG['spreadsheet_name']}'...")
         spreadsheet = client.open(GOOGLE_SHEETS_CONFIG['spreadsheet_name'])
@@ -599,430 +947,965 @@ def update_google_sheet_by_order(data: list[dict]):
         logging.error(f"Произошла ошибка при работе с Google Sheets: {e}")
 
 
-def update_google_sheet_orders(data: list[dict]):
+# Столбцы листа "Заказы", которые заполняются из БД, описаны в реестре метрик (metrics.py):
+# key - поле в данных из БД, column - название столбца в строке заголовков,
+# type - способ преобразования значения, required - обязателен ли столбец на листе.
+
+# Видимость строк листа "Заказы", отправленная в последний раз, по листам целей
+# (spreadsheet_id, название листа) -> {'hidden', 'order_to_row_map', 'row_count', 'refreshed_at'}
+_display_state = {}
+_display_lock = threading.Lock()
+
+# Возможные названия столбца с номером заказа
+ORDER_NUMBER_HEADERS = ['номер', 'Номер', 'Номер заказа', 'ном ер']
+
+# Лимит запросов Google Sheets API в минуту на пользователя (отдельно для чтения и для записи)
+SHEETS_QUOTA_PER_MINUTE = 60
+
+
+def col_idx_to_letter(idx: int) -> str:
+    """Преобразует индекс столбца (0-based) в буквенное обозначение (A, B, ..., Z, AA, AB, ...)."""
+    result = ""
+    idx += 1  # Переводим в 1-based
+    while idx > 0:
+        idx -= 1
+        result = chr(ord('A') + (idx % 26)) + result
+        idx //= 26
+    return result
+
+
+def get_sheets_targets() -> list[dict]:
     """
-    Обновляет данные на листе "Заказы" в основной таблице.
-    Находит строку по номеру заказа (столбец B) и обновляет нужные поля.
-    Если номер заказа не найден, пропускает эту запись.
+    Возвращает цели записи листа "Заказы" (см. SHEETS_TARGETS_CONFIG).
+
+    Returns:
+        Список целей. Если файл целей не задан или отсутствует - только основная таблица.
+
+    Raises:
+        ValueError: Если в файле целей нет обязательных полей или повторяются имена.
+    """
+    targets_file = SHEETS_TARGETS_CONFIG['targets_file']
+    if not targets_file or not os.path.exists(targets_file):
+        return [{
+            'name': 'main',
+            'credentials_file': GOOGLE_SHEETS_MAIN_CONFIG['credentials_file'],
+            'spreadsheet_id': GOOGLE_SHEETS_MAIN_CONFIG['spreadsheet_id'],
+            'worksheet_name': GOOGLE_SHEETS_MAIN_CONFIG['worksheet_name_orders']
+        }]
+
+    with open(targets_file, 'r', encoding='utf-8') as f:
+        targets = json.load(f)
+
+    names = set()
+    for target in targets:
+        missing = [field for field in ('name', 'spreadsheet_id', 'worksheet_name') if not target.get(field)]
+        if missing:
+            raise ValueError(f"В цели {target} из {targets_file} не заданы поля: {', '.join(missing)}")
+        if target['name'] in names:
+            raise ValueError(f"Цель '{target['name']}' указана в {targets_file} несколько раз.")
+        names.add(target['name'])
+        target.setdefault('credentials_file', GOOGLE_SHEETS_MAIN_CONFIG['credentials_file'])
+    return targets
+
+
+def _target_columns(target: dict) -> list[dict]:
+    """
+    Возвращает описания столбцов, которые заполняются на листе цели.
+    Если у цели задана карта columns, берутся только перечисленные метрики с названиями столбцов цели.
+    """
+    mapping = target.get('columns')
+    if not mapping:
+        return sheet_columns()
+    return [{**column, 'column': mapping[column['key']]} for column in sheet_columns() if column['key'] in mapping]
+
+
+def _open_orders_worksheet(target: dict = None):
+    """
+    Открывает лист "Заказы" цели (по умолчанию основной таблицы) через общий клиент Google Sheets.
+
+    Returns:
+        Кортеж (spreadsheet, sheet).
+    """
+    target = target or get_sheets_targets()[0]
+    return open_worksheet(target['credentials_file'], target['spreadsheet_id'], target['worksheet_name'])
+
+
+def _read_orders_sheet_header(sheet) -> list[str]:
+    """
+    Читает строку заголовков листа "Заказы".
+
+    Returns:
+        Заголовки без пробелов по краям (пустой список, если лист прочитать не удалось).
+    """
+    logging.info("Получение заголовков листа 'Заказы'...")
+    try:
+        return [str(h).strip() for h in sheet.row_values(1)]
+    except gspread.exceptions.GSpreadException as e:
+        logging.warning(f"Не удалось прочитать лист (возможно, он пуст): {e}")
+        return []
+
+
+def _read_orders_sheet_columns(spreadsheet, sheet, col_indices: list[int],
+                               unformatted: bool = False) -> dict[int, list] | None:
+    """
+    Читает столбцы листа "Заказы" одним запросом values_batch_get (по столбцам).
+
+    Читаются только нужные столбцы, а ответ сразу разбирается на отдельные списки,
+    поэтому сетка всех ячеек листа в памяти не хранится.
+
+    Args:
+        spreadsheet: Таблица gspread.
+        sheet: Лист gspread.
+        col_indices: Индексы столбцов (0-based).
+        unformatted: Читать числа без форматирования (даты при этом остаются строками).
+            Нужно для сравнения значений на листе с данными из БД.
+
+    Returns:
+        Словарь индекс столбца -> значения столбца начиная со строки 1 (пустые ячейки
+        в конце столбца не возвращаются) или None, если лист прочитать не удалось.
+    """
+    logging.info("Получение существующих данных из листа 'Заказы'...")
+    params = {'majorDimension': 'COLUMNS'}
+    if unformatted:
+        params.update(valueRenderOption='UNFORMATTED_VALUE', dateTimeRenderOption='FORMATTED_STRING')
+    ranges = [absolute_range_name(sheet.title, f'{col_idx_to_letter(idx)}:{col_idx_to_letter(idx)}')
+              for idx in col_indices]
+    try:
+        response = spreadsheet.values_batch_get(ranges, params=params)
+    except gspread.exceptions.GSpreadException as e:
+        logging.warning(f"Не удалось прочитать столбцы листа: {e}")
+        return None
+
+    column_values = {}
+    for idx, value_range in zip(col_indices, response.get('valueRanges', [])):
+        values = value_range.get('values')
+        column_values[idx] = values[0] if values else []
+    return column_values
+
+
+def _find_orders_columns(header: list[str], target_columns: list[dict] = None) -> tuple[int, dict[str, int]]:
+    """
+    Определяет индексы столбцов листа "Заказы" по строке заголовков.
+
+    Args:
+        header: Заголовки из первой строки листа.
+        target_columns: Описания заполняемых столбцов (по умолчанию - все столбцы реестра метрик).
+
+    Returns:
+        Кортеж (индекс столбца с номером заказа, словарь ключ поля -> индекс столбца).
+        Необязательные столбцы, которых нет на листе, в словарь не попадают.
+
+    Raises:
+        ValueError: Если не найден столбец с номером заказа или обязательный столбец.
+    """
+    # Пробуем найти столбец с номером заказа по разным вариантам названия
+    order_col_idx = None
+    for possible_name in ORDER_NUMBER_HEADERS:
+        if possible_name in header:
+            order_col_idx = header.index(possible_name)
+            logging.info(f"Найден столбец с номером заказа: '{possible_name}' (индекс {order_col_idx})")
+            break
+
+    if order_col_idx is None:
+        raise ValueError("Не найден столбец с номером заказа. Проверьте заголовки.")
+
+    # Ищем остальные столбцы, используя точные названия из заголовков
+    columns = {}
+    missing_columns = []
+    for column in target_columns or sheet_columns():
+        if column['column'] in header:
+            columns[column['key']] = header.index(column['column'])
+        elif column['required']:
+            missing_columns.append(column['column'])
+        else:
+            # Необязательный столбец, просто предупредим если его нет
+            logging.warning(f"Столбец '{column['column']}' не найден в таблице. Данные этого столбца не будут обновлены.")
+
+    if missing_columns:
+        raise ValueError(f"Не найдены столбцы: {', '.join(missing_columns)}")
+
+    # Логируем найденные индексы столбцов
+    logging.info(f"Индексы столбцов: order={order_col_idx}, "
+                 + ", ".join(f"{key.lower()}={idx}" for key, idx in columns.items()))
+    return order_col_idx, columns
+
+
+def _build_order_to_row_map(order_values: list) -> dict[str, int]:
+    """
+    Создает карту: номер заказа -> номер строки на листе (1-based для API).
+
+    Args:
+        order_values: Значения столбца с номером заказа начиная со строки 1.
+    """
+    order_to_row_map = {}
+    for i, value in enumerate(order_values[1:], start=2):  # Начинаем со строки 2 (индекс 0 - заголовок)
+        order_number = str(value).strip()
+        if order_number:
+            order_to_row_map[order_number] = i
+    return order_to_row_map
+
+
+def snapshot_cell_value(snapshot: dict, row_number: int, col_idx: int):
+    """
+    Возвращает значение ячейки из снимка листа (пустая строка для непрочитанной или пустой ячейки).
+
+    Args:
+        snapshot: Снимок листа из load_orders_snapshot.
+        row_number: Номер строки (1-based).
+        col_idx: Индекс столбца (0-based).
+    """
+    values = snapshot['column_values'].get(col_idx, ())
+    return values[row_number - 1] if row_number - 1 < len(values) else ''
+
+
+def _prepare_order_values(row_dict: dict, converters: list[tuple[str, object, bool]] = None) -> dict:
+    """
+    Преобразует запись заказа из БД в значения для ячеек листа "Заказы".
+
+    Args:
+        row_dict: Запись заказа из БД.
+        converters: Результат _column_converters (чтобы не строить его для каждого заказа).
+
+    Returns:
+        Словарь ключ поля -> значение для записи в ячейку.
+    """
+    converters = converters or _column_converters()
+    values = {key: convert(row_dict.get(key)) for key, convert, _ in converters}
+
+    # Определяем готовность: если все количества = 0, то "Готов", иначе берем из БД
+    if 'READINESS' in values:
+        if all(values[key] == 0 for key, _, is_qty in converters if is_qty):
+            values['READINESS'] = 'Готов'
+        else:
+            values['READINESS'] = values['READINESS'] or 'Не готов'
+
+    return values
+
+
+# Полосы публикации в порядке записи (индекс - значение поля lane обновления)
+PUBLISH_LANES = ['состояние и заказы на сегодня', 'количества', 'старые заказы']
+
+
+def _update_lane(column: dict, proddate, today: date) -> int:
+    """
+    Возвращает полосу публикации ячейки: 0 - приоритетные столбцы (состояние, готовность)
+    и заказы с датой производства сегодня, 1 - остальные столбцы текущих и будущих заказов,
+    2 - заказы с прошедшей датой производства.
+    """
+    if isinstance(proddate, datetime):
+        proddate = proddate.date()
+    if column.get('priority') or proddate == today:
+        return 0
+    if not isinstance(proddate, date) or proddate > today:
+        return 1
+    return 2
+
+
+def _build_orders_updates(data: list[dict], order_to_row_map: dict[str, int], columns: dict[str, int],
+                          target_columns: list[dict] = None) -> tuple[list[dict], int, list[str]]:
+    """
+    Формирует список обновлений ячеек листа "Заказы".
 
     Args:
         data: Список словарей с данными из БД (с группировкой по заказам).
+        order_to_row_map: Карта номер заказа -> номер строки.
+        columns: Словарь ключ поля -> индекс столбца.
+        target_columns: Описания заполняемых столбцов (по умолчанию - все столбцы реестра метрик).
+
+    Returns:
+        Кортеж (обновления, количество обновленных заказов, номера пропущенных заказов).
+        Каждое обновление - словарь с ключами order, key, row, col, range, values и lane (см. PUBLISH_LANES).
     """
+    updates = []
+    updated_count = 0
+    skipped_orders = []
+    converters = _column_converters()
+    today = date.today()
+
+    for row_dict in data:
+        order_no = str(row_dict.get('ORDERNO', '')).strip()
+        if not order_no:
+            logging.warning(f"Пропущен заказ с пустым номером: {row_dict}")
+            skipped_orders.append(order_no)
+            continue
+
+        if order_no not in order_to_row_map:
+            logging.warning(f"Заказ №{order_no} не найден в таблице (дата: {row_dict.get('PRODDATE')}), пропускаем.")
+            skipped_orders.append(order_no)
+            continue
+
+        row_number = order_to_row_map[order_no]
+        values = _prepare_order_values(row_dict, converters)
+
+        # Отладочное логирование для первых 5 заказов
+        if updated_count < 5:
+            logging.info(f"Заказ №{order_no}: PRODDATE={values.get('PRODDATE')}, TOTALPRICE={values.get('TOTALPRICE')}, "
+                         f"QTY_IRON={values.get('QTY_IRON')}, READINESS={values.get('READINESS')}")
+            logging.info(f"  Все ключи row_dict: {list(row_dict.keys())}")
+            logging.info(f"  Значение TOTALPRICE из row_dict: {row_dict.get('TOTALPRICE', 'ОТСУТСТВУЕТ')}")
+
+        # Обновляем каждый столбец отдельно, используя динамические индексы
+        for column in target_columns or sheet_columns():
+            col_idx = columns.get(column['key'])
+            if col_idx is None:
+                continue
+            updates.append({
+                'order': order_no,
+                'key': column['key'],
+                'row': row_number,
+                'col': col_idx,
+                'range': f'{col_idx_to_letter(col_idx)}{row_number}',
+                'values': [[values[column['key']]]],
+                'lane': _update_lane(column, row_dict.get('PRODDATE'), today)
+            })
+
+        updated_count += 1
+
+    return updates, updated_count, skipped_orders
+
+
+def _build_orders_format_requests(sheet_id: int, columns: dict[str, int],
+                                  target_columns: list[dict] = None) -> list[dict]:
+    """
+    Формирует запросы форматирования столбцов листа "Заказы":
+    сумма заказа - денежный формат, количества - целые числа,
+    текстовые столбцы - шрифт 11, не жирный, с выравниванием.
+    """
+    format_requests = []
+
+    for column in target_columns or sheet_columns():
+        col_idx = columns.get(column['key'])
+        if col_idx is None:
+            continue
+
+        column_range = {
+            'sheetId': sheet_id,
+            'startColumnIndex': col_idx,
+            'endColumnIndex': col_idx + 1
+        }
+        if column['type'] == 'money':
+            # Денежное значение с 2 знаками после запятой
+            cell_format = {'numberFormat': {'type': 'NUMBER', 'pattern': '#,##0.00'}}
+            fields = 'userEnteredFormat.numberFormat'
+        elif column['type'] == 'integer':
+            cell_format = {'numberFormat': {'type': 'NUMBER', 'pattern': '0'}}
+            fields = 'userEnteredFormat.numberFormat'
+        elif 'align' in column:
+            cell_format = {
+                'textFormat': {'fontSize': 11, 'bold': False},
+                'horizontalAlignment': column['align']
+            }
+            fields = 'userEnteredFormat.textFormat,userEnteredFormat.horizontalAlignment'
+        else:
+            continue
+
+        format_requests.append({
+            'repeatCell': {
+                'range': column_range,
+                'cell': {'userEnteredFormat': cell_format},
+                'fields': fields
+            }
+        })
+
+    return format_requests
+
+
+def _cell_value_changed(old_value, new_value) -> bool:
+    """
+    Сравнивает значение ячейки на листе с новым значением.
+    Числа сравниваются как числа, остальное - как строки без пробелов по краям.
+    """
+    if isinstance(new_value, (int, float, Decimal)) and not isinstance(new_value, bool):
+        try:
+            return not math.isclose(float(old_value), float(new_value), abs_tol=1e-9)
+        except (TypeError, ValueError):
+            return True
+    return str(old_value).strip() != str(new_value).strip()
+
+
+def load_orders_snapshot(unformatted: bool = False, target: dict = None) -> dict | None:
+    """
+    Открывает лист "Заказы", читает его и определяет столбцы и строки заказов.
+
+    Args:
+        unformatted: Читать числа без форматирования (для сравнения с данными из БД).
+        target: Цель записи из get_sheets_targets (по умолчанию - основная таблица).
+
+    Returns:
+        Словарь с целью (target, target_columns), ссылками на таблицу и лист (spreadsheet, sheet),
+        заголовками (header), числом строк (row_count), значениями заполняемых столбцов
+        (column_values: индекс столбца -> значения, см. snapshot_cell_value), индексами столбцов
+        (order_col_idx, columns) и картой заказов (order_to_row_map) или None,
+        если лист не подходит для обновления.
+    """
+    target = target or get_sheets_targets()[0]
+    target_columns = _target_columns(target)
+    spreadsheet, sheet = _open_orders_worksheet(target)
+
+    # Получаем заголовки из первой строки
+    header = _read_orders_sheet_header(sheet)
+    if not header:
+        logging.error("Лист 'Заказы' пуст или не содержит заголовков. Невозможно выполнить обновление.")
+        return None
+    logging.info(f"Заголовки таблицы: {header}")
+
     try:
-        logging.info("Авторизация в Google Sheets для обновления листа 'Заказы'...")
-        scope = ["https://spreadsheets.google.com/feeds", 'https://www.googleapis.com/auth/spreadsheets',
-                 "https://www.googleapis.com/auth/drive.file", "https://www.googleapis.com/auth/drive"]
+        order_col_idx, columns = _find_orders_columns(header, target_columns)
+    except ValueError as e:
+        logging.error(f"На листе 'Заказы' отсутствует обязательный столбец: {e}. Невозможно выполнить обновление.")
+        return None
+
+    # Читаем только столбец с номером заказа и заполняемые столбцы; столбец с номером
+    # заказа нужен только для карты заказов и после ее построения не хранится
+    column_values = _read_orders_sheet_columns(spreadsheet, sheet, [order_col_idx] + sorted(set(columns.values())),
+                                               unformatted)
+    if column_values is None:
+        logging.error("Не удалось прочитать лист 'Заказы'. Невозможно выполнить обновление.")
+        return None
+    # Строки 1 и 2 - заголовки и время обновления
+    row_count = max([2] + [len(values) for values in column_values.values()])
+    order_to_row_map = _build_order_to_row_map(column_values.pop(order_col_idx))
+    logging.info(f"Найдено {len(order_to_row_map)} заказов в таблице.")
+
+    return {
+        'target': target,
+        'target_columns': target_columns,
+        'spreadsheet': spreadsheet,
+        'sheet': sheet,
+        'header': header,
+        'row_count': row_count,
+        'column_values': column_values,
+        'order_col_idx': order_col_idx,
+        'columns': columns,
+        'order_to_row_map': order_to_row_map
+    }
+
+
+def build_orders_updates(data: list[dict], snapshot: dict) -> tuple[list[dict], int, list[str]]:
+    """
+    Формирует обновления ячеек листа "Заказы" для данных из БД.
+
+    Args:
+        data: Список словарей с данными из БД (с группировкой по заказам).
+        snapshot: Снимок листа из load_orders_snapshot.
+
+    Returns:
+        Кортеж (обновления, количество обновленных заказов, номера пропущенных заказов).
+    """
+    return _build_orders_updates(data, snapshot['order_to_row_map'], snapshot['columns'], snapshot['target_columns'])
+
+
+def find_missing_orders(data: list[dict], snapshot: dict) -> list[dict]:
+    """
+    Находит заказы из БД, которых нет на листе "Заказы".
+
+    Заказы старше границы архива (если архивирование включено) не считаются
+    отсутствующими: они уже перенесены на листы архива.
+
+    Args:
+        data: Список словарей с данными из БД (с группировкой по заказам).
+        snapshot: Снимок листа из load_orders_snapshot.
+
+    Returns:
+        Записи отсутствующих заказов, отсортированные по дате производства и номеру.
+    """
+    archive_horizon = None
+    if ARCHIVE_CONFIG['enabled']:
+        archive_horizon = date.today() - timedelta(days=ARCHIVE_CONFIG['horizon_days'])
+
+    missing = {}
+    for row_dict in data:
+        order_no = str(row_dict.get('ORDERNO', '')).strip()
+        if not order_no or order_no in snapshot['order_to_row_map']:
+            continue
+        proddate = row_dict.get('PRODDATE')
+        if isinstance(proddate, datetime):
+            proddate = proddate.date()
+        if archive_horizon is not None and isinstance(proddate, date) and proddate < archive_horizon:
+            continue
+        missing[order_no] = row_dict
+
+    return sorted(missing.values(), key=lambda row_dict: (
+        row_dict.get('PRODDATE') is None, row_dict.get('PRODDATE') or date.min, str(row_dict.get('ORDERNO')).strip()
+    ))
+
+
+def _last_used_row(snapshot: dict) -> int:
+    """
+    Возвращает номер последней занятой строки листа по всем столбцам.
+
+    Снимок содержит только заполняемые столбцы, поэтому ниже его строк могут быть
+    данные в остальных столбцах. Строки ниже снимка читаются целиком (обычно это
+    пустой хвост листа, и ответ маленький).
+    """
+    sheet = snapshot['sheet']
+    row_count = snapshot['row_count']
+    last_column = col_idx_to_letter(max(sheet.col_count, len(snapshot['header'])) - 1)
+    tail = sheet.get(f'A{row_count + 1}:{last_column}')
+    return row_count + len(tail)
+
+
+def append_missing_orders(data: list[dict], snapshot: dict) -> int:
+    """
+    Добавляет в конец листа "Заказы" строки для заказов, которых на нем нет.
+
+    Все строки добавляются одним вызовом (insert_rows с inherit_from_before, чтобы новые
+    строки получили оформление предыдущей). В строку записывается только номер заказа,
+    а карта заказов снимка дополняется в памяти, поэтому остальные значения
+    записываются тем же циклом вместе с обновлениями существующих строк.
+
+    Args:
+        data: Список словарей с данными из БД (с группировкой по заказам).
+        snapshot: Снимок листа из load_orders_snapshot (изменяется на месте).
+
+    Returns:
+        Количество добавленных строк.
+    """
+    missing = find_missing_orders(data, snapshot)
+    if not missing:
+        return 0
+
+    order_col_idx = snapshot['order_col_idx']
+    rows = []
+    for row_dict in missing:
+        row = [''] * (order_col_idx + 1)
+        row[order_col_idx] = str(row_dict['ORDERNO']).strip()
+        rows.append(row)
+
+    first_row = _last_used_row(snapshot) + 1
+    snapshot['sheet'].insert_rows(rows, row=first_row, value_input_option='USER_ENTERED', inherit_from_before=True)
+
+    # Заполняемые столбцы новых строк пусты, поэтому в значения снимка они не добавляются
+    for offset, row in enumerate(rows):
+        snapshot['order_to_row_map'][row[order_col_idx]] = first_row + offset
+    snapshot['row_count'] = first_row + len(rows) - 1
+
+    logging.info(f"Добавлено на лист 'Заказы' новых заказов: {len(rows)} (строки {first_row}-{first_row + len(rows) - 1}).")
+    return len(rows)
+
+
+def _split_by_payload(items: list, max_payload_bytes: int) -> list[list]:
+    """
+    Делит элементы запроса на части так, чтобы размер каждой части в JSON
+    не превышал max_payload_bytes. Элемент больше лимита отправляется отдельной частью.
+    """
+    chunks = []
+    chunk = []
+    chunk_size = 0
+    for item in items:
+        item_size = len(json.dumps(item, ensure_ascii=False, default=str).encode('utf-8')) + 1
+        if chunk and chunk_size + item_size > max_payload_bytes:
+            chunks.append(chunk)
+            chunk = []
+            chunk_size = 0
+        chunk.append(item)
+        chunk_size += item_size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _group_rows_by_visibility(rows: dict[int, bool]) -> list[tuple[int, int, bool]]:
+    """
+    Объединяет строки с одинаковой видимостью в непрерывные диапазоны.
+
+    Returns:
+        Список (первая строка, последняя строка, скрыта ли) с номерами строк 1-based.
+    """
+    runs = []
+    for row_number in sorted(rows):
+        hidden = rows[row_number]
+        if runs and runs[-1][1] == row_number - 1 and runs[-1][2] == hidden:
+            runs[-1] = (runs[-1][0], row_number, hidden)
+        else:
+            runs.append((row_number, row_number, hidden))
+    return runs
+
+
+def build_display_requests(snapshot: dict, updates: list[dict]) -> tuple[list[dict], dict] | None:
+    """
+    Формирует запросы скрытия/показа строк листа "Заказы" по окну отображения.
 
-        creds = ServiceAccountCredentials.from_json_keyfile_name(
-            GOOGLE_SHEETS_MAIN_CONFIG['credentials_file'], scope
-        )
-        client = gspread.authorize(creds)
+    Дата производства каждой строки берется из прочитанного в цикле листа и из записываемых
+    в этом цикле значений, поэтому повторное чтение листа не нужно. Отправляются только
+    строки, видимость которых изменилась с прошлого цикла. Видимость всех строк отправляется
+    при первом запуске, при изменении расположения заказов на листе и раз в full_refresh_minutes.
 
-        logging.info(f"Открытие таблицы по ID '{GOOGLE_SHEETS_MAIN_CONFIG['spreadsheet_id']}'...")
-        spreadsheet = client.open_by_key(GOOGLE_SHEETS_MAIN_CONFIG['spreadsheet_id'])
-        sheet = spreadsheet.worksheet(GOOGLE_SHEETS_MAIN_CONFIG['worksheet_name_orders'])
+    Args:
+        snapshot: Снимок листа из load_orders_snapshot.
+        updates: Обновления из build_orders_updates.
 
-        logging.info("Получение существующих данных из листа 'Заказы'...")
+    Returns:
+        Кортеж (запросы, новое состояние видимости) или None, если окно выключено
+        или на листе нет даты производства.
+    """
+    if not DISPLAY_WINDOW_CONFIG['enabled'] or 'PRODDATE' not in snapshot['columns']:
+        return None
+
+    today = date.today()
+    start_date = today - timedelta(days=DISPLAY_WINDOW_CONFIG['days_before'])
+    end_date = today + timedelta(days=DISPLAY_WINDOW_CONFIG['days_after'])
+
+    proddate_col = snapshot['columns']['PRODDATE']
+    row_count = snapshot['row_count']
+    proddates = {}
+    # Строки 1 и 2 - заголовки и время обновления
+    for row_number in range(3, row_count + 1):
+        proddates[row_number] = snapshot_cell_value(snapshot, row_number, proddate_col)
+    for update in updates:
+        if update['key'] == 'PRODDATE':
+            proddates[update['row']] = update['values'][0][0]
+
+    hidden = {}
+    for row_number, raw_date in proddates.items():
         try:
-            sheet_values = sheet.get_all_values()
-        except gspread.exceptions.GSpreadException as e:
-            logging.warning(f"Не удалось прочитать лист (возможно, он пуст): {e}")
-            sheet_values = []
+            row_date = datetime.strptime(str(raw_date).strip(), '%d.%m.%Y').date()
+            hidden[row_number] = not (start_date <= row_date <= end_date)
+        except ValueError:
+            # Если дата не парсится - скрываем
+            hidden[row_number] = True
+
+    target = snapshot['target']
+    state_key = (target['spreadsheet_id'], target['worksheet_name'])
+    now = time.monotonic()
+    with _display_lock:
+        previous = _display_state.get(state_key)
+
+    full_refresh = (previous is None
+                    or previous['order_to_row_map'] != snapshot['order_to_row_map']
+                    or previous['row_count'] != row_count
+                    or now - previous['refreshed_at'] >= DISPLAY_WINDOW_CONFIG['full_refresh_minutes'] * 60)
+    if full_refresh:
+        changed = hidden
+    else:
+        changed = {row: value for row, value in hidden.items() if previous['hidden'].get(row) != value}
+
+    sheet = snapshot['sheet']
+    sheet_id = sheet.id if hasattr(sheet, 'id') else sheet._properties.get('sheetId')
+    requests = [{
+        'updateDimensionProperties': {
+            'range': {'sheetId': sheet_id, 'dimension': 'ROWS', 'startIndex': first - 1, 'endIndex': last},
+            'properties': {'hiddenByUser': is_hidden},
+            'fields': 'hiddenByUser'
+        }
+    } for first, last, is_hidden in _group_rows_by_visibility(changed)]
+
+    state = {
+        'key': state_key,
+        'hidden': hidden,
+        'order_to_row_map': dict(snapshot['order_to_row_map']),
+        'row_count': row_count,
+        'refreshed_at': now if full_refresh else previous['refreshed_at']
+    }
+    return requests, state
+
+
+def build_orders_write_calls(snapshot: dict, updates: list[dict], max_payload_bytes: int = None) -> list[dict]:
+    """
+    Собирает все записи цикла на лист "Заказы" в минимальное число вызовов API.
 
-        if not sheet_values or len(sheet_values) < 2:
-            logging.error("Лист 'Заказы' пуст или не содержит заголовков. Невозможно выполнить обновление.")
-            return
+    Значения ячеек и время последнего обновления (A2) отправляются одним вызовом
+    values:batchUpdate с USER_ENTERED, чтобы даты по-прежнему распознавались таблицей,
+    а форматирование столбцов - одним вызовом spreadsheets:batchUpdate.
+    Вызов делится на части, только если размер запроса превышает max_payload_bytes.
+    Значения упорядочены по полосам публикации, поэтому при делении приоритетные ячейки
+    попадают в первые части; при включенном PRIORITY_LANES_CONFIG каждая полоса - отдельный вызов.
+
+    Args:
+        snapshot: Снимок листа из load_orders_snapshot.
+        updates: Обновления из build_orders_updates.
+        max_payload_bytes: Максимальный размер тела одного запроса.
+
+    Returns:
+        Список вызовов: словари с ключами kind ('values', 'formats' или 'display') и body.
+        Вызов values содержит также номер полосы публикации (lane), вызов display (окно отображения) -
+        новое состояние видимости (display_state).
+    """
+    max_payload_bytes = max_payload_bytes or SHEETS_WRITE_CONFIG['max_payload_bytes']
+    sheet = snapshot['sheet']
+
+    lanes = [[] for _ in PUBLISH_LANES]
+    for u in updates:
+        lanes[u.get('lane', 1)].append({'range': absolute_range_name(sheet.title, u['range']), 'values': u['values']})
+    # Время обновления записывается последним: если полоса будет отложена, на листе останется прежнее время
+    now = datetime.now().strftime('%d.%m.%Y %H:%M:%S')
+    lanes[-1].append({'range': absolute_range_name(sheet.title, 'A2'), 'values': [[f"Последнее обновление: {now}"]]})
+
+    sheet_id = sheet.id if hasattr(sheet, 'id') else sheet._properties.get('sheetId')
+    format_requests = _build_orders_format_requests(sheet_id, snapshot['columns'], snapshot['target_columns'])
+
+    if PRIORITY_LANES_CONFIG['enabled']:
+        value_chunks = [(lane, chunk) for lane, lane_data in enumerate(lanes) if lane_data
+                        for chunk in _split_by_payload(lane_data, max_payload_bytes)]
+    else:
+        value_data = [item for lane_data in lanes for item in lane_data]
+        value_chunks = [(None, chunk) for chunk in _split_by_payload(value_data, max_payload_bytes)]
+    calls = [{'kind': 'values', 'lane': lane, 'body': {'valueInputOption': 'USER_ENTERED', 'data': chunk}}
+             for lane, chunk in value_chunks]
+    calls.extend({'kind': 'formats', 'body': {'requests': chunk}}
+                 for chunk in _split_by_payload(format_requests, max_payload_bytes))
+
+    display = build_display_requests(snapshot, updates)
+    if display is not None and display[0]:
+        display_requests, display_state = display
+        # Состояние видимости сохраняется при выполнении последней части (execute_orders_write_call),
+        # поэтому построение вызовов (в том числе для плана) не меняет его
+        chunks = _split_by_payload(display_requests, max_payload_bytes)
+        calls.extend({'kind': 'display', 'body': {'requests': chunk},
+                      'display_state': display_state if i == len(chunks) - 1 else None}
+                     for i, chunk in enumerate(chunks))
+    return calls
+
+
+def execute_orders_write_call(snapshot: dict, call: dict):
+    """
+    Выполняет один вызов из build_orders_write_calls.
+    """
+    spreadsheet = snapshot['spreadsheet']
+    if call['kind'] == 'values':
+        spreadsheet.values_batch_update(call['body'])
+        lane = f" (полоса '{PUBLISH_LANES[call['lane']]}')" if call.get('lane') is not None else ''
+        logging.info(f"Записано диапазонов: {len(call['body']['data'])}{lane}.")
+    elif call['kind'] == 'display':
+        spreadsheet.batch_update(call['body'])
+        if call.get('display_state') is not None:
+            with _display_lock:
+                _display_state[call['display_state']['key']] = call['display_state']
+        logging.info(f"Окно отображения применено: изменена видимость диапазонов строк: {len(call['body']['requests'])}.")
+    else:
+        spreadsheet.batch_update(call['body'])
+        logging.info("Форматирование применено: сумма заказа (денежное), количества (целое число), готовность/состояние/дата (11px, не жирный).")
+
+
+def _is_quota_error(error: Exception) -> bool:
+    """Проверяет, что ошибка API - исчерпание квоты запросов (HTTP 429)."""
+    response = getattr(error, 'response', None)
+    return isinstance(error, gspread.exceptions.APIError) and getattr(response, 'status_code', None) == 429
+
+
+def execute_orders_value_calls(snapshot: dict, calls: list[dict]) -> bool:
+    """
+    Выполняет вызовы записи значений по порядку полос публикации.
+    При исчерпании квоты API оставшиеся вызовы откладываются до следующего цикла.
 
-        # Получаем заголовки из первой строки
-        header = [str(h).strip() for h in sheet_values[0]]
-        logging.info(f"Заголовки таблицы: {header}")
-        logging.info(f"Заголовок столбца G (индекс 6): '{header[6] if len(header) > 6 else 'НЕТ'}'")
+    Args:
+        snapshot: Снимок листа из load_orders_snapshot.
+        calls: Вызовы kind='values' из build_orders_write_calls.
 
-        # Определяем индексы столбцов (столбцы считаются с 0)
+    Returns:
+        True, если выполнены все вызовы, False, если часть отложена.
+        Прочие ошибки API пробрасываются.
+    """
+    for i, call in enumerate(calls):
         try:
-            # Пробуем найти столбец с номером заказа по разным вариантам названия
-            order_col_idx = None
-            for possible_name in ['номер', 'Номер', 'Номер заказа', 'ном ер']:
-                try:
-                    order_col_idx = header.index(possible_name)
-                    logging.info(f"Найден столбец с номером заказа: '{possible_name}' (индекс {order_col_idx})")
-                    break
-                except ValueError:
-                    continue
-
-            if order_col_idx is None:
-                raise ValueError("Не найден столбец с номером заказа. Проверьте заголовки.")
-
-            # Ищем остальные столбцы, используя точные названия из заголовков
-            proddate_col_idx = None
-            qty_izd_col_idx = None
-            qty_glass_col_idx = None
-            qty_razdv_col_idx = None
-            qty_mosnet_col_idx = None
-            qty_iron_col_idx = None
-            qty_windowsills_col_idx = None
-            qty_sandwiches_col_idx = None
-            totalprice_col_idx = None
-            readiness_col_idx = None
-            order_state_col_idx = None
-            state_date_col_idx = None
-
-            for idx, col_name in enumerate(header):
-                if col_name == 'Дата произв-ва':
-                    proddate_col_idx = idx
-                elif col_name == 'Кол-во изд.':
-                    qty_izd_col_idx = idx
-                elif col_name == 'кол-во зап.':
-                    qty_glass_col_idx = idx
-                elif col_name == 'сумма заказа':
-                    totalprice_col_idx = idx
-                elif col_name == 'Раздвижка':
-                    qty_razdv_col_idx = idx
-                elif col_name == 'М/С':
-                    qty_mosnet_col_idx = idx
-                elif col_name == 'Изд из мет.':
-                    qty_iron_col_idx = idx
-                elif col_name == 'Подок-ки':
-                    qty_windowsills_col_idx = idx
-                elif col_name == 'Сендв':
-                    qty_sandwiches_col_idx = idx
-                elif col_name == 'Готовность из альтавина':
-                    readiness_col_idx = idx
-                elif col_name == 'Состояние заказа':
-                    order_state_col_idx = idx
-                elif col_name == 'Дата перехода в состояние':
-                    state_date_col_idx = idx
-
-            # Проверяем, что все столбцы найдены
-            missing_columns = []
-            if proddate_col_idx is None:
-                missing_columns.append('Дата произв-ва')
-            if qty_izd_col_idx is None:
-                missing_columns.append('Кол-во изд.')
-            if qty_glass_col_idx is None:
-                missing_columns.append('кол-во зап.')
-            if totalprice_col_idx is None:
-                missing_columns.append('сумма заказа')
-            if qty_razdv_col_idx is None:
-                missing_columns.append('Раздвижка')
-            if qty_mosnet_col_idx is None:
-                missing_columns.append('М/С')
-            if qty_iron_col_idx is None:
-                missing_columns.append('Изд из мет.')
-            if qty_windowsills_col_idx is None:
-                missing_columns.append('Подок-ки')
-            if qty_sandwiches_col_idx is None:
-                missing_columns.append('Сендв')
-
-            if missing_columns:
-                raise ValueError(f"Не найдены столбцы: {', '.join(missing_columns)}")
-
-            # Готовность - необязательный столбец, просто предупредим если его нет
-            if readiness_col_idx is None:
-                logging.warning("Столбец 'Готовность из альтавина' не найден в таблице. Данные о готовности не будут обновлены.")
-
-            # Состояние заказа и дата - необязательные столбцы
-            if order_state_col_idx is None:
-                logging.warning("Столбец 'Состояние заказа' не найден в таблице. Данные о состоянии не будут обновлены.")
-            if state_date_col_idx is None:
-                logging.warning("Столбец 'Дата перехода в состояние' не найден в таблице. Данные о дате состояния не будут обновлены.")
-
-            # Логируем найденные индексы столбцов
-            logging.info(f"Индексы столбцов: order={order_col_idx}, proddate={proddate_col_idx}, "
-                        f"qty_izd={qty_izd_col_idx}, qty_glass={qty_glass_col_idx}, totalprice={totalprice_col_idx}, "
-                        f"qty_razdv={qty_razdv_col_idx}, qty_mosnet={qty_mosnet_col_idx}, qty_iron={qty_iron_col_idx}, "
-                        f"qty_windowsills={qty_windowsills_col_idx}, qty_sandwiches={qty_sandwiches_col_idx}, "
-                        f"order_state={order_state_col_idx}, state_date={state_date_col_idx}")
-        except ValueError as e:
-            logging.error(f"На листе 'Заказы' отсутствует обязательный столбец: {e}. Невозможно выполнить обновление.")
-            return
+            execute_orders_write_call(snapshot, call)
+        except gspread.exceptions.APIError as e:
+            if not _is_quota_error(e):
+                raise
+            lanes = sorted({c['lane'] for c in calls[i:] if c.get('lane') is not None})
+            deferred = ', '.join(PUBLISH_LANES[lane] for lane in lanes) or 'все значения'
+            logging.warning(f"Квота Google Sheets API исчерпана (лист '{snapshot['sheet'].title}'). "
+                            f"Отложено до следующего цикла вызовов: {len(calls) - i} ({deferred}).")
+            return False
+    return True
+
+
+def update_google_sheet_orders(data: list[dict], max_payload_bytes: int = None, target: dict = None) -> bool:
+    """
+    Обновляет данные на листе "Заказы" в основной таблице (или в таблице цели).
+    Находит строку по номеру заказа (столбец B) и обновляет нужные поля.
+    Если номер заказа не найден, пропускает эту запись или, при включенном
+    ORDERS_APPEND_CONFIG, добавляет для нее строку в конец листа.
+
+    Args:
+        data: Список словарей с данными из БД (с группировкой по заказам).
+        max_payload_bytes: Максимальный размер тела одного запроса к API.
+        target: Цель записи из get_sheets_targets (по умолчанию - основная таблица).
+
+    Returns:
+        True, если данные записаны, иначе False.
+    """
+    return _update_orders_target(data, max_payload_bytes, target)[0]
+
+
+def _update_orders_target(data: list[dict], max_payload_bytes: int = None,
+                          target: dict = None) -> tuple[bool, list[str]]:
+    """
+    Выполняет update_google_sheet_orders и возвращает (результат записи, номера заказов,
+    пропущенных из-за отсутствия строки на листе).
+    """
+    try:
+        snapshot = load_orders_snapshot(target=target)
+        if snapshot is None:
+            return False, []
 
-        # Создаем карту: номер заказа -> индекс строки (1-based для API)
-        order_to_row_map = {}
-        for i, row in enumerate(sheet_values[1:], start=2):  # Начинаем со строки 2 (индекс 1 - заголовок)
-            if order_col_idx < len(row):
-                order_number = str(row[order_col_idx]).strip()
-                if order_number:
-                    order_to_row_map[order_number] = i
-
-        logging.info(f"Найдено {len(order_to_row_map)} заказов в таблице.")
-
-        # Функция для преобразования индекса столбца в буквенное обозначение (A, B, ..., Z, AA, AB, ...)
-        def col_idx_to_letter(idx):
-            """Преобразует индекс столбца (0-based) в буквенное обозначение."""
-            result = ""
-            idx += 1  # Переводим в 1-based
-            while idx > 0:
-                idx -= 1
-                result = chr(ord('A') + (idx % 26)) + result
-                idx //= 26
-            return result
+        if ORDERS_APPEND_CONFIG['enabled']:
+            append_missing_orders(data, snapshot)
 
         # Подготавливаем batch-обновления
-        # Группируем соседние столбцы для уменьшения количества запросов
-        updates_batch = []
-        updated_count = 0
-        skipped_count = 0
-
-        for row_dict in data:
-            order_no = str(row_dict.get('ORDERNO', '')).strip()
-            if not order_no:
-                logging.warning(f"Пропущен заказ с пустым номером: {row_dict}")
-                skipped_count += 1
-                continue
+        updates, updated_count, skipped_orders = build_orders_updates(data, snapshot)
+        calls = build_orders_write_calls(snapshot, updates, max_payload_bytes)
+        logging.info(f"Обновление {updated_count} заказов ({len(updates)} ячеек, вызовов API: {len(calls)})...")
+
+        # Значения записываются первыми, по полосам; при исчерпании квоты остальное ждет следующего цикла
+        if not execute_orders_value_calls(snapshot, [call for call in calls if call['kind'] == 'values']):
+            return False, []
 
-            if order_no not in order_to_row_map:
-                logging.warning(f"Заказ №{order_no} не найден в таблице (дата: {row_dict.get('PRODDATE')}), пропускаем.")
-                skipped_count += 1
+        for call in calls:
+            if call['kind'] == 'values':
                 continue
+            # Ошибка форматирования или окна отображения не отменяет уже записанные значения
+            try:
+                execute_orders_write_call(snapshot, call)
+            except Exception as e:
+                logging.error(f"Ошибка при применении форматирования к столбцам: {e}")
 
-            row_number = order_to_row_map[order_no]
+        logging.info(f"Обновление завершено. Обновлено заказов: {updated_count}, Пропущено: {len(skipped_orders)}")
+        return True, skipped_orders
 
-            # Формируем данные для обновления
-            # Дата производства
-            proddate = row_dict.get('PRODDATE')
-            if isinstance(proddate, (date, datetime)):
-                proddate_str = proddate.strftime('%d.%m.%Y')
-            else:
-                proddate_str = str(proddate) if proddate else ''
-
-            # Количественные показатели (если нет данных - ставим 0)
-            qty_izd = row_dict.get('QTY_IZD_PVH', 0) or 0
-            qty_glass = row_dict.get('QTY_GLASS_PACKS', 0) or 0
-            # Преобразуем Decimal в float для JSON сериализации и округляем до 10 рублей в большую сторону
-            totalprice_raw = row_dict.get('TOTALPRICE', 0) or 0
-            totalprice = round_up_to_10(float(totalprice_raw)) if totalprice_raw else 0
-            qty_razdv = row_dict.get('QTY_RAZDV', 0) or 0
-            qty_mosnet = row_dict.get('QTY_MOSNET', 0) or 0
-            qty_iron = row_dict.get('QTY_IRON', 0) or 0
-            qty_windowsills = row_dict.get('QTY_WINDOWSILLS', 0) or 0
-            qty_sandwiches = row_dict.get('QTY_SANDWICHES', 0) or 0
-
-            # Определяем готовность: если все количества = 0, то "Готов", иначе берем из БД
-            if (qty_izd == 0 and qty_glass == 0 and qty_razdv == 0 and
-                qty_mosnet == 0 and qty_iron == 0 and qty_windowsills == 0 and qty_sandwiches == 0):
-                readiness = 'Готов'
-            else:
-                readiness = row_dict.get('READINESS', 'Не готов') or 'Не готов'
-
-            # Отладочное логирование для первых 5 заказов
-            if updated_count < 5:
-                logging.info(f"Заказ №{order_no}: PRODDATE={proddate_str}, TOTALPRICE={totalprice}, QTY_IRON={qty_iron}, READINESS={readiness}")
-                logging.info(f"  Все ключи row_dict: {list(row_dict.keys())}")
-                logging.info(f"  Значение TOTALPRICE из row_dict: {row_dict.get('TOTALPRICE', 'ОТСУТСТВУЕТ')}")
-
-            # Обновляем каждый столбец отдельно, используя динамические индексы
-            updates_batch.append({
-                'range': f'{col_idx_to_letter(qty_izd_col_idx)}{row_number}',
-                'values': [[qty_izd]]
-            })
-            updates_batch.append({
-                'range': f'{col_idx_to_letter(qty_glass_col_idx)}{row_number}',
-                'values': [[qty_glass]]
-            })
-            updates_batch.append({
-                'range': f'{col_idx_to_letter(totalprice_col_idx)}{row_number}',
-                'values': [[totalprice]]
-            })
-            updates_batch.append({
-                'range': f'{col_idx_to_letter(proddate_col_idx)}{row_number}',
-                'values': [[proddate_str]]
-            })
-            updates_batch.append({
-                'range': f'{col_idx_to_letter(qty_razdv_col_idx)}{row_number}',
-                'values': [[qty_razdv]]
-            })
-            updates_batch.append({
-                'range': f'{col_idx_to_letter(qty_mosnet_col_idx)}{row_number}',
-                'values': [[qty_mosnet]]
-            })
-            updates_batch.append({
-                'range': f'{col_idx_to_letter(qty_iron_col_idx)}{row_number}',
-                'values': [[qty_iron]]
-            })
-            updates_batch.append({
-                'range': f'{col_idx_to_letter(qty_windowsills_col_idx)}{row_number}',
-                'values': [[qty_windowsills]]
-            })
-            updates_batch.append({
-                'range': f'{col_idx_to_letter(qty_sandwiches_col_idx)}{row_number}',
-                'values': [[qty_sandwiches]]
-            })
-
-            # Обновляем столбец "Готовность" если он существует
-            if readiness_col_idx is not None:
-                updates_batch.append({
-                    'range': f'{col_idx_to_letter(readiness_col_idx)}{row_number}',
-                    'values': [[readiness]]
-                })
+    except FileNotFoundError:
+        logging.error(f"Файл {(target or GOOGLE_SHEETS_MAIN_CONFIG)['credentials_file']} не найден.")
+        return False, []
+    except Exception as e:
+        logging.error(f"Произошла ошибка при работе с Google Sheets (лист 'Заказы'): {e}", exc_info=True)
+        reset_sheets_cache()
+        return False, []
 
-            # Обновляем столбец "Состояние заказа" если он существует
-            if order_state_col_idx is not None:
-                order_state_name = row_dict.get('ORDER_STATE_NAME', '') or ''
-                updates_batch.append({
-                    'range': f'{col_idx_to_letter(order_state_col_idx)}{row_number}',
-                    'values': [[order_state_name]]
-                })
 
-            # Обновляем столбец "Дата перехода в состояние" если он существует
-            if state_date_col_idx is not None:
-                state_change_date = row_dict.get('STATE_CHANGE_DATE')
-                if isinstance(state_change_date, (date, datetime)):
-                    state_change_date_str = state_change_date.strftime('%d.%m.%Y %H:%M:%S')
-                else:
-                    state_change_date_str = str(state_change_date) if state_change_date else ''
-                updates_batch.append({
-                    'range': f'{col_idx_to_letter(state_date_col_idx)}{row_number}',
-                    'values': [[state_change_date_str]]
-                })
+def update_google_sheet_targets(data: list[dict], targets: list[dict] = None,
+                                max_payload_bytes: int = None) -> tuple[dict[str, bool], set[str]]:
+    """
+    Записывает одну выгрузку из БД на листы всех целей параллельно.
 
-            updated_count += 1
+    Args:
+        data: Список словарей с данными из БД (с группировкой по заказам).
+        targets: Цели записи (по умолчанию - get_sheets_targets()).
+        max_payload_bytes: Максимальный размер тела одного запроса к API.
 
-        if updates_batch:
-            logging.info(f"Обновление {updated_count} заказов ({len(updates_batch)} запросов)...")
-            # Batch update может принимать максимум 500 запросов за раз
-            # Разбиваем на части если нужно
-            batch_size = 500
-            for i in range(0, len(updates_batch), batch_size):
-                batch_chunk = updates_batch[i:i + batch_size]
-                sheet.batch_update(batch_chunk, value_input_option='USER_ENTERED')
-                logging.info(f"Обновлено {min(i + batch_size, len(updates_batch))}/{len(updates_batch)} запросов.")
-
-        # Применяем числовое форматирование к числовым столбцам
+    Returns:
+        Кортеж (словарь имя цели -> True, если данные записаны, иначе False;
+        номера заказов, пропущенных хотя бы в одной цели из-за отсутствия строки на листе).
+    """
+    if targets is None:
         try:
-            logging.info("Применение форматирования к числовым столбцам...")
-            sheet_id = sheet.id if hasattr(sheet, 'id') else sheet._properties.get('sheetId')
+            targets = get_sheets_targets()
+        except (OSError, ValueError) as e:
+            logging.error(f"Не удалось прочитать цели записи из {SHEETS_TARGETS_CONFIG['targets_file']}: {e}")
+            return {}, set()
 
-            format_requests = []
+    if len(targets) == 1:
+        ok, skipped_orders = _update_orders_target(data, max_payload_bytes, targets[0])
+        return {targets[0]['name']: ok}, set(skipped_orders)
 
-            # Форматируем столбец "сумма заказа" как денежное значение с 2 знаками после запятой
-            format_requests.append({
-                'repeatCell': {
-                    'range': {
-                        'sheetId': sheet_id,
-                        'startColumnIndex': totalprice_col_idx,
-                        'endColumnIndex': totalprice_col_idx + 1
-                    },
-                    'cell': {
-                        'userEnteredFormat': {
-                            'numberFormat': {
-                                'type': 'NUMBER',
-                                'pattern': '#,##0.00'
-                            }
-                        }
-                    },
-                    'fields': 'userEnteredFormat.numberFormat'
-                }
-            })
+    with ThreadPoolExecutor(max_workers=SHEETS_TARGETS_CONFIG['workers'], thread_name_prefix='target') as executor:
+        futures = {target['name']: executor.submit(_update_orders_target, data, max_payload_bytes, target)
+                   for target in targets}
+        outcomes = {name: future.result() for name, future in futures.items()}
 
-            # Форматируем все остальные столбцы с количествами как целые числа
-            for col_idx in [qty_izd_col_idx, qty_glass_col_idx, qty_razdv_col_idx,
-                           qty_mosnet_col_idx, qty_iron_col_idx, qty_windowsills_col_idx, qty_sandwiches_col_idx]:
-                format_requests.append({
-                    'repeatCell': {
-                        'range': {
-                            'sheetId': sheet_id,
-                            'startColumnIndex': col_idx,
-                            'endColumnIndex': col_idx + 1
-                        },
-                        'cell': {
-                            'userEnteredFormat': {
-                                'numberFormat': {
-                                    'type': 'NUMBER',
-                                    'pattern': '0'
-                                }
-                            }
-                        },
-                        'fields': 'userEnteredFormat.numberFormat'
-                    }
-                })
+    results = {name: ok for name, (ok, _) in outcomes.items()}
+    skipped = {order_no for _, skipped_orders in outcomes.values() for order_no in skipped_orders}
+    failed = [name for name, ok in results.items() if not ok]
+    logging.info(f"Обновлено целей: {len(results) - len(failed)} из {len(results)}"
+                 + (f", с ошибками: {', '.join(failed)}" if failed else "."))
+    return results, skipped
 
-            # Форматируем столбец "Готовность из альтавина" если он существует
-            if readiness_col_idx is not None:
-                format_requests.append({
-                    'repeatCell': {
-                        'range': {
-                            'sheetId': sheet_id,
-                            'startColumnIndex': readiness_col_idx,
-                            'endColumnIndex': readiness_col_idx + 1
-                        },
-                        'cell': {
-                            'userEnteredFormat': {
-                                'textFormat': {
-                                    'fontSize': 11,
-                                    'bold': False
-                                },
-                                'horizontalAlignment': 'CENTER'
-                            }
-                        },
-                        'fields': 'userEnteredFormat.textFormat,userEnteredFormat.horizontalAlignment'
-                    }
-                })
-
-            # Форматируем столбец "Состояние заказа" если он существует
-            if order_state_col_idx is not None:
-                format_requests.append({
-                    'repeatCell': {
-                        'range': {
-                            'sheetId': sheet_id,
-                            'startColumnIndex': order_state_col_idx,
-                            'endColumnIndex': order_state_col_idx + 1
-                        },
-                        'cell': {
-                            'userEnteredFormat': {
-                                'textFormat': {
-                                    'fontSize': 11,
-                                    'bold': False
-                                },
-                                'horizontalAlignment': 'LEFT'
-                            }
-                        },
-                        'fields': 'userEnteredFormat.textFormat,userEnteredFormat.horizontalAlignment'
-                    }
-                })
 
-            # Форматируем столбец "Дата перехода в состояние" если он существует
-            if state_date_col_idx is not None:
-                format_requests.append({
-                    'repeatCell': {
-                        'range': {
-                            'sheetId': sheet_id,
-                            'startColumnIndex': state_date_col_idx,
-                            'endColumnIndex': state_date_col_idx + 1
-                        },
-                        'cell': {
-                            'userEnteredFormat': {
-                                'textFormat': {
-                                    'fontSize': 11,
-                                    'bold': False
-                                },
-                                'horizontalAlignment': 'CENTER'
-                            }
-                        },
-                        'fields': 'userEnteredFormat.textFormat,userEnteredFormat.horizontalAlignment'
-                    }
-                })
+def plan_google_sheet_orders(data: list[dict], max_payload_bytes: int = None, target: dict = None) -> dict | None:
+    """
+    Вычисляет, что изменит update_google_sheet_orders на листе "Заказы", ничего не записывая.
 
-            spreadsheet.batch_update({'requests': format_requests})
-            logging.info("Форматирование применено: сумма заказа (денежное), количества (целое число), готовность/состояние/дата (11px, не жирный).")
-        except Exception as e:
-            logging.error(f"Ошибка при применении форматирования к столбцам: {e}")
+    Читает лист, формирует те же обновления, что и при реальной записи, и сравнивает их
+    с текущими значениями ячеек.
 
-        logging.info(f"Обновление завершено. Обновлено заказов: {updated_count}, Пропущено: {skipped_count}")
+    Args:
+        data: Список словарей с данными из БД (с группировкой по заказам).
+        max_payload_bytes: Максимальный размер тела одного запроса к API.
+        target: Цель записи из get_sheets_targets (по умолчанию - основная таблица).
 
-        # Обновляем время последнего обновления в объединенной ячейке A2
-        try:
-            logging.info("Обновление времени последнего обновления в ячейке A2...")
-            now = datetime.now().strftime('%d.%m.%Y %H:%M:%S')
-            sheet.update('A2', [[f"Последнее обновление: {now}"]])
-            logging.info("Время последнего обновления успешно записано в A2.")
-        except Exception as e:
-            logging.error(f"Не удалось обновить ячейку A2: {e}")
+    Returns:
+        Словарь с изменениями по ячейкам, счетчиками, количеством запросов
+        и оценкой расхода квоты или None в случае ошибки.
+    """
+    try:
+        snapshot = load_orders_snapshot(unformatted=True, target=target)
+        if snapshot is None:
+            return None
+
+        missing_orders = find_missing_orders(data, snapshot) if ORDERS_APPEND_CONFIG['enabled'] else []
+        updates, updated_count, skipped_orders = build_orders_updates(data, snapshot)
+
+        headers_by_key = {column['key']: column['column'] for column in snapshot['target_columns']}
+        changes = []
+        changes_by_column = {}
+        changed_orders = set()
+        for update in updates:
+            old_value = snapshot_cell_value(snapshot, update['row'], update['col'])
+            new_value = update['values'][0][0]
+            if not _cell_value_changed(old_value, new_value):
+                continue
+            column_header = headers_by_key[update['key']]
+            changes.append({
+                'order': update['order'],
+                'cell': update['range'],
+                'column': column_header,
+                'old': old_value,
+                'new': new_value
+            })
+            changes_by_column[column_header] = changes_by_column.get(column_header, 0) + 1
+            changed_orders.add(update['order'])
+
+        # Запросы, которые выполнит update_google_sheet_orders:
+        # чтение - строка заголовков и заполняемые столбцы листа (метаданные таблицы и листа
+        # запрашиваются только при первом открытии, дальше лист берется из кэша);
+        # запись - вызовы, собранные build_orders_write_calls.
+        calls = build_orders_write_calls(snapshot, updates, max_payload_bytes)
+        # Добавление отсутствующих заказов - чтение хвоста листа и один вызов insert_rows
+        read_requests = 2 + (1 if missing_orders else 0)
+        write_requests = len(calls) + (1 if missing_orders else 0)
+
+        return {
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'target': snapshot['target']['name'],
+            'spreadsheet_id': snapshot['target']['spreadsheet_id'],
+            'worksheet': snapshot['sheet'].title,
+            'counts': {
+                'orders_in_data': len(data),
+                'orders_in_sheet': len(snapshot['order_to_row_map']),
+                'orders_matched': updated_count,
+                'orders_skipped': len(skipped_orders),
+                'orders_to_append': len(missing_orders),
+                'orders_changed': len(changed_orders),
+                'cells_written': len(updates),
+                'cells_changed': len(changes),
+                'cells_unchanged': len(updates) - len(changes)
+            },
+            'changes_by_column': changes_by_column,
+            'requests': {
+                'max_payload_bytes': max_payload_bytes or SHEETS_WRITE_CONFIG['max_payload_bytes'],
+                'values_batch_update': sum(1 for call in calls if call['kind'] == 'values'),
+                'format_batch_update': sum(1 for call in calls if call['kind'] == 'formats'),
+                'display_batch_update': sum(1 for call in calls if call['kind'] == 'display'),
+                'payload_bytes': [len(json.dumps(call['body'], ensure_ascii=False, default=str).encode('utf-8'))
+                                  for call in calls],
+                'total': read_requests + write_requests
+            },
+            'quota': {
+                'read_requests': read_requests,
+                'write_requests': write_requests,
+                'per_minute_limit': SHEETS_QUOTA_PER_MINUTE,
+                'write_quota_share': round(write_requests / SHEETS_QUOTA_PER_MINUTE, 3)
+            },
+            'skipped_orders': skipped_orders,
+            'changes': changes
+        }
 
     except FileNotFoundError:
-        logging.error(f"Файл {GOOGLE_SHEETS_MAIN_CONFIG['credentials_file']} не найден.")
+        logging.error(f"Файл {(target or GOOGLE_SHEETS_MAIN_CONFIG)['credentials_file']} не найден.")
+        return None
     except Exception as e:
-        logging.error(f"Произошла ошибка при работе с Google Sheets (лист 'Заказы'): {e}", exc_info=True)
+        logging.error(f"Произошла ошибка при построении плана для листа 'Заказы': {e}", exc_info=True)
+        reset_sheets_cache()
+        return None
 
 
 if __name__ == '__main__':
@@ -1,34 +1,117 @@
+import argparse
+import importlib
+import multiprocessing
 import schedule
+import sys
+import threading
 import time
 import logging
 from datetime import date, timedelta, datetime
 # from database import get_data_from_db  # ЗАКОММЕНТИРОВАНО: больше не используется
-from database import get_data_from_db_by_order
 # from google_sheets import update_google_sheet, update_google_sheet_by_order  # ЗАКОММЕНТИРОВАНО: больше не используется
-from google_sheets import update_google_sheet_orders
+from change_feed import commit_change_feed, compute_change_feed, records_to_publish
+from config import (ARCHIVE_CONFIG, CHANGE_FEED_CONFIG, DAILY_SUMMARY_CONFIG, DEBOUNCE_CONFIG, SNAPSHOT_CONFIG,
+                    SYNC_WINDOW, WATCHDOG_CONFIG)
+from cycle_worker import DONE, TIMED_OUT, report_stage, run_supervised
+from debounce import coalesce_orders
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def job():
+# Коды завершения для внешних планировщиков (cron, systemd, планировщик заданий Windows).
+# Код 2 - ошибка в аргументах командной строки (argparse).
+EXIT_OK = 0
+EXIT_DB_ERROR = 1
+EXIT_SHEETS_ERROR = 3
+# Задача прервана сторожем по таймауту этапа
+EXIT_STAGE_TIMEOUT = 4
+# Часть заказов из --orders не найдена в БД (или у них нет даты производства); найденные записаны
+EXIT_ORDERS_NOT_FOUND = 5
+# Задача завершилась исключением в исполнителе или исполнитель завершился аварийно
+EXIT_WORKER_FAILED = 6
+
+# Модули работы с БД (fdb) и Google Sheets (gspread, oauth2client, google-auth) импортируются
+# при первом использовании, а не при запуске: так процесс стартует быстрее, а импорт
+# Google Sheets выполняется в фоне одновременно с первой выгрузкой из БД.
+LAZY_MODULES = ['database', 'google_sheets']
+
+
+def preload_modules(names: list[str] = None) -> threading.Thread:
+    """
+    Импортирует модули в фоновом потоке, чтобы к первому использованию они уже были загружены.
+    """
+    def load():
+        for name in names or LAZY_MODULES:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                logging.warning(f"Не удалось заранее загрузить модуль {name}: {e}")
+
+    thread = threading.Thread(target=load, name='preload', daemon=True)
+    thread.start()
+    return thread
+
+
+def sync_window(days_back: int = None, days_ahead: int = None) -> tuple[date, date]:
+    """
+    Возвращает окно выгрузки относительно сегодняшнего дня (по умолчанию из SYNC_WINDOW).
+    """
+    today = date.today()
+    days_back = SYNC_WINDOW['days_back'] if days_back is None else days_back
+    days_ahead = SYNC_WINDOW['days_ahead'] if days_ahead is None else days_ahead
+    return today - timedelta(days=days_back), today + timedelta(days=days_ahead)
+
+
+def job(start_date: date = None, end_date: date = None, orders: list[str] = None, targets: list[dict] = None) -> int:
     """
     Основная задача, которая выполняется по расписанию.
+
+    Args:
+        start_date: Начало окна выгрузки по дате изменения заказа, по умолчанию из SYNC_WINDOW.
+            Политика WINDOW_POLICY_CONFIG применяется только к окну по умолчанию без отбора
+            заказов и целей; выборочный запуск выгружает ровно заданный период.
+        end_date: Конец окна выгрузки.
+        orders: Номера заказов, которые нужно обновить (по умолчанию - все заказы окна).
+            Заказы выгружаются по номерам, окно выгрузки при этом не используется.
+        targets: Цели записи (по умолчанию - все цели).
+
+    Returns:
+        Код завершения: EXIT_OK, EXIT_DB_ERROR, EXIT_SHEETS_ERROR или EXIT_ORDERS_NOT_FOUND.
     """
+    from database import get_data_from_db_by_order, get_data_from_db_for_orders
+
     logging.info("Запуск задачи по обновлению данных...")
     
-    # Определяем период - за последние 7 дней и на 1 день вперед
-    today = date.today()
-    start_date = today - timedelta(days=7)
-    end_date = today + timedelta(days=1)
+    # Определяем период - по умолчанию за последние 7 дней и на 1 день вперед
+    if start_date is None or end_date is None:
+        start_date, end_date = sync_window()
+    # Лента изменений хранит состояние полного окна, поэтому для выборочного запуска не используется;
+    # выборочный запуск также публикует заказы без отложенной публикации
+    scoped = bool(orders or targets) or (start_date, end_date) != sync_window()
     
     # 1. Получаем данные из Firebird
     # ЗАКОММЕНТИРОВАНО: Запрос общих данных за дату больше не используется
     # db_data = get_data_from_db(start_date, end_date)
 
     # Получаем данные с разбивкой по заказам
-    db_data_by_order = get_data_from_db_by_order(start_date, end_date)
+    report_stage('db')
+    not_found = []
+    if orders:
+        wanted = list(dict.fromkeys(str(order_no).strip() for order_no in orders))
+        db_data_by_order = get_data_from_db_for_orders(wanted)
+        if db_data_by_order is not None:
+            found = {str(row.get('ORDERNO', '')).strip() for row in db_data_by_order}
+            not_found = [order_no for order_no in wanted if order_no not in found]
+            if not_found:
+                logging.error(f"Заказы не найдены в БД или не имеют даты производства: {', '.join(not_found)}.")
+    else:
+        db_data_by_order = get_data_from_db_by_order(start_date, end_date, 'datemodified' if scoped else None)
+    if db_data_by_order is not None and SNAPSHOT_CONFIG['enabled']:
+        from snapshots import save_snapshot
+        report_stage('snapshot')
+        save_snapshot(db_data_by_order)
 
     # 2. Если данные успешно получены, обрабатываем их и обновляем Google Sheet
-    # ЗАКОММЕНТИРОВАНО: Загрузка в лист "Общий" больше не используется
+    # ЗАКОММЕНТИРОВАНО: Загрузка в лист "Общий" отдельными запросами заменена сводкой из выгрузки по заказам (см. ниже)
     """
     if db_data is not None:
         # Создаем полный список дат за период
@@ -85,24 +168,199 @@ def job():
         logging.warning("Пропускаем обновление Google Sheets по заказам, так как данные из БД не были получены.")
     """
 
-    # Обновляем основную таблицу (лист "Заказы")
-    if db_data_by_order is not None:
-        update_google_sheet_orders(db_data_by_order)
+    # Обновляем лист "Заказы" во всех целях (основная таблица и таблицы из SHEETS_TARGETS_FILE)
+    # Полная выгрузка нужна для сводки "Общий" (отложенная публикация и лента изменений ее сокращают)
+    extracted = db_data_by_order
+    if db_data_by_order is not None and DEBOUNCE_CONFIG['enabled'] and not scoped:
+        db_data_by_order, _ = coalesce_orders(db_data_by_order)
+
+    report_stage('sheets')
+    from google_sheets import update_google_sheet_targets
+    exit_code = EXIT_OK
+    if db_data_by_order is not None and CHANGE_FEED_CONFIG['enabled'] and not scoped:
+        # Публикуем только новые и измененные с прошлого цикла заказы
+        feed = compute_change_feed(db_data_by_order)
+        records = records_to_publish(feed, db_data_by_order)
+        if not records:
+            logging.info("Изменений с прошлого цикла нет, запись в таблицы пропущена.")
+        else:
+            results, skipped_orders = update_google_sheet_targets(records, targets)
+            if results and all(results.values()):
+                commit_change_feed(feed, skipped_orders)
+            else:
+                exit_code = EXIT_SHEETS_ERROR
+    elif db_data_by_order is not None:
+        results, _ = update_google_sheet_targets(db_data_by_order, targets)
+        if not results or not all(results.values()):
+            exit_code = EXIT_SHEETS_ERROR
     else:
         logging.warning("Пропускаем обновление основной таблицы (лист 'Заказы'), так как данные из БД не были получены.")
+        exit_code = EXIT_DB_ERROR
 
-    logging.info("Задача завершена. Следующий запуск через 5 минут.")
+    # Сводка по датам на листе "Общий" считается из той же выгрузки, без запросов к БД
+    if extracted is not None and DAILY_SUMMARY_CONFIG['enabled'] and not scoped:
+        from daily_summary import publish_daily_summary
+        if not publish_daily_summary(extracted) and exit_code == EXIT_OK:
+            exit_code = EXIT_SHEETS_ERROR
 
+    if not_found and exit_code == EXIT_OK:
+        exit_code = EXIT_ORDERS_NOT_FOUND
 
-if __name__ == "__main__":
+    logging.info(f"Задача завершена (код {exit_code}).")
+    return exit_code
+
+
+def archive_job() -> int:
+    """
+    Ежедневный перенос старых заказов с листа "Заказы" в помесячный архив.
+    """
+    report_stage('archive')
+    from archive import archive_all_targets
+
+    logging.info("Запуск архивирования старых заказов...")
+    return EXIT_OK if archive_all_targets() else EXIT_SHEETS_ERROR
+
+
+def run_task(func, *args) -> int:
+    """
+    Выполняет задачу в процессе-исполнителе под контролем сторожа (если включен) или в текущем процессе.
+
+    Returns:
+        Код завершения задачи, EXIT_STAGE_TIMEOUT, если этап превысил таймаут,
+        или EXIT_WORKER_FAILED, если задача завершилась ошибкой в исполнителе.
+    """
+    if not WATCHDOG_CONFIG['enabled']:
+        return func(*args)
+    status, value = run_supervised(func, *args)
+    if status == DONE:
+        return value
+    return EXIT_STAGE_TIMEOUT if status == TIMED_OUT else EXIT_WORKER_FAILED
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    options = argparse.ArgumentParser(add_help=False)
+    window = options.add_argument_group("окно выгрузки (по дате изменения заказа)")
+    window.add_argument('--since', type=_parse_date, help="Начальная дата (ГГГГ-ММ-ДД).")
+    window.add_argument('--until', type=_parse_date, help="Конечная дата включительно (ГГГГ-ММ-ДД), по умолчанию сегодня.")
+    window.add_argument('--days-back', type=int, help=f"Дней назад от сегодня (по умолчанию {SYNC_WINDOW['days_back']}).")
+    window.add_argument('--days-ahead', type=int, help=f"Дней вперед от сегодня (по умолчанию {SYNC_WINDOW['days_ahead']}).")
+    options.add_argument('--orders', nargs='+', metavar='НОМЕР',
+                         help="Обновить только указанные заказы (выгружаются по номерам, без окна выгрузки).")
+    options.add_argument('--target', action='append', metavar='ИМЯ', help="Обновить только указанную цель записи (можно несколько раз).")
+
+    parser = argparse.ArgumentParser(
+        description="Синхронизация заказов Altawin с Google Sheets.",
+        epilog=f"Коды завершения: {EXIT_OK} - успешно, {EXIT_DB_ERROR} - данные из БД не получены, "
+               f"2 - ошибка в аргументах, {EXIT_SHEETS_ERROR} - ошибка записи в таблицу, "
+               f"{EXIT_STAGE_TIMEOUT} - задача прервана по таймауту этапа, "
+               f"{EXIT_ORDERS_NOT_FOUND} - часть заказов из --orders не найдена, "
+               f"{EXIT_WORKER_FAILED} - ошибка в процессе-исполнителе."
+    )
+    parser.add_argument('--startup-check', action='store_true', help=argparse.SUPPRESS)
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('run-once', parents=[options], help="Выполнить одну синхронизацию и завершиться.")
+    daemon = subparsers.add_parser('daemon', parents=[options], help="Синхронизировать по расписанию (по умолчанию).")
+    daemon.add_argument('--interval', type=int, default=SYNC_WINDOW['interval_minutes'], help="Интервал в минутах.")
+    return parser
+
+
+def _resolve_scope(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    """
+    Проверяет аргументы и возвращает функцию окна выгрузки и список целей.
+    Окно вычисляется при каждом запуске задачи, чтобы относительное окно сдвигалось с датой.
+    """
+    if (args.since or args.until) and (args.days_back is not None or args.days_ahead is not None):
+        parser.error("--since/--until нельзя использовать вместе с --days-back/--days-ahead.")
+    if args.until and not args.since:
+        parser.error("--until требует --since.")
+    if args.orders and (args.since or args.days_back is not None or args.days_ahead is not None):
+        parser.error("--orders выгружает заказы по номерам и не используется вместе с окном выгрузки.")
+
+    if args.since:
+        until = args.until or date.today()
+        if args.since > until:
+            parser.error("--since не может быть позже --until.")
+        # Запросы используют BETWEEN по дате изменения, поэтому конец сдвигается на день, чтобы день until попал целиком
+        def window():
+            return args.since, until + timedelta(days=1)
+    else:
+        def window():
+            return sync_window(args.days_back, args.days_ahead)
+
+    targets = None
+    if args.target:
+        from google_sheets import get_sheets_targets
+
+        try:
+            all_targets = get_sheets_targets()
+        except (OSError, ValueError) as e:
+            parser.error(f"Не удалось прочитать цели записи: {e}")
+        unknown = [name for name in args.target if name not in {t['name'] for t in all_targets}]
+        if unknown:
+            parser.error(f"Цели не найдены: {', '.join(unknown)}.")
+        targets = [t for t in all_targets if t['name'] in args.target]
+
+    return window, targets
+
+
+def run_daemon(window, orders: list[str] = None, targets: list[dict] = None, interval_minutes: int = None):
+    """
+    Выполняет синхронизацию сразу и затем по расписанию, не завершаясь.
+    """
+    interval_minutes = interval_minutes or SYNC_WINDOW['interval_minutes']
     logging.info("Приложение запущено. Первая выгрузка данных начнется немедленно.")
-    
+
+    # Google Sheets загружается в фоне, пока первая задача подключается к БД
+    # (под контролем сторожа задачи выполняются в исполнителе, и загрузка там не нужна)
+    if not WATCHDOG_CONFIG['enabled']:
+        preload_modules(['google_sheets'])
+
+    def scheduled_job():
+        run_task(job, *window(), orders, targets)
+        logging.info(f"Следующий запуск через {interval_minutes} минут.")
+
     # Запускаем задачу сразу при старте
-    job()
-    
-    # Настраиваем расписание - каждые 5 минут
-    schedule.every(5).minutes.do(job)
-    
+    scheduled_job()
+
+    # Настраиваем расписание - по умолчанию каждые 5 минут
+    schedule.every(interval_minutes).minutes.do(scheduled_job)
+    if ARCHIVE_CONFIG['enabled']:
+        schedule.every().day.at(ARCHIVE_CONFIG['run_at']).do(run_task, archive_job)
+
     while True:
         schedule.run_pending()
         time.sleep(1)
+
+
+def main(argv: list[str] = None) -> int:
+    parser = build_parser()
+    argv = sys.argv[1:] if argv is None else argv
+    # Без команды - прежнее поведение: синхронизация по расписанию (параметры относятся к daemon)
+    if argv and argv[0] not in ('run-once', 'daemon', '-h', '--help', '--startup-check'):
+        argv = ['daemon'] + argv
+    args = parser.parse_args(argv or ['daemon'])
+
+    if args.startup_check:
+        # Замер холодного старта (startup_benchmark.py): загрузить все модули и выйти
+        for module_name in LAZY_MODULES:
+            importlib.import_module(module_name)
+        return EXIT_OK
+
+    window, targets = _resolve_scope(parser, args)
+    if args.command == 'run-once':
+        if not WATCHDOG_CONFIG['enabled']:
+            preload_modules(['google_sheets'])
+        return run_task(job, *window(), args.orders, targets)
+
+    run_daemon(window, args.orders, targets, args.interval)
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    # Нужно для процесса-исполнителя в собранном exe (PyInstaller)
+    multiprocessing.freeze_support()
+    sys.exit(main())
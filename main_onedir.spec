@@ -0,0 +1,55 @@
+# -*- mode: python ; coding: utf-8 -*-
+# Сборка с быстрым холодным стартом: pyinstaller main_onedir.spec
+#
+# В отличие от main.spec (один exe-файл, который при каждом запуске распаковывается
+# во временный каталог и разжимается UPX), здесь используется каталог dist/GoogleSheetsAltawin:
+# - onedir: библиотеки лежат рядом с exe, распаковки при запуске нет;
+# - upx=False: DLL и pyd не нужно разжимать при загрузке;
+# - optimize=1: модули заранее скомпилированы в байт-код без assert.
+# Модули БД и Google Sheets импортируются в main.py при первом использовании,
+# поэтому они перечислены в hiddenimports.
+# Время запуска: python startup_benchmark.py --exe dist/GoogleSheetsAltawin/GoogleSheetsAltawin.exe
+
+
+a = Analysis(
+    ['main.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=['database', 'google_sheets', 'archive', 'snapshots'],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=['tkinter', 'unittest', 'pydoc', 'test'],
+    noarchive=False,
+    optimize=1,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='GoogleSheetsAltawin',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='GoogleSheetsAltawin',
+)
@@ -0,0 +1,355 @@
+"""
+Локальное хранилище агрегатов метрик по заказам (SQLite).
+
+Запросы с условными агрегатами (см. metrics.py) каждый цикл пересчитывают суммы
+по orderitems/models/itemsdetail для всех заказов окна. Здесь агрегаты каждого
+заказа хранятся локально вместе с o.datemodified, на момент которой они посчитаны.
+В цикле из Firebird читается только список заказов окна (по таблице orders),
+а агрегаты пересчитываются только для новых заказов и заказов с изменившейся
+датой изменения. Раз в full_refresh_minutes пересчитываются все заказы окна,
+чтобы учесть редкие изменения без смены даты заказа. Отдельные запросы (готовность,
+состояние заказа) по-прежнему выполняются каждый цикл.
+
+Хранилище позволяет ответить, что должно быть на листе за дату производства,
+без обращения к Firebird. Заказы хранилища сверяются с Firebird: заказы, которые
+по сохраненным датам попадают в окно, но не вернулись запросом окна, проверяются
+каждый цикл, а при полном пересчете - все заказы хранилища; удаленные заказы
+и заказы без даты производства удаляются, перенос даты производства учитывается.
+Хранилище покрывает только заказы, которые попадали в окно выгрузки после его
+создания (covered_since в "stats"): старые заказы, не менявшиеся с тех пор, в нем отсутствуют.
+
+Хранилище обновляется из одного процесса (цикл синхронизации): блокировка _store_lock
+и время полного пересчета действуют только внутри процесса. Параллельная догрузка
+(backfill.py) выполняет выгрузку без хранилища.
+
+Пример:
+    python metric_store.py stats
+    python metric_store.py show --date 2024-02-01
+    python metric_store.py show --date 2024-02-01 --to 2024-02-07
+"""
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from config import METRIC_STORE_CONFIG, SQL_ORDERS_BY_ID, SQL_WINDOW_ORDERS
+from metrics import aggregate_metric_keys, plan_metric_queries_for_orders, sql_in_condition
+from window_policy import window_params, window_query
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Имя псевдозапроса в плане выгрузки, который заменяет запросы с условными агрегатами
+METRIC_STORE_QUERY = 'metric_store'
+
+# Сколько параметров передавать в одном запросе к SQLite
+_SQLITE_BATCH_SIZE = 500
+
+_SCHEMA = """
+    create table if not exists order_metrics (
+        orderid integer primary key,
+        orderno text not null,
+        proddate text not null,
+        datemodified text,
+        metrics text not null,
+        refreshed_at text not null
+    );
+    create index if not exists order_metrics_proddate on order_metrics (proddate);
+    create table if not exists store_meta (
+        key text primary key,
+        value text not null
+    );
+"""
+
+# Заказы хранилища по условию окна выгрузки (столбцы datemodified и proddate под псевдонимом o)
+_SQLITE_WINDOW_ORDERS = "select orderid from order_metrics o where {window_condition}"
+
+_store_lock = threading.Lock()
+_store_state = {'full_refresh_at': None}
+
+
+def _encode_value(value):
+    """Сохраняет тип значения из Firebird в JSON."""
+    if isinstance(value, Decimal):
+        return {'decimal': str(value)}
+    if isinstance(value, datetime):
+        return {'datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'date': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'decimal' in value:
+            return Decimal(value['decimal'])
+        if 'datetime' in value:
+            return datetime.fromisoformat(value['datetime'])
+        if 'date' in value:
+            return date.fromisoformat(value['date'])
+    return value
+
+
+def _connect(path: str = None) -> sqlite3.Connection:
+    con = sqlite3.connect(path or METRIC_STORE_CONFIG['path'])
+    con.executescript(_SCHEMA)
+    return con
+
+
+def _as_date(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _batches(items: list, size: int = _SQLITE_BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _stored_orders(store, orderids: list[int]) -> dict[int, tuple]:
+    """Возвращает сохраненные (datemodified, proddate, orderno) заказов по orderid."""
+    stored = {}
+    for batch in _batches(orderids):
+        placeholders = ', '.join('?' * len(batch))
+        for orderid, datemodified, proddate, orderno in store.execute(
+                f"select orderid, datemodified, proddate, orderno from order_metrics where orderid in ({placeholders})",
+                batch):
+            stored[orderid] = (datemodified, proddate, orderno)
+    return stored
+
+
+def _read_aggregates(con, orderids: list[int]) -> dict[tuple, dict]:
+    """
+    Считает агрегаты метрик в Firebird для указанных заказов.
+
+    Returns:
+        Словарь (дата производства, номер заказа) -> агрегаты заказа.
+    """
+    # Справочники читаются здесь, чтобы модуль не зависел от fdb при просмотре хранилища из командной строки
+    from reference_data import get_reference_sets
+
+    aggregates = {}
+    cur = con.cursor()
+    try:
+        for key, query in plan_metric_queries_for_orders(orderids, get_reference_sets(con)).items():
+            cur.execute(query)
+            columns = [desc[0] for desc in cur.description]
+            for row in cur.fetchall():
+                row_dict = dict(zip(columns, row))
+                data_key = (_as_date(row_dict.pop('PRODDATE')), row_dict.pop('ORDERNO'))
+                aggregates.setdefault(data_key, {}).update(row_dict)
+    finally:
+        cur.close()
+    return aggregates
+
+
+def _stored_in_window(store, params: tuple, policy: str = None) -> set[int]:
+    """
+    Возвращает orderid заказов хранилища, которые по сохраненным дате изменения и дате
+    производства попадают в окно выгрузки. Условие окна то же, что и в Firebird: даты хранятся
+    в ISO-формате, поэтому сравнение строк не шире сравнения дат в Firebird.
+    """
+    return {orderid for (orderid,) in store.execute(window_query(_SQLITE_WINDOW_ORDERS, policy), params)}
+
+
+def _read_orders(con, orderids: list[int]) -> list[tuple]:
+    """Читает из Firebird заказы по списку orderid (orderid, proddate, orderno, datemodified)."""
+    cur = con.cursor()
+    try:
+        cur.execute(SQL_ORDERS_BY_ID.format(orderid_condition=sql_in_condition('o.orderid', orderids)))
+        return cur.fetchall()
+    finally:
+        cur.close()
+
+
+def _reconcile(con, store, candidates: set[int]) -> list[tuple]:
+    """
+    Сверяет заказы хранилища, которых нет в выгрузке окна, с Firebird: удаленные заказы
+    и заказы без даты производства удаляются из хранилища.
+
+    Returns:
+        Найденные в Firebird заказы (orderid, proddate, orderno, datemodified) - их дата
+        производства, номер и агрегаты обновляются так же, как у заказов окна.
+    """
+    found = _read_orders(con, sorted(candidates)) if candidates else []
+    missing = sorted(candidates - {orderid for orderid, _, _, _ in found})
+    if missing:
+        with store:
+            for batch in _batches(missing):
+                store.execute(f"delete from order_metrics where orderid in ({', '.join('?' * len(batch))})", batch)
+        logging.info(f"Хранилище метрик: удалено заказов, которых больше нет в Firebird или без даты производства: "
+                     f"{len(missing)}.")
+    return found
+
+
+def get_store_rows(con, date1_str: str, date2_str: str, policy: str = None) -> tuple[list[str], list]:
+    """
+    Обновляет хранилище для заказов окна выгрузки и возвращает их агрегаты
+    в формате результата запроса по заказам.
+
+    Заказы хранилища, которые по сохраненным датам попадают в окно, но не вернулись
+    запросом окна, сверяются с Firebird (при полном пересчете - все заказы хранилища
+    вне выгрузки): удаленные заказы и заказы без даты производства удаляются,
+    у остальных обновляются дата производства и, при изменении заказа, агрегаты.
+
+    Args:
+        con: Открытое соединение с Firebird.
+        date1_str: Начало окна по o.datemodified (условие окна - по политике WINDOW_POLICY_CONFIG).
+        date2_str: Конец окна.
+        policy: Политика окна выгрузки (по умолчанию из WINDOW_POLICY_CONFIG).
+
+    Returns:
+        Кортеж (названия столбцов, строки): PRODDATE, ORDERNO и ключи метрик-агрегатов.
+    """
+    params = window_params(date1_str, date2_str, policy)
+    cur = con.cursor()
+    try:
+        cur.execute(window_query(SQL_WINDOW_ORDERS, policy), params)
+        orders = cur.fetchall()
+    finally:
+        cur.close()
+
+    keys = aggregate_metric_keys()
+    with _store_lock:
+        now = time.monotonic()
+        full_refresh_at = _store_state['full_refresh_at']
+        full_refresh = (full_refresh_at is None
+                        or now - full_refresh_at >= METRIC_STORE_CONFIG['full_refresh_minutes'] * 60)
+
+        store = _connect()
+        try:
+            window_ids = {orderid for orderid, _, _, _ in orders}
+            if full_refresh:
+                candidates = {orderid for (orderid,) in store.execute("select orderid from order_metrics")}
+            else:
+                candidates = _stored_in_window(store, params, policy)
+            reconciled = _reconcile(con, store, candidates - window_ids)
+
+            # Агрегаты пересчитываются для новых и измененных заказов (при полном пересчете - для всех
+            # заказов окна); у заказов с прежней датой изменения обновляются номер и дата производства
+            stored = _stored_orders(store, [orderid for orderid, _, _, _ in orders + reconciled])
+            dirty = []
+            moved = []
+            for orderid, proddate, orderno, datemodified in orders + reconciled:
+                current = stored.get(orderid)
+                if (current is None or current[0] != (datemodified.isoformat() if datemodified else None)
+                        or (full_refresh and orderid in window_ids)):
+                    dirty.append((orderid, proddate, orderno, datemodified))
+                elif current[1:] != (_as_date(proddate).isoformat(), orderno):
+                    moved.append((orderno, _as_date(proddate).isoformat(), orderid))
+
+            if dirty:
+                aggregates = _read_aggregates(con, [orderid for orderid, _, _, _ in dirty])
+                refreshed_at = datetime.now().isoformat(timespec='seconds')
+                with store:
+                    store.executemany(
+                        "insert or replace into order_metrics values (?, ?, ?, ?, ?, ?)",
+                        [(orderid, orderno, _as_date(proddate).isoformat(),
+                          datemodified.isoformat() if datemodified else None,
+                          json.dumps({key: _encode_value(value) for key, value in
+                                      aggregates.get((_as_date(proddate), orderno), {}).items()}),
+                          refreshed_at)
+                         for orderid, proddate, orderno, datemodified in dirty])
+                    store.execute("insert or replace into store_meta values ('refreshed_at', ?)", (refreshed_at,))
+                    store.execute("insert or ignore into store_meta values ('covered_since', ?)", (refreshed_at,))
+            if moved:
+                with store:
+                    store.executemany("update order_metrics set orderno = ?, proddate = ? where orderid = ?", moved)
+            if full_refresh:
+                _store_state['full_refresh_at'] = now
+
+            rows = []
+            for batch in _batches(sorted(window_ids)):
+                placeholders = ', '.join('?' * len(batch))
+                for orderno, proddate, metrics in store.execute(
+                        f"select orderno, proddate, metrics from order_metrics where orderid in ({placeholders})", batch):
+                    values = json.loads(metrics)
+                    rows.append((date.fromisoformat(proddate), orderno,
+                                 *(_decode_value(values.get(key)) for key in keys)))
+        finally:
+            store.close()
+
+    logging.info(f"Хранилище метрик: заказов в окне {len(orders)}, пересчитано {len(dirty)}"
+                 f"{' (полный пересчет)' if full_refresh else ''}, сверено вне окна {len(candidates - window_ids)}.")
+    return ['PRODDATE', 'ORDERNO'] + keys, rows
+
+
+def get_orders_by_proddate(start_date: date, end_date: date = None, path: str = None) -> list[dict]:
+    """
+    Возвращает агрегаты заказов из хранилища по дате производства (без обращения к Firebird).
+
+    Args:
+        start_date: Начальная дата производства.
+        end_date: Конечная дата производства включительно (по умолчанию равна начальной).
+        path: Путь к файлу хранилища.
+
+    Returns:
+        Список словарей с данными по заказам (PRODDATE, ORDERNO и метрики-агрегаты).
+    """
+    end_date = end_date or start_date
+    store = _connect(path)
+    try:
+        data = []
+        for orderno, proddate, metrics in store.execute(
+                "select orderno, proddate, metrics from order_metrics where proddate between ? and ? "
+                "order by proddate, orderno", (start_date.isoformat(), end_date.isoformat())):
+            row_dict = {'PRODDATE': date.fromisoformat(proddate), 'ORDERNO': orderno}
+            row_dict.update({key: _decode_value(value) for key, value in json.loads(metrics).items()})
+            data.append(row_dict)
+        return data
+    finally:
+        store.close()
+
+
+def store_stats(path: str = None) -> dict:
+    """
+    Возвращает число заказов, диапазон дат производства, время первого (covered_since)
+    и последнего обновления хранилища.
+    """
+    store = _connect(path)
+    try:
+        count, min_date, max_date = store.execute(
+            "select count(*), min(proddate), max(proddate) from order_metrics").fetchone()
+        meta = dict(store.execute("select key, value from store_meta"))
+        return {'orders': count, 'proddate_from': min_date, 'proddate_to': max_date,
+                'covered_since': meta.get('covered_since'), 'refreshed_at': meta.get('refreshed_at')}
+    finally:
+        store.close()
+
+
+def reset_metric_store():
+    """Сбрасывает время полного пересчета, чтобы при следующем обращении были пересчитаны все заказы окна."""
+    with _store_lock:
+        _store_state['full_refresh_at'] = None
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Локальное хранилище агрегатов метрик по заказам.")
+    parser.add_argument('--path', default=METRIC_STORE_CONFIG['path'], help="Файл хранилища.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help="Показать состояние хранилища.")
+    show = subparsers.add_parser('show', help="Показать заказы за дату производства.")
+    show.add_argument('--date', required=True, type=date.fromisoformat, help="Дата производства (ГГГГ-ММ-ДД).")
+    show.add_argument('--to', type=date.fromisoformat, help="Конечная дата производства включительно.")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'stats':
+            result = store_stats(args.path)
+        else:
+            result = get_orders_by_proddate(args.date, args.to, args.path)
+            covered_since = store_stats(args.path)['covered_since']
+            print(f"Хранилище содержит заказы, попадавшие в окно выгрузки с {covered_since or '-'}; "
+                  f"заказы, не менявшиеся с этого времени, могут отсутствовать.", file=sys.stderr)
+    except sqlite3.Error as e:
+        print(f"Ошибка чтения хранилища {args.path}: {e}", file=sys.stderr)
+        return 1
+
+    print(json.dumps(result, ensure_ascii=False, indent=2, default=str))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
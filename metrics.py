@@ -0,0 +1,310 @@
+"""
+Реестр метрик по заказам и планировщик запросов к Altawin.
+
+Каждая метрика описывает путь соединения таблиц (join_path), агрегат и условие,
+а также столбец листа "Заказы", в который она записывается. Планировщик объединяет
+метрики с общим путем соединения в один запрос с условными агрегатами
+(SUM(CASE WHEN ... THEN ... END)), поэтому стоимость выгрузки растет с числом
+различных путей соединения, а не с числом метрик.
+
+Новая метрика добавляется одной записью в METRICS (или вызовом register_metric):
+отдельный запрос, ветка в update_google_sheet_orders и поиск столбца не нужны.
+"""
+import re
+from config import SQL_QUERIES_BY_ORDER
+from window_policy import window_condition, window_query
+
+# Пути соединения: основная часть FROM и необязательные справочные соединения (lookups),
+# которые добавляются в запрос, только если они нужны условиям метрик
+METRIC_JOIN_PATHS = {
+    'orders': {
+        'from': "from orders o",
+        'lookups': {}
+    },
+    'models_systems': {
+        'from': """from orders o
+        join orderitems oi on oi.orderid = o.orderid
+        join models m on m.orderitemsid = oi.orderitemsid
+        join r_systems rs on rs.rsystemid = m.sysprofid""",
+        'lookups': {}
+    },
+    'itemsdetail': {
+        'from': """from orders o
+        join orderitems oi on oi.orderid = o.orderid
+        join itemsdetail itd on itd.orderitemsid = oi.orderitemsid""",
+        'lookups': {
+            'gg': "left join groupgoods gg on gg.grgoodsid = itd.grgoodsid",
+            'ggt': "left join groupgoodstypes ggt on ggt.ggtypeid = gg.ggtypeid",
+            'g': "left join goods g on g.goodsid = itd.goodsid"
+        }
+    },
+    'modelfillings': {
+        'from': """from orders o
+        join orderitems oi on oi.orderid = o.orderid
+        join models m on m.orderitemsid = oi.orderitemsid
+        join modelparts mp on mp.modelid = m.modelid
+        join modelfillings mf on mf.modelpartid = mp.modelpartid
+        join gpackettypes gp on gp.gptypeid = mf.gptypeid
+        join r_systems rs on rs.rsystemid = gp.rsystemid""",
+        'lookups': {}
+    },
+    'itemssets': {
+        'from': """from orders o
+        join orderitems oi on oi.orderid = o.orderid
+        join itemssets its on its.orderitemsid = oi.orderitemsid""",
+        'lookups': {
+            'gg': "left join groupgoods gg on gg.grgoodsid = its.setid"
+        }
+    }
+}
+
+# Метрики в порядке записи на лист "Заказы".
+# key - поле в данных по заказу; column/type/required/align - столбец листа (если метрика на нем есть);
+# priority - столбец публикуется в первой полосе записи (см. PRIORITY_LANES_CONFIG).
+# Источник значения:
+#   join_path, aggregate, value, condition, lookups - условный агрегат на общем пути соединения;
+#   reference_condition, reference_lookups - вариант условия с наборами id из кэша справочников
+#       (подстановка {имя_набора:столбец}, см. reference_data.py);
+#   query - отдельный запрос из SQL_QUERIES_BY_ORDER (если значение не сводится к агрегату);
+#   без источника - поле приходит вместе с ключом заказа (PRODDATE).
+METRICS = [
+    {
+        'key': 'QTY_IZD_PVH', 'column': 'Кол-во изд.', 'type': 'integer', 'required': True,
+        'join_path': 'models_systems', 'aggregate': 'sum', 'value': 'oi.qty',
+        'condition': "rs.systemtype = 0 and rs.rsystemid <> 8 and rs.rsystemid <> 27"
+    },
+    {
+        'key': 'QTY_GLASS_PACKS', 'column': 'кол-во зап.', 'type': 'integer', 'required': True,
+        'join_path': 'modelfillings', 'aggregate': 'sum', 'value': 'oi.qty',
+        'condition': "rs.rsystemid in (3, 21)"
+    },
+    {
+        'key': 'TOTALPRICE', 'column': 'сумма заказа', 'type': 'money', 'required': True,
+        'join_path': 'orders', 'aggregate': 'max', 'value': 'o.totalprice'
+    },
+    {
+        'key': 'PRODDATE', 'column': 'Дата произв-ва', 'type': 'date', 'required': True
+    },
+    {
+        'key': 'QTY_RAZDV', 'column': 'Раздвижка', 'type': 'integer', 'required': True,
+        'join_path': 'models_systems', 'aggregate': 'sum', 'value': 'oi.qty',
+        'condition': "(rs.systemtype = 1) or (rs.rsystemid = 8)"
+    },
+    {
+        'key': 'QTY_MOSNET', 'column': 'М/С', 'type': 'integer', 'required': True,
+        'join_path': 'itemsdetail', 'aggregate': 'sum', 'value': 'oi.qty * itd.qty',
+        'condition': "itd.grgoodsid = 46110"
+    },
+    {
+        'key': 'QTY_IRON', 'column': 'Изд из мет.', 'type': 'integer', 'required': True,
+        'join_path': 'itemssets', 'aggregate': 'sum', 'value': 'oi.qty * its.qty',
+        'condition': "gg.isggset = 1 and ((gg.marking like '%Водоотлив%') or (gg.marking like '%Железо%') "
+                     "or (gg.marking like '%Козырек%') or (gg.marking like '%Нащельник%'))",
+        'lookups': ['gg'],
+        'reference_condition': "{iron_set_ids:its.setid}", 'reference_lookups': []
+    },
+    {
+        'key': 'QTY_WINDOWSILLS', 'column': 'Подок-ки', 'type': 'integer', 'required': True,
+        'join_path': 'itemsdetail', 'aggregate': 'sum', 'value': 'itd.qty * oi.qty',
+        'condition': "gg.ggtypeid = 42 and g.goodsid is not null",
+        'lookups': ['gg', 'g']
+    },
+    {
+        'key': 'QTY_SANDWICHES', 'column': 'Сендв', 'type': 'integer', 'required': True,
+        'join_path': 'itemsdetail', 'aggregate': 'sum', 'value': 'oi.qty * itd.qty',
+        'condition': "ggt.code in ('Sand', 'SandDop')",
+        'lookups': ['gg', 'ggt'],
+        'reference_condition': "{sandwich_group_ids:itd.grgoodsid}", 'reference_lookups': []
+    },
+    {
+        'key': 'READINESS', 'column': 'Готовность из альтавина', 'type': 'text', 'required': False, 'align': 'CENTER',
+        'priority': True, 'query': 'readiness'
+    },
+    {
+        'key': 'ORDER_STATE_NAME', 'column': 'Состояние заказа', 'type': 'text', 'required': False, 'align': 'LEFT',
+        'priority': True, 'query': 'order_state'
+    },
+    {
+        'key': 'STATE_CHANGE_DATE', 'column': 'Дата перехода в состояние', 'type': 'datetime', 'required': False,
+        'align': 'CENTER', 'priority': True, 'query': 'order_state'
+    },
+    {
+        'key': 'ORDERID', 'join_path': 'orders', 'aggregate': 'max', 'value': 'o.orderid'
+    },
+    {
+        # Дата изменения заказа - для отложенной публикации (debounce.py)
+        'key': 'DATEMODIFIED', 'join_path': 'orders', 'aggregate': 'max', 'value': 'o.datemodified'
+    },
+]
+
+# Подстановка набора id из кэша справочников: {имя_набора:столбец}
+_REFERENCE_PLACEHOLDER_RE = re.compile(r'\{(\w+):([\w.]+)\}')
+
+# Firebird допускает не более 1500 элементов в одном списке IN
+MAX_IN_LIST_SIZE = 1500
+
+
+def sql_in_condition(column: str, ids: list[int]) -> str:
+    """
+    Формирует условие "столбец входит в список id" с учетом ограничения Firebird на размер IN.
+
+    Args:
+        column: Столбец (с псевдонимом таблицы).
+        ids: Список целочисленных id.
+
+    Returns:
+        SQL-условие. Для пустого списка - заведомо ложное условие.
+    """
+    if not ids:
+        return '1 = 0'
+    parts = []
+    for i in range(0, len(ids), MAX_IN_LIST_SIZE):
+        chunk = ', '.join(str(int(x)) for x in ids[i:i + MAX_IN_LIST_SIZE])
+        parts.append(f'{column} in ({chunk})')
+    return parts[0] if len(parts) == 1 else '(' + ' or '.join(parts) + ')'
+
+
+def register_metric(metric: dict):
+    """
+    Добавляет метрику в реестр.
+
+    Args:
+        metric: Описание метрики (см. METRICS).
+
+    Raises:
+        ValueError: Если метрика с таким ключом уже есть или описание неполное.
+    """
+    if any(m['key'] == metric['key'] for m in METRICS):
+        raise ValueError(f"Метрика {metric['key']} уже зарегистрирована.")
+    if 'join_path' in metric:
+        if metric['join_path'] not in METRIC_JOIN_PATHS:
+            raise ValueError(f"Неизвестный путь соединения: {metric['join_path']}.")
+        if 'aggregate' not in metric or 'value' not in metric:
+            raise ValueError(f"Для метрики {metric['key']} не указан агрегат или значение.")
+    elif 'query' in metric and metric['query'] not in SQL_QUERIES_BY_ORDER:
+        raise ValueError(f"Неизвестный запрос: {metric['query']}.")
+    METRICS.append(metric)
+
+
+def sheet_columns() -> list[dict]:
+    """
+    Возвращает описания столбцов листа "Заказы", которые заполняются метриками, в порядке записи.
+    """
+    return [m for m in METRICS if m.get('column')]
+
+
+def _metric_condition(metric: dict, reference_sets: dict | None) -> tuple[str | None, list[str]]:
+    """
+    Возвращает условие метрики и нужные ему справочные соединения с учетом кэша справочников.
+    """
+    if reference_sets is not None and 'reference_condition' in metric:
+        names = _REFERENCE_PLACEHOLDER_RE.findall(metric['reference_condition'])
+        if all(name in reference_sets for name, _ in names):
+            condition = _REFERENCE_PLACEHOLDER_RE.sub(
+                lambda m: sql_in_condition(m.group(2), reference_sets[m.group(1)]), metric['reference_condition'])
+            return condition, metric.get('reference_lookups', [])
+    return metric.get('condition'), metric.get('lookups', [])
+
+
+def _plan_aggregate_queries(reference_sets: dict | None, window_condition: str) -> dict[str, str]:
+    """
+    Строит по одному запросу с условными агрегатами на каждый путь соединения метрик.
+    """
+    groups = {}
+    for metric in METRICS:
+        if 'join_path' in metric:
+            groups.setdefault(metric['join_path'], []).append(metric)
+
+    queries = {}
+    for join_path, metrics in groups.items():
+        path = METRIC_JOIN_PATHS[join_path]
+        select_items = []
+        conditions = []
+        lookups = set()
+        for metric in metrics:
+            condition, metric_lookups = _metric_condition(metric, reference_sets)
+            lookups.update(metric_lookups)
+            if condition:
+                conditions.append(condition)
+                value = f"case when {condition} then {metric['value']} end"
+            else:
+                conditions.append(None)
+                value = metric['value']
+            select_items.append(f"{metric['aggregate']}({value}) as {metric['key'].lower()}")
+
+        joins = [join for alias, join in path['lookups'].items() if alias in lookups]
+        where = [window_condition]
+        # Если у всех метрик есть условия, отбираем только подходящие строки
+        if conditions and all(conditions):
+            where.append('(' + ' or '.join(f'({c})' for c in conditions) + ')')
+
+        queries[join_path] = "\n".join([
+            "select",
+            "    o.proddate,",
+            "    o.orderno,",
+            "    " + ",\n    ".join(select_items),
+            path['from'],
+            *joins,
+            "where " + "\n    and ".join(where),
+            "group by o.proddate, o.orderno"
+        ])
+    return queries
+
+
+def plan_metric_queries(reference_sets: dict | None = None, policy: str = None) -> dict[str, str]:
+    """
+    Строит запросы для выгрузки всех метрик реестра.
+
+    Метрики с общим путем соединения объединяются в один запрос: каждая метрика
+    становится условным агрегатом, а в WHERE попадает объединение их условий,
+    чтобы по-прежнему использовались индексы. Метрики с отдельным запросом (query)
+    выполняются как есть, каждый такой запрос - один раз.
+
+    Args:
+        reference_sets: Наборы id из кэша справочников или None.
+        policy: Политика окна выгрузки (по умолчанию из WINDOW_POLICY_CONFIG).
+
+    Returns:
+        Словарь имя запроса -> SQL. Параметры каждого запроса - window_params той же политики.
+    """
+    queries = _plan_aggregate_queries(reference_sets, window_condition(policy))
+    for name in standalone_metric_queries():
+        queries[name] = window_query(SQL_QUERIES_BY_ORDER[name], policy)
+    return queries
+
+
+def plan_metric_queries_for_orders(orderids: list[int], reference_sets: dict | None = None,
+                                   standalone: bool = False) -> dict[str, str]:
+    """
+    Строит запросы с условными агрегатами для указанных заказов.
+    Используется хранилищем метрик (metric_store.py) для пересчета только измененных заказов
+    и выборочным запуском по номерам заказов (database.get_data_from_db_for_orders).
+
+    Args:
+        orderids: Список orderid.
+        reference_sets: Наборы id из кэша справочников или None.
+        standalone: Добавить отдельные запросы (query) метрик с тем же условием на заказы.
+
+    Returns:
+        Словарь имя запроса -> SQL без параметров.
+    """
+    condition = f"{sql_in_condition('o.orderid', orderids)} and o.proddate is not null"
+    queries = _plan_aggregate_queries(reference_sets, condition)
+    if standalone:
+        for name in standalone_metric_queries():
+            queries[name] = SQL_QUERIES_BY_ORDER[name].format(window_condition=condition)
+    return queries
+
+
+def standalone_metric_queries() -> list[str]:
+    """Возвращает имена отдельных запросов (query) метрик реестра в порядке реестра."""
+    names = []
+    for metric in METRICS:
+        if 'join_path' not in metric and 'query' in metric and metric['query'] not in names:
+            names.append(metric['query'])
+    return names
+
+
+def aggregate_metric_keys() -> list[str]:
+    """Возвращает ключи метрик, которые считаются условными агрегатами (есть join_path)."""
+    return [metric['key'] for metric in METRICS if 'join_path' in metric]
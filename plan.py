@@ -0,0 +1,90 @@
+"""
+Режим плана: показывает, что изменит обновление листа "Заказы", ничего не записывая.
+
+Выполняет выгрузку из Firebird и сравнение с текущим содержимым листа,
+после чего выводит изменения по ячейкам, счетчики, количество запросов
+и оценку расхода квоты Google Sheets API в формате JSON.
+
+Пример:
+    python plan.py --days-back 7 --days-ahead 1 --output plan.json
+"""
+import argparse
+import json
+import logging
+import sys
+from datetime import date, timedelta
+from config import SHEETS_WRITE_CONFIG, SYNC_WINDOW, WINDOW_POLICY_CONFIG
+from database import get_data_from_db_by_order
+from google_sheets import get_sheets_targets, plan_google_sheet_orders
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def build_plan(start_date: date, end_date: date, max_payload_bytes: int = None, target: dict = None,
+               policy: str = None) -> dict | None:
+    """
+    Выгружает данные по заказам за период и строит план изменений листа "Заказы".
+
+    Args:
+        start_date: Начальная дата выборки (по дате изменения заказа).
+        end_date: Конечная дата выборки.
+        max_payload_bytes: Максимальный размер тела одного запроса к API.
+        target: Цель записи из get_sheets_targets (по умолчанию - основная таблица).
+        policy: Политика окна выгрузки (по умолчанию из WINDOW_POLICY_CONFIG).
+
+    Returns:
+        План изменений или None, если данные не удалось получить.
+    """
+    db_data_by_order = get_data_from_db_by_order(start_date, end_date, policy)
+    if db_data_by_order is None:
+        logging.error("Не удалось получить данные из БД. План не построен.")
+        return None
+
+    plan = plan_google_sheet_orders(db_data_by_order, max_payload_bytes=max_payload_bytes, target=target)
+    if plan is not None:
+        plan['window'] = {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(),
+                          'policy': policy or WINDOW_POLICY_CONFIG['policy']}
+    return plan
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="План изменений листа 'Заказы' без записи в таблицу.")
+    parser.add_argument('--days-back', type=int, default=SYNC_WINDOW['days_back'], help="Сколько дней назад от сегодня захватывать.")
+    parser.add_argument('--days-ahead', type=int, default=SYNC_WINDOW['days_ahead'], help="Сколько дней вперед от сегодня захватывать.")
+    parser.add_argument('--max-payload-bytes', type=int, default=SHEETS_WRITE_CONFIG['max_payload_bytes'],
+                        help="Максимальный размер тела одного запроса на запись.")
+    parser.add_argument('--target', help="Имя цели записи из файла целей (по умолчанию - первая цель).")
+    parser.add_argument('--summary-only', action='store_true', help="Не выводить изменения по отдельным ячейкам.")
+    parser.add_argument('--output', help="Файл для сохранения плана (по умолчанию - стандартный вывод).")
+    args = parser.parse_args(argv)
+
+    target = None
+    if args.target:
+        target = next((t for t in get_sheets_targets() if t['name'] == args.target), None)
+        if target is None:
+            parser.error(f"Цель '{args.target}' не найдена.")
+
+    today = date.today()
+    # Политика окна выгрузки применяется только к окну по умолчанию, как в цикле синхронизации
+    default_window = (args.days_back, args.days_ahead) == (SYNC_WINDOW['days_back'], SYNC_WINDOW['days_ahead'])
+    plan = build_plan(today - timedelta(days=args.days_back), today + timedelta(days=args.days_ahead),
+                      args.max_payload_bytes, target, None if default_window else 'datemodified')
+    if plan is None:
+        return 1
+
+    if args.summary_only:
+        plan.pop('changes', None)
+
+    plan_json = json.dumps(plan, ensure_ascii=False, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(plan_json)
+        logging.info(f"План сохранен в {args.output}: изменится ячеек {plan['counts']['cells_changed']}, "
+                     f"запросов на запись {plan['quota']['write_requests']}.")
+    else:
+        print(plan_json)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
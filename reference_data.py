@@ -0,0 +1,78 @@
+"""
+Кэш справочных данных Altawin.
+
+Запросы iron и sandwiches фильтруют группы товаров по LIKE '%...%' и по кодам типов групп.
+Эти справочники меняются редко, поэтому подходящие наборы id вычисляются один раз
+и подставляются в запросы по заказам готовыми списками (reference_condition в metrics.py).
+Наборы перечитываются по истечении TTL или когда меняется отпечаток справочников
+(количество записей и максимальный id).
+"""
+import fdb
+import logging
+import threading
+import time
+from config import REFERENCE_DATA_CONFIG, SQL_REFERENCE_FINGERPRINT, SQL_REFERENCE_QUERIES
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _read_fingerprint(cur) -> tuple:
+    cur.execute(SQL_REFERENCE_FINGERPRINT)
+    return tuple(cur.fetchone())
+
+
+def _load_sets(cur) -> dict[str, list[int]]:
+    sets = {}
+    for name, query in SQL_REFERENCE_QUERIES.items():
+        cur.execute(query)
+        sets[name] = sorted(row[0] for row in cur.fetchall())
+    return sets
+
+
+def get_reference_sets(con) -> dict[str, list[int]] | None:
+    """
+    Возвращает справочные наборы id, при необходимости перечитывая их из БД.
+
+    Args:
+        con: Открытое соединение с Firebird.
+
+    Returns:
+        Словарь имя набора -> список id или None, если кэш выключен или наборы не удалось получить.
+    """
+    if not REFERENCE_DATA_CONFIG['enabled']:
+        return None
+
+    now = time.monotonic()
+    cur = con.cursor()
+    with _cache_lock:
+        try:
+            if _cache and now - _cache['loaded_at'] < REFERENCE_DATA_CONFIG['ttl_minutes'] * 60:
+                if now - _cache['checked_at'] < REFERENCE_DATA_CONFIG['check_interval_minutes'] * 60:
+                    return _cache['sets']
+                fingerprint = _read_fingerprint(cur)
+                _cache['checked_at'] = now
+                if fingerprint == _cache['fingerprint']:
+                    return _cache['sets']
+                logging.info("Справочники групп товаров изменились, перечитываем справочные наборы...")
+            else:
+                fingerprint = _read_fingerprint(cur)
+
+            sets = _load_sets(cur)
+            _cache.update({'sets': sets, 'fingerprint': fingerprint, 'loaded_at': now, 'checked_at': now})
+            logging.info("Справочные наборы загружены: " + ", ".join(f"{name}={len(ids)}" for name, ids in sets.items()))
+            return sets
+
+        except fdb.Error as e:
+            logging.warning(f"Не удалось получить справочные наборы, используются исходные запросы: {e}")
+            return _cache.get('sets')
+        finally:
+            cur.close()
+
+
+def reset_reference_cache():
+    """Сбрасывает кэш справочных наборов, чтобы они были перечитаны при следующем обращении."""
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,223 @@
+"""
+Снимки выгрузки по заказам: сохранение данных каждого цикла и повторная запись в таблицу.
+
+После каждого цикла объединенные данные по заказам (то, что вернула БД) сохраняются
+в сжатый CSV (gzip) с типизированной строкой заголовков, старые снимки удаляются.
+Команда replay записывает сохраненный снимок на лист "Заказы" (или строит план
+изменений), не обращаясь к Firebird, - для разбора неверных цифр и воспроизводимых
+замеров производительности.
+
+Пример:
+    python snapshots.py list
+    python snapshots.py replay latest --plan
+    python snapshots.py replay snapshots/orders_20240201_101500.csv.gz --target main
+"""
+import argparse
+import csv
+import glob
+import gzip
+import json
+import logging
+import os
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+from config import SNAPSHOT_CONFIG
+from google_sheets import get_sheets_targets, plan_google_sheet_orders, update_google_sheet_orders
+from metrics import METRICS
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+SNAPSHOT_PREFIX = 'orders_'
+SNAPSHOT_SUFFIX = '.csv.gz'
+
+# None в текстовом столбце (пустая строка там - это пустой текст).
+# Текст, начинающийся с обратной косой черты, записывается с дополнительной чертой в начале.
+_TEXT_NULL = '\\N'
+
+
+def _write_text(value) -> str:
+    value = str(value)
+    return '\\' + value if value.startswith('\\') else value
+
+
+def _read_text(raw: str) -> str | None:
+    if raw == _TEXT_NULL:
+        return None
+    return raw[1:] if raw.startswith('\\') else raw
+
+
+# Тип значения -> (имя типа в заголовке, преобразование в строку)
+_WRITERS = {
+    datetime: ('datetime', datetime.isoformat),
+    date: ('date', date.isoformat),
+    Decimal: ('decimal', str),
+    bool: ('int', lambda value: str(int(value))),
+    int: ('int', str),
+    float: ('float', repr),
+    str: ('text', _write_text),
+}
+_DEFAULT_WRITER = ('text', _write_text)
+
+# Имя типа в заголовке -> преобразование из строки
+_READERS = {
+    'datetime': datetime.fromisoformat,
+    'date': date.fromisoformat,
+    'decimal': Decimal,
+    'int': int,
+    'float': float,
+    'text': _read_text,
+    # Снимки, сохраненные до появления типа text: None и пустой текст не различаются
+    'str': str,
+}
+
+
+def _snapshot_columns(data: list[dict]) -> list[str]:
+    """
+    Возвращает столбцы снимка: ключ заказа, затем метрики в порядке реестра, затем прочие поля.
+    """
+    keys = {}
+    for row_dict in data:
+        keys.update(dict.fromkeys(row_dict))
+    # PRODDATE есть и в реестре метрик, поэтому повторы убираются
+    ordered = list(dict.fromkeys(['PRODDATE', 'ORDERNO'] + [metric['key'] for metric in METRICS]))
+    return [key for key in ordered if key in keys] + [key for key in keys if key not in ordered]
+
+
+def _column_type(data: list[dict], column: str) -> str:
+    """Определяет тип столбца по первому непустому значению."""
+    for row_dict in data:
+        value = row_dict.get(column)
+        if value is not None:
+            return _WRITERS.get(type(value), _DEFAULT_WRITER)[0]
+    # Столбец без значений сохраняется как текстовый, None в нем восстанавливаются
+    return 'text'
+
+
+def save_snapshot(data: list[dict], directory: str = None, keep_files: int = None) -> str | None:
+    """
+    Сохраняет данные цикла в сжатый CSV и удаляет старые снимки.
+
+    Args:
+        data: Список словарей с данными по заказам.
+        directory: Каталог снимков.
+        keep_files: Сколько последних снимков хранить.
+
+    Returns:
+        Путь к файлу снимка или None в случае ошибки.
+    """
+    directory = directory or SNAPSHOT_CONFIG['directory']
+    keep_files = keep_files or SNAPSHOT_CONFIG['keep_files']
+
+    columns = _snapshot_columns(data)
+    types = [_column_type(data, column) for column in columns]
+    path = os.path.join(directory, f"{SNAPSHOT_PREFIX}{datetime.now().strftime('%Y%m%d_%H%M%S')}{SNAPSHOT_SUFFIX}")
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow([f"{column}:{column_type}" for column, column_type in zip(columns, types)])
+            for row_dict in data:
+                row = []
+                for column, column_type in zip(columns, types):
+                    value = row_dict.get(column)
+                    if value is None:
+                        row.append(_TEXT_NULL if column_type == 'text' else '')
+                    else:
+                        row.append(_WRITERS.get(type(value), _DEFAULT_WRITER)[1](value))
+                writer.writerow(row)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.error(f"Не удалось сохранить снимок выгрузки {path}: {e}")
+        return None
+
+    for old_path in list_snapshots(directory)[:-keep_files]:
+        try:
+            os.remove(old_path)
+        except OSError as e:
+            logging.warning(f"Не удалось удалить старый снимок {old_path}: {e}")
+
+    logging.info(f"Снимок выгрузки сохранен: {path} ({len(data)} заказов).")
+    return path
+
+
+def load_snapshot(path: str) -> list[dict]:
+    """
+    Читает снимок выгрузки и восстанавливает типы значений.
+
+    Args:
+        path: Путь к файлу снимка.
+
+    Returns:
+        Список словарей с данными по заказам в том виде, в каком их вернула БД.
+    """
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        columns = [tuple(item.rsplit(':', 1)) for item in header]
+        data = []
+        for row in reader:
+            row_dict = {}
+            for (column, column_type), raw in zip(columns, row):
+                # Пустая строка - это None для всех типов, кроме текста (там None записан как _TEXT_NULL)
+                if raw == '' and column_type not in ('text', 'str'):
+                    row_dict[column] = None
+                else:
+                    row_dict[column] = _READERS[column_type](raw)
+            data.append(row_dict)
+    return data
+
+
+def list_snapshots(directory: str = None) -> list[str]:
+    """Возвращает пути к снимкам в каталоге от старых к новым."""
+    directory = directory or SNAPSHOT_CONFIG['directory']
+    return sorted(glob.glob(os.path.join(directory, f"{SNAPSHOT_PREFIX}*{SNAPSHOT_SUFFIX}")))
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Снимки выгрузки по заказам.")
+    parser.add_argument('--directory', default=SNAPSHOT_CONFIG['directory'], help="Каталог снимков.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help="Показать сохраненные снимки.")
+    replay = subparsers.add_parser('replay', help="Записать снимок на лист 'Заказы' без обращения к БД.")
+    replay.add_argument('snapshot', help="Путь к файлу снимка или latest.")
+    replay.add_argument('--target', help="Имя цели записи (по умолчанию - первая цель).")
+    replay.add_argument('--plan', action='store_true', help="Только построить план изменений, ничего не записывая.")
+    args = parser.parse_args(argv)
+
+    snapshots = list_snapshots(args.directory)
+    if args.command == 'list':
+        for path in snapshots:
+            print(path)
+        return 0
+
+    path = args.snapshot
+    if path == 'latest':
+        if not snapshots:
+            parser.error(f"В каталоге {args.directory} нет снимков.")
+        path = snapshots[-1]
+
+    target = None
+    if args.target:
+        target = next((t for t in get_sheets_targets() if t['name'] == args.target), None)
+        if target is None:
+            parser.error(f"Цель '{args.target}' не найдена.")
+
+    data = load_snapshot(path)
+    logging.info(f"Снимок {path}: {len(data)} заказов.")
+
+    if args.plan:
+        plan = plan_google_sheet_orders(data, target=target)
+        if plan is None:
+            return 1
+        plan['snapshot'] = path
+        print(json.dumps(plan, ensure_ascii=False, indent=2, default=str))
+        return 0
+
+    return 0 if update_google_sheet_orders(data, target=target) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Замер времени холодного старта приложения.
+
+Запускает приложение с флагом --startup-check (загрузить модули БД и Google Sheets
+и завершиться) несколько раз и выводит минимальное, медианное и максимальное время,
+а также время импорта отдельных модулей в текущем интерпретаторе.
+
+Пример:
+    python startup_benchmark.py --runs 10
+    python startup_benchmark.py --exe dist/GoogleSheetsAltawin/GoogleSheetsAltawin.exe
+    python startup_benchmark.py --exe dist/GoogleSheetsAltawin.exe --exe dist/GoogleSheetsAltawin/GoogleSheetsAltawin.exe
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Модули, время импорта которых замеряется по отдельности (каждый в новом процессе)
+BENCHMARK_MODULES = ['config', 'database', 'google_sheets', 'main']
+
+
+def time_command(command: list[str], runs: int) -> dict:
+    """
+    Запускает команду runs раз и возвращает статистику времени выполнения в секундах.
+
+    Raises:
+        RuntimeError: Если команда завершилась с ошибкой.
+    """
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        elapsed = time.perf_counter() - started
+        if result.returncode != 0:
+            raise RuntimeError(f"Команда {' '.join(command)} завершилась с кодом {result.returncode}: {result.stderr.strip()}")
+        timings.append(elapsed)
+    return {
+        'command': ' '.join(command),
+        'runs': runs,
+        'min': round(min(timings), 3),
+        'median': round(statistics.median(timings), 3),
+        'max': round(max(timings), 3)
+    }
+
+
+def time_module_import(module: str, runs: int) -> dict:
+    """
+    Замеряет время импорта модуля в новом интерпретаторе (без учета запуска самого Python).
+    """
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return {
+        'module': module,
+        'runs': runs,
+        'min': round(min(timings), 3),
+        'median': round(statistics.median(timings), 3),
+        'max': round(max(timings), 3)
+    }
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Замер времени холодного старта приложения.")
+    parser.add_argument('--runs', type=int, default=5, help="Количество запусков для каждого замера.")
+    parser.add_argument('--exe', action='append', default=[],
+                        help="Собранный exe для замера (можно указать несколько). По умолчанию - python main.py.")
+    parser.add_argument('--skip-modules', action='store_true', help="Не замерять импорт отдельных модулей.")
+    args = parser.parse_args(argv)
+
+    main_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    commands = [[exe, '--startup-check'] for exe in args.exe] or [[sys.executable, main_script, '--startup-check']]
+
+    report = {'startup': [], 'imports': []}
+    try:
+        for command in commands:
+            report['startup'].append(time_command(command, args.runs))
+        if not args.skip_modules:
+            for module in BENCHMARK_MODULES:
+                report['imports'].append(time_module_import(module, args.runs))
+    except (OSError, RuntimeError, subprocess.CalledProcessError) as e:
+        print(f"Ошибка замера: {e}", file=sys.stderr)
+        return 1
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Тесты выбора строк и сборки запросов архивирования (archive.py) без обращения к API.
+"""
+from datetime import date
+from types import SimpleNamespace
+
+import archive
+from archive import archive_target, archive_worksheet_name, build_archive_requests, rows_unchanged, \
+    select_rows_to_archive
+
+
+class _Spreadsheet:
+    """Листы: title -> id; col_counts - текущее число столбцов листа (по умолчанию 3)."""
+
+    def __init__(self, worksheets: dict[str, int], used_rows: dict[str, int] = None,
+                 col_counts: dict[str, int] = None, orders: list[str] = None):
+        col_counts = col_counts or {}
+        self._worksheets = [SimpleNamespace(title=title, id=sheet_id, col_count=col_counts.get(title, 3))
+                            for title, sheet_id in worksheets.items()]
+        self._used_rows = used_rows or {}
+        self.orders = orders
+        self.ranges = []
+        self.updates = []
+
+    def worksheets(self):
+        return self._worksheets
+
+    def values_batch_get(self, ranges):
+        self.ranges.append(ranges)
+        titles = [name.rsplit('!', 1)[0].strip("'") for name in ranges]
+        if titles == ['Заказы']:
+            return {'valueRanges': [{'values': [[value] if value else [] for value in self.orders]}]}
+        return {'valueRanges': [{'values': [['x']] * self._used_rows[title]} if self._used_rows.get(title) else {}
+                                for title in titles]}
+
+    def batch_update(self, body):
+        self.updates.append(body)
+
+
+def _snapshot(proddates: list[str], spreadsheet=None) -> dict:
+    # Строки 1 и 2 - заголовки и время обновления, заказы - с третьей строки
+    header = ['Номер заказа', 'Дата произв-ва', 'Готовность']
+    return {
+        'spreadsheet': spreadsheet or _Spreadsheet({'Заказы': 1}),
+        'sheet': SimpleNamespace(id=1, title='Заказы', col_count=3),
+        'header': header,
+        'order_col_idx': 0,
+        'columns': {'PRODDATE': 1},
+        'column_values': {1: ['Дата произв-ва', ''] + proddates},
+        'order_to_row_map': {f'N{row}': row for row in range(3, 3 + len(proddates))},
+    }
+
+
+def _requests_of(requests, kind):
+    return [request[kind] for request in requests if kind in request]
+
+
+def test_select_oldest_rows_before_horizon():
+    snapshot = _snapshot(['15.01.2024', '10.03.2024', '', '05.01.2024', '20.02.2024'])
+
+    assert select_rows_to_archive(snapshot, date(2024, 3, 1), 10) == [
+        (6, date(2024, 1, 5)), (3, date(2024, 1, 15)), (7, date(2024, 2, 20))]
+    assert select_rows_to_archive(snapshot, date(2024, 3, 1), 2) == [(6, date(2024, 1, 5)), (3, date(2024, 1, 15))]
+
+
+def test_new_archive_sheet_gets_header_and_rows():
+    snapshot = _snapshot(['15.01.2024', '16.01.2024', '17.03.2024', '18.01.2024'])
+    rows = [(3, date(2024, 1, 15)), (4, date(2024, 1, 16)), (6, date(2024, 1, 18))]
+
+    requests, counts = build_archive_requests(snapshot, rows)
+
+    assert counts == {archive_worksheet_name(date(2024, 1, 1)): 3}
+    (add_sheet,) = _requests_of(requests, 'addSheet')
+    assert add_sheet['properties']['sheetId'] == 2
+    assert add_sheet['properties']['gridProperties']['rowCount'] == 4
+    # Заголовок, затем строки 3-4 и 6 подряд со второй строки листа архива
+    copies = [(c['source']['startRowIndex'], c['source']['endRowIndex'], c['destination']['startRowIndex'])
+              for c in _requests_of(requests, 'copyPaste')]
+    assert copies == [(0, 1, 0), (2, 4, 1), (5, 6, 3)]
+    # Строки удаляются снизу вверх
+    deletes = [(d['range']['startIndex'], d['range']['endIndex']) for d in _requests_of(requests, 'deleteDimension')]
+    assert deletes == [(5, 6), (2, 4)]
+    # Существующих листов архива нет - занятые строки не читаются
+    assert snapshot['spreadsheet'].ranges == []
+
+
+def test_existing_archive_sheet_is_appended():
+    title = archive_worksheet_name(date(2024, 1, 1))
+    spreadsheet = _Spreadsheet({'Заказы': 1, title: 5}, used_rows={title: 10})
+    snapshot = _snapshot(['15.01.2024', '16.02.2024'], spreadsheet)
+
+    requests, counts = build_archive_requests(snapshot, [(3, date(2024, 1, 15)), (4, date(2024, 2, 16))])
+
+    assert counts == {title: 1, archive_worksheet_name(date(2024, 2, 1)): 1}
+    assert _requests_of(requests, 'appendDimension') == [{'sheetId': 5, 'dimension': 'ROWS', 'length': 1}]
+    assert [a['properties']['sheetId'] for a in _requests_of(requests, 'addSheet')] == [6]
+    destinations = [(c['destination']['sheetId'], c['destination']['startRowIndex'])
+                    for c in _requests_of(requests, 'copyPaste')]
+    assert destinations == [(5, 10), (6, 0), (6, 1)]
+    assert len(spreadsheet.ranges) == 1 and len(spreadsheet.ranges[0]) == 1
+
+
+def test_column_count_comes_from_current_sheet_properties():
+    title = archive_worksheet_name(date(2024, 1, 1))
+    # После открытия листа синхронизация добавила столбцы: в кэше 3, на самом деле 5
+    spreadsheet = _Spreadsheet({'Заказы': 1, title: 5}, used_rows={title: 10}, col_counts={'Заказы': 5})
+    snapshot = _snapshot(['15.01.2024', '16.02.2024'], spreadsheet)
+
+    requests, _ = build_archive_requests(snapshot, [(3, date(2024, 1, 15)), (4, date(2024, 2, 16))])
+
+    assert {c['source']['endColumnIndex'] for c in _requests_of(requests, 'copyPaste')} == {5}
+    assert [a['properties']['gridProperties']['columnCount'] for a in _requests_of(requests, 'addSheet')] == [5]
+    # Существующий лист архива расширяется до ширины рабочего листа
+    assert {'sheetId': 5, 'dimension': 'COLUMNS', 'length': 2} in _requests_of(requests, 'appendDimension')
+
+
+def test_rows_unchanged_checks_order_numbers():
+    spreadsheet = _Spreadsheet({'Заказы': 1}, orders=['Номер заказа', '', 'N3', 'N4'])
+    snapshot = _snapshot(['15.01.2024', '16.01.2024'], spreadsheet)
+    rows = [(3, date(2024, 1, 15)), (4, date(2024, 1, 16))]
+    assert rows_unchanged(snapshot, rows)
+
+    # Синхронизация вставила строку над заказами - номера строк из снимка устарели
+    spreadsheet.orders = ['Номер заказа', '', 'N9', 'N3', 'N4']
+    assert not rows_unchanged(snapshot, rows)
+    spreadsheet.orders = ['Номер заказа', '', 'N3']
+    assert not rows_unchanged(snapshot, rows)
+
+
+def test_archive_target_rebuilds_batch_when_sheet_changed(monkeypatch):
+    spreadsheet = _Spreadsheet({'Заказы': 1}, orders=['Номер заказа', '', 'N9', 'N3'])
+    snapshots = [_snapshot(['15.01.2024'], spreadsheet), _snapshot(['', '15.01.2024'], spreadsheet)]
+    # Второй снимок прочитан уже после вставки строки: заказ N3 в строке 4
+    snapshots[1]['order_to_row_map'] = {'N9': 3, 'N3': 4}
+    monkeypatch.setattr(archive, 'load_orders_snapshot', lambda *args, **kwargs: snapshots.pop(0))
+    monkeypatch.setitem(archive.ARCHIVE_CONFIG, 'max_batches', 2)
+
+    assert archive_target(None, horizon_days=1) == 1
+
+    (update,) = spreadsheet.updates
+    deletes = [(d['range']['startIndex'], d['range']['endIndex']) for d in _requests_of(update['requests'],
+                                                                                          'deleteDimension')]
+    assert deletes == [(3, 4)]
@@ -0,0 +1,68 @@
+"""
+Тесты разбиения периода и контрольной точки догрузки (backfill.py).
+"""
+import json
+from datetime import date
+
+import pytest
+
+from backfill import load_checkpoint, save_checkpoint, split_date_range
+
+
+def test_split_covers_range_with_shared_bounds():
+    partitions = split_date_range(date(2024, 1, 1), date(2024, 1, 10), 3)
+
+    assert partitions == [
+        (date(2024, 1, 1), date(2024, 1, 4)),
+        (date(2024, 1, 4), date(2024, 1, 7)),
+        (date(2024, 1, 7), date(2024, 1, 10)),
+        (date(2024, 1, 10), date(2024, 1, 11)),
+    ]
+
+
+def test_split_single_day():
+    assert split_date_range(date(2024, 1, 1), date(2024, 1, 1), 7) == [(date(2024, 1, 1), date(2024, 1, 2))]
+
+
+def test_split_empty_when_until_before_since():
+    assert split_date_range(date(2024, 1, 5), date(2024, 1, 1), 1) == []
+
+
+def test_split_rejects_non_positive_partition():
+    with pytest.raises(ValueError):
+        split_date_range(date(2024, 1, 1), date(2024, 1, 10), 0)
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    completed = {'2024-01-04', '2024-01-01'}
+
+    save_checkpoint(path, date(2024, 1, 1), date(2024, 1, 10), 3, completed)
+
+    assert load_checkpoint(path, date(2024, 1, 1), date(2024, 1, 10), 3) == completed
+    assert not (tmp_path / 'checkpoint.json.tmp').exists()
+
+
+def test_checkpoint_with_other_parameters_is_ignored(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    save_checkpoint(path, date(2024, 1, 1), date(2024, 1, 10), 3, {'2024-01-01'})
+
+    assert load_checkpoint(path, date(2024, 1, 1), date(2024, 1, 10), 7) == set()
+    assert load_checkpoint(path, date(2024, 1, 2), date(2024, 1, 10), 3) == set()
+
+
+def test_missing_or_broken_checkpoint_starts_over(tmp_path):
+    path = tmp_path / 'checkpoint.json'
+    assert load_checkpoint(str(path), date(2024, 1, 1), date(2024, 1, 10), 3) == set()
+
+    path.write_text('{not json', encoding='utf-8')
+    assert load_checkpoint(str(path), date(2024, 1, 1), date(2024, 1, 10), 3) == set()
+
+
+def test_checkpoint_file_is_sorted_json(tmp_path):
+    path = tmp_path / 'checkpoint.json'
+    save_checkpoint(str(path), date(2024, 1, 1), date(2024, 1, 10), 3, {'2024-01-07', '2024-01-01'})
+
+    saved = json.loads(path.read_text(encoding='utf-8'))
+    assert saved['completed'] == ['2024-01-01', '2024-01-07']
+    assert saved['partition_days'] == 3
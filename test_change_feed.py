@@ -0,0 +1,92 @@
+"""
+Тесты ленты изменений (change_feed.py).
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import change_feed
+from change_feed import commit_change_feed, compute_change_feed, record_hash, records_to_publish, reset_change_feed
+from config import CHANGE_FEED_CONFIG
+
+
+@pytest.fixture(autouse=True)
+def clean_feed(monkeypatch):
+    monkeypatch.setitem(CHANGE_FEED_CONFIG, 'state_file', '')
+    monkeypatch.setitem(CHANGE_FEED_CONFIG, 'full_publish_minutes', 60)
+    reset_change_feed()
+    yield
+    reset_change_feed()
+
+
+def _order(order_no, qty=1):
+    return {'ORDERNO': order_no, 'PRODDATE': '2024-02-01', 'QTY_IZD_PVH': qty}
+
+
+def test_record_hash_ignores_field_order():
+    assert record_hash({'A': 1, 'B': 2}) == record_hash({'B': 2, 'A': 1})
+    assert record_hash({'A': 1}) != record_hash({'A': 2})
+
+
+def test_first_cycle_publishes_everything():
+    data = [_order('1'), _order('2')]
+    feed = compute_change_feed(data)
+
+    assert feed['full']
+    assert records_to_publish(feed, data) == data
+
+
+def test_only_new_and_changed_orders_after_commit():
+    commit_change_feed(compute_change_feed([_order('1'), _order('2'), _order('3')]))
+
+    data = [_order('1'), _order('2', qty=5), _order('4')]
+    feed = compute_change_feed(data)
+
+    assert not feed['full']
+    assert [r['ORDERNO'] for r in feed['inserted']] == ['4']
+    assert [r['ORDERNO'] for r in feed['changed']] == ['2']
+    assert feed['removed'] == ['3']
+    assert [r['ORDERNO'] for r in records_to_publish(feed, data)] == ['4', '2']
+
+
+def test_uncommitted_feed_is_published_again():
+    commit_change_feed(compute_change_feed([_order('1')]))
+    compute_change_feed([_order('1', qty=2)])
+
+    feed = compute_change_feed([_order('1', qty=2)])
+    assert [r['ORDERNO'] for r in feed['changed']] == ['1']
+
+
+def test_skipped_orders_are_not_committed():
+    data = [_order('1'), _order('2')]
+    commit_change_feed(compute_change_feed(data), skipped_orders={'2'})
+
+    feed = compute_change_feed(data)
+    assert [r['ORDERNO'] for r in records_to_publish(feed, data)] == ['2']
+
+
+def test_full_publish_after_interval(monkeypatch):
+    data = [_order('1')]
+    commit_change_feed(compute_change_feed(data))
+    change_feed._state['full_published_at'] = datetime.now() - timedelta(minutes=61)
+
+    feed = compute_change_feed(data)
+    assert feed['full']
+    assert records_to_publish(feed, data) == data
+
+
+def test_state_file_round_trip(tmp_path, monkeypatch):
+    path = tmp_path / 'feed.json'
+    monkeypatch.setitem(CHANGE_FEED_CONFIG, 'state_file', str(path))
+    commit_change_feed(compute_change_feed([_order('1')]))
+    assert set(json.loads(path.read_text(encoding='utf-8'))['hashes']) == {'1'}
+
+    # Новый процесс: состояние в памяти пусто и загружается из файла
+    change_feed._state.clear()
+    feed = compute_change_feed([_order('1')])
+    assert not feed['full']
+    assert feed['inserted'] == [] and feed['changed'] == []
+
+    reset_change_feed()
+    assert not path.exists()
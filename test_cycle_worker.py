@@ -0,0 +1,61 @@
+"""
+Тесты процесса-исполнителя под контролем сторожа (cycle_worker.py).
+"""
+import time
+
+import pytest
+
+import main
+from config import WATCHDOG_CONFIG
+from cycle_worker import DONE, FAILED, TIMED_OUT, report_stage, run_supervised, stop_worker
+
+
+def _add(a, b):
+    return a + b
+
+
+def _fail():
+    raise ValueError("ошибка в задаче")
+
+
+def _hang_in_db():
+    report_stage('db')
+    time.sleep(60)
+
+
+@pytest.fixture
+def watchdog(monkeypatch):
+    monkeypatch.setitem(WATCHDOG_CONFIG, 'stage_timeouts', {'db': 1})
+    monkeypatch.setitem(WATCHDOG_CONFIG, 'default_timeout_seconds', 30)
+    monkeypatch.setitem(WATCHDOG_CONFIG, 'kill_grace_seconds', 5)
+    yield
+    stop_worker()
+
+
+def test_result_is_returned(watchdog):
+    assert run_supervised(_add, 2, 3) == (DONE, 5)
+
+
+def test_exception_is_reported_with_traceback(watchdog, caplog):
+    status, error = run_supervised(_fail)
+
+    assert status == FAILED
+    assert 'ValueError: ошибка в задаче' in error and 'Traceback' in error
+    assert 'ValueError: ошибка в задаче' in caplog.text
+    # Исполнитель после ошибки в задаче продолжает работать
+    assert run_supervised(_add, 1, 1) == (DONE, 2)
+
+
+def test_stage_timeout_is_reported_separately(watchdog):
+    assert run_supervised(_hang_in_db) == (TIMED_OUT, 'db')
+
+
+@pytest.mark.parametrize('outcome, exit_code', [
+    ((DONE, main.EXIT_SHEETS_ERROR), main.EXIT_SHEETS_ERROR),
+    ((FAILED, 'Traceback ...'), main.EXIT_WORKER_FAILED),
+    ((TIMED_OUT, 'db'), main.EXIT_STAGE_TIMEOUT),
+])
+def test_run_task_exit_codes(monkeypatch, outcome, exit_code):
+    monkeypatch.setitem(WATCHDOG_CONFIG, 'enabled', True)
+    monkeypatch.setattr(main, 'run_supervised', lambda func, *args: outcome)
+    assert main.run_task(_add, 1, 2) == exit_code
@@ -0,0 +1,86 @@
+"""
+Тесты сводки по датам производства (daily_summary.py).
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import google_sheets
+from config import DAILY_SUMMARY_CONFIG
+from daily_summary import SUMMARY_KEYS, build_daily_summary, publish_daily_summary
+
+START = date(2024, 3, 1)
+END = date(2024, 3, 3)
+
+
+def _by_date(summary):
+    return {row['PRODDATE']: row for row in summary}
+
+
+def test_summary_has_every_date_with_zeros():
+    summary = build_daily_summary([], START, END)
+
+    assert [row['PRODDATE'] for row in summary] == [START, date(2024, 3, 2), END]
+    for row in summary:
+        assert all(row[key] == 0 for key in SUMMARY_KEYS)
+
+
+def test_summary_adds_up_orders_by_date():
+    data = [{'PRODDATE': START, 'QTY_IZD_PVH': 2, 'QTY_IRON': 1},
+            {'PRODDATE': START, 'QTY_IZD_PVH': 3},
+            {'PRODDATE': END, 'QTY_GLASS_PACKS': 4}]
+    summary = _by_date(build_daily_summary(data, START, END))
+
+    assert summary[START]['QTY_IZD_PVH'] == 5
+    assert summary[START]['QTY_IRON'] == 1
+    assert summary[END]['QTY_GLASS_PACKS'] == 4
+    assert summary[date(2024, 3, 2)]['QTY_IZD_PVH'] == 0
+
+
+def test_summary_normalises_datetime_proddate():
+    data = [{'PRODDATE': datetime(2024, 3, 2, 0, 0), 'QTY_RAZDV': 7}]
+    assert _by_date(build_daily_summary(data, START, END))[date(2024, 3, 2)]['QTY_RAZDV'] == 7
+
+
+def test_summary_ignores_dates_outside_range_and_missing_dates():
+    data = [{'PRODDATE': START - timedelta(days=1), 'QTY_IZD_PVH': 10},
+            {'PRODDATE': END + timedelta(days=1), 'QTY_IZD_PVH': 10},
+            {'PRODDATE': None, 'QTY_IZD_PVH': 10}]
+    assert all(row['QTY_IZD_PVH'] == 0 for row in build_daily_summary(data, START, END))
+
+
+def test_summary_counts_none_values_as_zero():
+    data = [{'PRODDATE': START, 'QTY_MOSNET': None}, {'PRODDATE': START, 'QTY_MOSNET': 2}]
+    assert _by_date(build_daily_summary(data, START, END))[START]['QTY_MOSNET'] == 2
+
+
+@pytest.fixture
+def written(monkeypatch):
+    summaries = []
+
+    def update_google_sheet_summary(summary):
+        summaries.append(summary)
+        return True
+
+    monkeypatch.setattr(google_sheets, 'update_google_sheet_summary', update_google_sheet_summary)
+    return summaries
+
+
+def test_publish_sums_cycle_extraction(monkeypatch, written):
+    monkeypatch.setitem(DAILY_SUMMARY_CONFIG, 'enabled', True)
+    monkeypatch.setitem(DAILY_SUMMARY_CONFIG, 'days_back', 1)
+    monkeypatch.setitem(DAILY_SUMMARY_CONFIG, 'days_ahead', 1)
+    today = date.today()
+
+    assert publish_daily_summary([{'PRODDATE': today, 'QTY_IZD_PVH': 4}])
+    (summary,) = written
+    assert [row['PRODDATE'] for row in summary] == [today - timedelta(days=1), today, today + timedelta(days=1)]
+    assert _by_date(summary)[today]['QTY_IZD_PVH'] == 4
+
+
+def test_publish_fails_when_window_does_not_cover_summary(monkeypatch, written):
+    # Без DAILY_SUMMARY_CONFIG окно выгрузки не дополняется датами сводки
+    monkeypatch.setitem(DAILY_SUMMARY_CONFIG, 'enabled', False)
+
+    assert not publish_daily_summary([{'PRODDATE': date.today(), 'QTY_IZD_PVH': 4}])
+    assert written == []
@@ -0,0 +1,77 @@
+"""
+Тесты отложенной публикации (debounce.py).
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import DEBOUNCE_CONFIG
+from debounce import coalesce_orders, reset_debounce
+
+START = datetime(2024, 2, 1, 12, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    monkeypatch.setitem(DEBOUNCE_CONFIG, 'quiet_seconds', 120)
+    monkeypatch.setitem(DEBOUNCE_CONFIG, 'max_delay_seconds', 600)
+    reset_debounce()
+    yield
+    reset_debounce()
+
+
+def _order(order_no, modified):
+    return {'ORDERNO': order_no, 'DATEMODIFIED': modified}
+
+
+def _publish(data, now):
+    ready, held = coalesce_orders(data, now)
+    return [row['ORDERNO'] for row in ready], held
+
+
+def test_quiet_order_is_published_at_once():
+    assert _publish([_order('1', START - timedelta(minutes=10))], START) == (['1'], [])
+
+
+def test_recently_modified_order_is_held_until_quiet():
+    data = [_order('1', START - timedelta(seconds=30))]
+
+    assert _publish(data, START) == ([], ['1'])
+    assert _publish(data, START + timedelta(seconds=60)) == ([], ['1'])
+    assert _publish(data, START + timedelta(seconds=90)) == (['1'], [])
+
+
+def test_new_change_restarts_quiet_period():
+    assert _publish([_order('1', START - timedelta(minutes=10))], START) == (['1'], [])
+
+    # Приложение заметило новую дату изменения - отсчет идет от момента обнаружения
+    modified = START + timedelta(seconds=50)
+    assert _publish([_order('1', modified)], START + timedelta(seconds=60)) == ([], ['1'])
+    assert _publish([_order('1', modified)], START + timedelta(seconds=179)) == ([], ['1'])
+    assert _publish([_order('1', modified)], START + timedelta(seconds=180)) == (['1'], [])
+
+
+def test_order_edited_continuously_is_published_after_max_delay():
+    now = START
+    assert _publish([_order('1', now)], now) == ([], ['1'])
+
+    published = []
+    for step in range(1, 12):
+        now = START + timedelta(seconds=60 * step)
+        ready, _ = _publish([_order('1', now)], now)
+        published.extend(ready)
+
+    # Заказ меняется каждую минуту; публикуется один раз по истечении max_delay (600 с)
+    assert published == ['1']
+
+
+def test_orders_without_datemodified_are_not_held():
+    assert _publish([_order('1', None)], START) == (['1'], [])
+
+
+def test_orders_leaving_window_are_forgotten():
+    _publish([_order('1', START)], START)
+    _publish([], START + timedelta(seconds=10))
+
+    # Заказ снова в окне: время изменения берется из o.datemodified, как для нового
+    assert _publish([_order('1', START - timedelta(minutes=5))], START + timedelta(seconds=20)) == (['1'], [])
@@ -0,0 +1,246 @@
+"""
+Тесты сборки запросов к Google Sheets (google_sheets.py) без обращения к API.
+"""
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import gspread
+import google_sheets
+from config import DISPLAY_WINDOW_CONFIG, ORDERS_APPEND_CONFIG, PRIORITY_LANES_CONFIG
+from google_sheets import (_group_rows_by_visibility, _split_by_payload, _update_lane, build_display_requests,
+                           execute_orders_value_calls, execute_orders_write_call, update_google_sheet_targets)
+from metrics import sheet_columns
+
+
+def _size(chunk):
+    return sum(len(json.dumps(item, ensure_ascii=False).encode('utf-8')) + 1 for item in chunk)
+
+
+def test_split_keeps_order_and_respects_limit():
+    items = [{'range': f'A{i}', 'values': [['x' * 20]]} for i in range(50)]
+    chunks = _split_by_payload(items, 300)
+
+    assert [item for chunk in chunks for item in chunk] == items
+    assert len(chunks) > 1
+    assert all(_size(chunk) <= 300 for chunk in chunks)
+
+
+def test_split_counts_utf8_bytes():
+    items = [{'values': [['Ж' * 10]]}, {'values': [['Ж' * 10]]}]
+    # Кириллица занимает 2 байта в UTF-8: одна часть не вместит оба элемента
+    assert len(_split_by_payload(items, _size(items) - 1)) == 2
+    assert len(_split_by_payload(items, _size(items))) == 1
+
+
+def test_split_sends_oversized_item_alone():
+    big = {'values': [['x' * 1000]]}
+    small = {'values': [['y']]}
+    assert _split_by_payload([small, big, small], 100) == [[small], [big], [small]]
+
+
+def test_split_empty():
+    assert _split_by_payload([], 100) == []
+
+
+def test_group_rows_merges_contiguous_runs():
+    rows = {5: True, 3: True, 4: True, 6: False, 8: False, 9: True}
+    assert _group_rows_by_visibility(rows) == [(3, 5, True), (6, 6, False), (8, 8, False), (9, 9, True)]
+
+
+def test_group_rows_empty():
+    assert _group_rows_by_visibility({}) == []
+
+
+class _Sheet:
+    id = 7
+
+
+class _Spreadsheet:
+    def __init__(self):
+        self.bodies = []
+
+    def batch_update(self, body):
+        self.bodies.append(body)
+
+
+@pytest.fixture
+def display_window(monkeypatch):
+    monkeypatch.setitem(DISPLAY_WINDOW_CONFIG, 'enabled', True)
+    monkeypatch.setitem(DISPLAY_WINDOW_CONFIG, 'days_before', 2)
+    monkeypatch.setitem(DISPLAY_WINDOW_CONFIG, 'days_after', 5)
+    monkeypatch.setattr(google_sheets, '_display_state', {})
+
+
+def _display_snapshot(proddates: list[str]) -> dict:
+    # Строки 1 и 2 - заголовки и время обновления, заказы - с третьей строки
+    return {
+        'target': {'spreadsheet_id': 'sheet', 'worksheet_name': 'Заказы'},
+        'sheet': _Sheet(),
+        'spreadsheet': _Spreadsheet(),
+        'columns': {'PRODDATE': 1},
+        'column_values': {1: ['Дата произв-ва', ''] + proddates},
+        'row_count': 2 + len(proddates),
+        'order_to_row_map': {str(i): row for i, row in enumerate(range(3, 3 + len(proddates)))},
+    }
+
+
+def _ddmmyyyy(days: int) -> str:
+    return (date.today() + timedelta(days=days)).strftime('%d.%m.%Y')
+
+
+def _hidden_ranges(requests):
+    return [(r['updateDimensionProperties']['range']['startIndex'] + 1,
+             r['updateDimensionProperties']['range']['endIndex'],
+             r['updateDimensionProperties']['properties']['hiddenByUser']) for r in requests]
+
+
+def test_display_hides_rows_outside_window(display_window):
+    snapshot = _display_snapshot([_ddmmyyyy(-10), _ddmmyyyy(0), _ddmmyyyy(3), 'не дата', _ddmmyyyy(6)])
+    requests, _ = build_display_requests(snapshot, [])
+    assert _hidden_ranges(requests) == [(3, 3, True), (4, 5, False), (6, 7, True)]
+
+
+def test_display_uses_values_written_in_cycle(display_window):
+    snapshot = _display_snapshot([_ddmmyyyy(-10)])
+    updates = [{'key': 'PRODDATE', 'row': 3, 'values': [[_ddmmyyyy(1)]]}]
+    requests, _ = build_display_requests(snapshot, updates)
+    assert _hidden_ranges(requests) == [(3, 3, False)]
+
+
+def test_display_sends_only_changes_after_state_is_stored(display_window):
+    snapshot = _display_snapshot([_ddmmyyyy(0), _ddmmyyyy(1)])
+    requests, state = build_display_requests(snapshot, [])
+    # Построение запросов не меняет сохраненное состояние
+    assert google_sheets._display_state == {}
+
+    execute_orders_write_call(snapshot, {'kind': 'display', 'body': {'requests': requests}, 'display_state': state})
+    assert snapshot['spreadsheet'].bodies == [{'requests': requests}]
+
+    assert build_display_requests(snapshot, [])[0] == []
+    updates = [{'key': 'PRODDATE', 'row': 4, 'values': [[_ddmmyyyy(-20)]]}]
+    assert _hidden_ranges(build_display_requests(snapshot, updates)[0]) == [(4, 4, True)]
+
+
+def test_display_disabled(monkeypatch):
+    monkeypatch.setitem(DISPLAY_WINDOW_CONFIG, 'enabled', False)
+    assert build_display_requests(_display_snapshot([_ddmmyyyy(0)]), []) is None
+
+
+def test_update_lane():
+    today = date(2024, 3, 5)
+    priority = {'key': 'READINESS', 'priority': True}
+    quantity = {'key': 'QTY_IZD_PVH'}
+
+    assert _update_lane(priority, date(2024, 1, 1), today) == 0
+    assert _update_lane(quantity, datetime(2024, 3, 5, 0, 0), today) == 0
+    assert _update_lane(quantity, date(2024, 3, 6), today) == 1
+    assert _update_lane(quantity, None, today) == 1
+    assert _update_lane(quantity, date(2024, 3, 4), today) == 2
+
+
+class _Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = ''
+
+    def json(self):
+        return {'error': {'code': self.status_code, 'message': 'error', 'status': 'ERROR'}}
+
+
+class _LaneSpreadsheet:
+    """Запоминает записанные диапазоны; вызов записи значений с номером fail_at завершается ошибкой status_code."""
+
+    def __init__(self, fail_at: int = None, status_code: int = 429):
+        self.fail_at = fail_at
+        self.status_code = status_code
+        self.value_calls = []
+        self.batch_updates = []
+
+    def values_batch_update(self, body):
+        if len(self.value_calls) + 1 == self.fail_at:
+            self.fail_at = None
+            raise gspread.exceptions.APIError(_Response(self.status_code))
+        self.value_calls.append([item['range'] for item in body['data']])
+
+    def batch_update(self, body):
+        self.batch_updates.append(body)
+
+
+class _LaneSheet:
+    id = 7
+    title = 'Заказы'
+
+
+@pytest.fixture
+def lanes_sheet(monkeypatch):
+    monkeypatch.setitem(PRIORITY_LANES_CONFIG, 'enabled', True)
+    monkeypatch.setitem(DISPLAY_WINDOW_CONFIG, 'enabled', False)
+    monkeypatch.setitem(ORDERS_APPEND_CONFIG, 'enabled', False)
+    target_columns = [column for column in sheet_columns() if column['key'] in ('READINESS', 'QTY_IZD_PVH')]
+    snapshot = {
+        'target': {'name': 'основная', 'spreadsheet_id': 'sheet', 'worksheet_name': 'Заказы'},
+        'spreadsheet': _LaneSpreadsheet(),
+        'sheet': _LaneSheet(),
+        'columns': {'READINESS': 2, 'QTY_IZD_PVH': 3},
+        'target_columns': target_columns,
+        'order_to_row_map': {'TODAY': 3, 'NEXT': 4, 'PAST': 5},
+    }
+    monkeypatch.setattr(google_sheets, 'load_orders_snapshot', lambda *args, **kwargs: snapshot)
+    return snapshot
+
+
+def _lane_data():
+    today = date.today()
+    return [{'ORDERNO': 'TODAY', 'PRODDATE': today, 'QTY_IZD_PVH': 1},
+            {'ORDERNO': 'NEXT', 'PRODDATE': today + timedelta(days=1), 'QTY_IZD_PVH': 2},
+            {'ORDERNO': 'PAST', 'PRODDATE': today - timedelta(days=1), 'QTY_IZD_PVH': 3}]
+
+
+def _short(ranges):
+    return [name.rsplit('!', 1)[1] for name in ranges]
+
+
+def test_lanes_are_written_in_priority_order_with_timestamp_last(lanes_sheet):
+    results, skipped = update_google_sheet_targets(_lane_data(), [lanes_sheet['target']])
+
+    assert results == {'основная': True} and skipped == set()
+    assert [_short(ranges) for ranges in lanes_sheet['spreadsheet'].value_calls] == [
+        ['D3', 'C3', 'C4', 'C5'], ['D4'], ['D5', 'A2']]
+    assert len(lanes_sheet['spreadsheet'].batch_updates) == 1
+
+
+def test_quota_error_defers_remaining_lanes_and_timestamp(lanes_sheet):
+    lanes_sheet['spreadsheet'].fail_at = 2
+
+    results, _ = update_google_sheet_targets(_lane_data(), [lanes_sheet['target']])
+
+    # Приоритетная полоса записана, остальные и время обновления отложены, цель не записана полностью
+    assert results == {'основная': False}
+    assert [_short(ranges) for ranges in lanes_sheet['spreadsheet'].value_calls] == [['D3', 'C3', 'C4', 'C5']]
+    assert lanes_sheet['spreadsheet'].batch_updates == []
+
+    # В следующем цикле отложенные полосы записываются заново
+    results, _ = update_google_sheet_targets(_lane_data(), [lanes_sheet['target']])
+    assert results == {'основная': True}
+    assert [_short(ranges) for ranges in lanes_sheet['spreadsheet'].value_calls[1:]] == [
+        ['D3', 'C3', 'C4', 'C5'], ['D4'], ['D5', 'A2']]
+
+
+def test_other_api_errors_are_not_deferred(lanes_sheet):
+    lanes_sheet['spreadsheet'].fail_at = 1
+    lanes_sheet['spreadsheet'].status_code = 500
+    calls = google_sheets.build_orders_write_calls(
+        lanes_sheet, google_sheets.build_orders_updates(_lane_data(), lanes_sheet)[0])
+
+    with pytest.raises(gspread.exceptions.APIError):
+        execute_orders_value_calls(lanes_sheet, [call for call in calls if call['kind'] == 'values'])
+
+
+def test_without_lanes_values_go_in_one_call(lanes_sheet, monkeypatch):
+    monkeypatch.setitem(PRIORITY_LANES_CONFIG, 'enabled', False)
+
+    update_google_sheet_targets(_lane_data(), [lanes_sheet['target']])
+    assert [_short(ranges) for ranges in lanes_sheet['spreadsheet'].value_calls] == [
+        ['D3', 'C3', 'C4', 'C5', 'D4', 'D5', 'A2']]
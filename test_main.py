@@ -0,0 +1,51 @@
+"""
+Тесты выборочного запуска main.py без обращения к БД и Google Sheets.
+"""
+import pytest
+
+import database
+import google_sheets
+import main
+from config import DEBOUNCE_CONFIG, SNAPSHOT_CONFIG, WATCHDOG_CONFIG
+
+
+@pytest.fixture
+def scoped_job(monkeypatch):
+    monkeypatch.setitem(SNAPSHOT_CONFIG, 'enabled', False)
+    monkeypatch.setitem(DEBOUNCE_CONFIG, 'enabled', False)
+    monkeypatch.setitem(WATCHDOG_CONFIG, 'enabled', False)
+    calls = {'requested': [], 'written': []}
+
+    def get_data_from_db_for_orders(order_numbers):
+        calls['requested'].append(order_numbers)
+        return [{'ORDERNO': order_no, 'PRODDATE': None} for order_no in order_numbers if order_no != 'missing']
+
+    def get_data_from_db_by_order(*args, **kwargs):
+        raise AssertionError("Выборочный запуск по номерам не должен выгружать окно")
+
+    def update_google_sheet_targets(data, targets=None):
+        calls['written'].append([row['ORDERNO'] for row in data])
+        return {'основная': True}, set()
+
+    monkeypatch.setattr(database, 'get_data_from_db_for_orders', get_data_from_db_for_orders)
+    monkeypatch.setattr(database, 'get_data_from_db_by_order', get_data_from_db_by_order)
+    monkeypatch.setattr(google_sheets, 'update_google_sheet_targets', update_google_sheet_targets)
+    return calls
+
+
+def test_orders_are_queried_by_number(scoped_job):
+    assert main.main(['run-once', '--orders', 'A-1', ' A-2', 'A-1']) == main.EXIT_OK
+    assert scoped_job['requested'] == [['A-1', 'A-2']]
+    assert scoped_job['written'] == [['A-1', 'A-2']]
+
+
+def test_missing_orders_give_non_zero_exit_code(scoped_job, caplog):
+    assert main.main(['run-once', '--orders', 'A-1', 'missing']) == main.EXIT_ORDERS_NOT_FOUND
+    assert scoped_job['written'] == [['A-1']]
+    assert 'missing' in caplog.text
+
+
+def test_orders_cannot_be_combined_with_window(scoped_job):
+    with pytest.raises(SystemExit) as exit_info:
+        main.main(['run-once', '--orders', 'A-1', '--since', '2024-01-01'])
+    assert exit_info.value.code == 2
@@ -0,0 +1,165 @@
+"""
+Тесты хранилища агрегатов метрик (metric_store.py) на поддельном соединении с Firebird.
+"""
+import re
+from datetime import date, datetime
+
+import pytest
+
+import metric_store
+from config import METRIC_STORE_CONFIG
+from metric_store import get_orders_by_proddate, get_store_rows, main, reset_metric_store, store_stats
+
+DATE1 = '2024-03-01'
+DATE2 = '2024-03-08'
+IN_WINDOW = datetime(2024, 3, 5, 10, 0)
+BEFORE_WINDOW = datetime(2024, 2, 1, 10, 0)
+
+
+class _Cursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+
+    def execute(self, sql, params=None):
+        if params is not None:
+            # Запрос окна: поддельная база сама решает, какие заказы в окне
+            self.result = [(orderid, *self.db.orders[orderid]) for orderid in self.db.window]
+            return
+        orderids = [int(x) for x in re.findall(r'\d+', sql.split('o.orderid in (', 1)[1].split(')', 1)[0])]
+        self.db.looked_up.append(sorted(orderids))
+        self.result = [(orderid, *self.db.orders[orderid]) for orderid in orderids
+                       if orderid in self.db.orders and self.db.orders[orderid][0] is not None]
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class _Firebird:
+    """Заказы: orderid -> (proddate, orderno, datemodified); window - orderid, которые вернет запрос окна."""
+
+    def __init__(self):
+        self.orders = {}
+        self.window = []
+        self.qty = {}
+        self.recounted = []
+        self.looked_up = []
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def add(self, orderid, proddate, qty, datemodified=IN_WINDOW, in_window=True):
+        self.orders[orderid] = (proddate, f'N{orderid}', datemodified)
+        self.qty[orderid] = qty
+        if in_window and orderid not in self.window:
+            self.window.append(orderid)
+
+
+@pytest.fixture
+def fdb_con(monkeypatch, tmp_path):
+    monkeypatch.setitem(METRIC_STORE_CONFIG, 'path', str(tmp_path / 'store.sqlite3'))
+    monkeypatch.setitem(METRIC_STORE_CONFIG, 'full_refresh_minutes', 360)
+    db = _Firebird()
+
+    def read_aggregates(con, orderids):
+        db.recounted.append(sorted(orderids))
+        return {(db.orders[orderid][0], db.orders[orderid][1]): {'QTY_IZD_PVH': db.qty[orderid]}
+                for orderid in orderids}
+
+    monkeypatch.setattr(metric_store, '_read_aggregates', read_aggregates)
+    reset_metric_store()
+    yield db
+    reset_metric_store()
+
+
+def _refresh(db):
+    columns, rows = get_store_rows(db, DATE1, DATE2, 'datemodified')
+    qty = columns.index('QTY_IZD_PVH')
+    return {row[1]: (row[0], row[qty]) for row in rows}
+
+
+def _stored(start=date(2024, 1, 1), end=date(2024, 12, 31)):
+    return {row['ORDERNO']: (row['PRODDATE'], row.get('QTY_IZD_PVH')) for row in get_orders_by_proddate(start, end)}
+
+
+def test_first_refresh_stores_window_orders(fdb_con):
+    fdb_con.add(1, date(2024, 3, 10), 5)
+    fdb_con.add(2, date(2024, 3, 11), 7)
+
+    assert _refresh(fdb_con) == {'N1': (date(2024, 3, 10), 5), 'N2': (date(2024, 3, 11), 7)}
+    assert fdb_con.recounted == [[1, 2]]
+    assert _stored() == {'N1': (date(2024, 3, 10), 5), 'N2': (date(2024, 3, 11), 7)}
+
+
+def test_only_new_and_modified_orders_are_recounted(fdb_con):
+    fdb_con.add(1, date(2024, 3, 10), 5)
+    fdb_con.add(2, date(2024, 3, 11), 7)
+    _refresh(fdb_con)
+
+    fdb_con.add(2, date(2024, 3, 11), 8, datemodified=datetime(2024, 3, 6, 9, 0))
+    fdb_con.add(3, date(2024, 3, 12), 1)
+    assert _refresh(fdb_con)['N2'] == (date(2024, 3, 11), 8)
+    assert fdb_con.recounted[-1] == [2, 3]
+
+
+def test_deleted_order_in_window_is_removed(fdb_con):
+    fdb_con.add(1, date(2024, 3, 10), 5)
+    fdb_con.add(2, date(2024, 3, 11), 7)
+    _refresh(fdb_con)
+
+    del fdb_con.orders[2]
+    fdb_con.window.remove(2)
+    assert _refresh(fdb_con) == {'N1': (date(2024, 3, 10), 5)}
+    assert fdb_con.looked_up == [[2]]
+    assert _stored() == {'N1': (date(2024, 3, 10), 5)}
+
+
+def test_order_with_cleared_proddate_is_removed(fdb_con):
+    fdb_con.add(1, date(2024, 3, 10), 5)
+    _refresh(fdb_con)
+
+    fdb_con.orders[1] = (None, 'N1', IN_WINDOW)
+    fdb_con.window.remove(1)
+    _refresh(fdb_con)
+    assert _stored() == {}
+
+
+def test_orders_outside_window_are_reconciled_on_full_refresh(fdb_con, monkeypatch):
+    fdb_con.add(1, date(2024, 3, 10), 5)
+    fdb_con.add(2, date(2024, 2, 5), 7, datemodified=BEFORE_WINDOW)
+    fdb_con.add(3, date(2024, 2, 6), 9, datemodified=BEFORE_WINDOW)
+    _refresh(fdb_con)
+
+    # Заказы 2 и 3 уходят из окна; вне окна их изменения видны только при полном пересчете
+    fdb_con.window = [1]
+    del fdb_con.orders[2]
+    fdb_con.orders[3] = (date(2024, 2, 9), 'N3', BEFORE_WINDOW)
+    _refresh(fdb_con)
+    assert fdb_con.looked_up == []
+    assert set(_stored()) == {'N1', 'N2', 'N3'}
+
+    monkeypatch.setitem(METRIC_STORE_CONFIG, 'full_refresh_minutes', 0)
+    fdb_con.recounted.clear()
+    _refresh(fdb_con)
+    assert fdb_con.looked_up == [[2, 3]]
+    # Дата производства заказа 3 обновлена без пересчета агрегатов: дата изменения прежняя
+    assert _stored() == {'N1': (date(2024, 3, 10), 5), 'N3': (date(2024, 2, 9), 9)}
+    assert fdb_con.recounted == [[1]]
+
+
+def test_stats_and_show_report_coverage(fdb_con, capsys):
+    assert store_stats()['covered_since'] is None
+    fdb_con.add(1, date(2024, 3, 10), 5)
+    _refresh(fdb_con)
+
+    stats = store_stats()
+    assert stats['orders'] == 1
+    assert stats['covered_since'] is not None and stats['covered_since'] == stats['refreshed_at']
+
+    assert main(['--path', METRIC_STORE_CONFIG['path'], 'show', '--date', '2024-03-10']) == 0
+    captured = capsys.readouterr()
+    assert '"ORDERNO": "N1"' in captured.out
+    assert stats['covered_since'] in captured.err
@@ -0,0 +1,96 @@
+"""
+Тесты планировщика запросов по заказам (metrics.py).
+"""
+import pytest
+
+import metrics
+from metrics import (MAX_IN_LIST_SIZE, aggregate_metric_keys, plan_metric_queries, plan_metric_queries_for_orders,
+                     sql_in_condition, standalone_metric_queries)
+from window_policy import WINDOW_POLICIES, window_params
+
+
+def test_sql_in_condition_empty_list_is_false():
+    assert sql_in_condition('o.orderid', []) == '1 = 0'
+
+
+def test_sql_in_condition_single_chunk():
+    assert sql_in_condition('o.orderid', [3, 1, 2]) == 'o.orderid in (3, 1, 2)'
+
+
+def test_sql_in_condition_splits_long_lists():
+    ids = list(range(MAX_IN_LIST_SIZE * 2 + 1))
+    condition = sql_in_condition('o.orderid', ids)
+
+    assert condition.startswith('(') and condition.endswith(')')
+    parts = condition[1:-1].split(' or ')
+    assert len(parts) == 3
+    assert parts[2] == f'o.orderid in ({MAX_IN_LIST_SIZE * 2})'
+    listed = [int(x) for part in parts for x in part[len('o.orderid in ('):-1].split(', ')]
+    assert listed == ids
+
+
+def test_sql_in_condition_rejects_non_integer_ids():
+    with pytest.raises(ValueError):
+        sql_in_condition('o.orderid', ['1; drop table orders'])
+
+
+def test_plan_groups_metrics_by_join_path():
+    queries = plan_metric_queries()
+
+    join_paths = {metric['join_path'] for metric in metrics.METRICS if 'join_path' in metric}
+    assert set(queries) == join_paths | set(standalone_metric_queries())
+    for metric in metrics.METRICS:
+        if 'join_path' in metric:
+            assert f"as {metric['key'].lower()}" in queries[metric['join_path']]
+
+
+def test_plan_filters_rows_when_all_metrics_have_conditions():
+    query = plan_metric_queries()['itemsdetail']
+    assert "and ((itd.grgoodsid = 46110) or" in query
+    # У путей с безусловными агрегатами (orders) дополнительного фильтра нет
+    assert ' or ' not in plan_metric_queries()['orders']
+
+
+def test_plan_uses_reference_sets_when_available():
+    queries = plan_metric_queries({'iron_set_ids': [5, 7], 'sandwich_group_ids': [9]})
+
+    assert 'its.setid in (5, 7)' in queries['itemssets']
+    assert 'left join groupgoods gg' not in queries['itemssets']
+    assert 'itd.grgoodsid in (9)' in queries['itemsdetail']
+
+
+def test_plan_falls_back_to_conditions_without_reference_sets():
+    query = plan_metric_queries({'sandwich_group_ids': [9]})['itemssets']
+    assert "gg.marking like '%Водоотлив%'" in query
+
+
+@pytest.mark.parametrize('policy', WINDOW_POLICIES)
+def test_plan_parameters_match_window_params(policy):
+    params = window_params('2024-02-01', '2024-02-09', policy)
+    for name, query in plan_metric_queries(None, policy).items():
+        assert query.count('?') == len(params), name
+
+
+def test_plan_for_orders_has_no_parameters():
+    queries = plan_metric_queries_for_orders([10, 11])
+
+    assert set(queries) == set(plan_metric_queries()) - set(standalone_metric_queries())
+    for query in queries.values():
+        assert '?' not in query
+        assert 'o.orderid in (10, 11)' in query
+
+
+def test_aggregate_metric_keys_follow_registry_order():
+    keys = aggregate_metric_keys()
+    registry_keys = [metric['key'] for metric in metrics.METRICS if 'join_path' in metric]
+    assert keys == registry_keys
+
+
+def test_plan_for_orders_can_include_standalone_queries():
+    queries = plan_metric_queries_for_orders([10, 11], standalone=True)
+
+    assert set(queries) == set(plan_metric_queries())
+    for name in standalone_metric_queries():
+        assert '{window_condition}' not in queries[name]
+        assert 'o.orderid in (10, 11) and o.proddate is not null' in queries[name]
+        assert '?' not in queries[name]
@@ -0,0 +1,73 @@
+"""
+Тесты сохранения и чтения снимков выгрузки (snapshots.py).
+"""
+import csv
+import gzip
+from datetime import date, datetime
+from decimal import Decimal
+
+from snapshots import list_snapshots, load_snapshot, save_snapshot
+
+
+def _round_trip(tmp_path, data):
+    path = save_snapshot(data, directory=str(tmp_path), keep_files=5)
+    assert path is not None
+    return load_snapshot(path)
+
+
+def test_round_trip_restores_types(tmp_path):
+    data = [
+        {'PRODDATE': date(2024, 2, 1), 'ORDERNO': '100', 'QTY_IZD_PVH': 5, 'TOTALPRICE': Decimal('1001.50'),
+         'READINESS': 'Готов', 'STATE_CHANGE_DATE': datetime(2024, 2, 1, 10, 30), 'RATIO': 0.1},
+        {'PRODDATE': date(2024, 2, 2), 'ORDERNO': '101', 'QTY_IZD_PVH': None, 'TOTALPRICE': None,
+         'READINESS': None, 'STATE_CHANGE_DATE': None, 'RATIO': None},
+    ]
+    assert _round_trip(tmp_path, data) == data
+
+
+def test_round_trip_keeps_none_and_empty_text_apart(tmp_path):
+    data = [
+        {'ORDERNO': '1', 'ORDER_STATE_NAME': None, 'NOTE': ''},
+        {'ORDERNO': '2', 'ORDER_STATE_NAME': '', 'NOTE': None},
+        {'ORDERNO': '3', 'ORDER_STATE_NAME': '\\N', 'NOTE': '\\path'},
+    ]
+    assert _round_trip(tmp_path, data) == data
+
+
+def test_round_trip_all_none_column(tmp_path):
+    data = [{'ORDERNO': '1', 'ORDER_STATE_NAME': None}, {'ORDERNO': '2', 'ORDER_STATE_NAME': None}]
+    assert _round_trip(tmp_path, data) == data
+
+
+def test_missing_fields_come_back_as_none(tmp_path):
+    data = [{'ORDERNO': '1', 'QTY_IZD_PVH': 3}, {'ORDERNO': '2', 'READINESS': 'Готов'}]
+    loaded = _round_trip(tmp_path, data)
+    assert loaded == [{'ORDERNO': '1', 'QTY_IZD_PVH': 3, 'READINESS': None},
+                      {'ORDERNO': '2', 'QTY_IZD_PVH': None, 'READINESS': 'Готов'}]
+
+
+def test_columns_follow_metric_registry_order(tmp_path):
+    path = save_snapshot([{'EXTRA': 1, 'QTY_RAZDV': 2, 'ORDERNO': '1', 'PRODDATE': date(2024, 2, 1),
+                           'QTY_IZD_PVH': 3}], directory=str(tmp_path))
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+        header = next(csv.reader(f))
+    assert [item.rsplit(':', 1)[0] for item in header] == ['PRODDATE', 'ORDERNO', 'QTY_IZD_PVH', 'QTY_RAZDV', 'EXTRA']
+
+
+def test_legacy_str_columns_are_read_as_text(tmp_path):
+    path = tmp_path / 'orders_20240201_000000.csv.gz'
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['ORDERNO:str', 'QTY_IZD_PVH:int'])
+        writer.writerow(['100', ''])
+    assert load_snapshot(str(path)) == [{'ORDERNO': '100', 'QTY_IZD_PVH': None}]
+
+
+def test_old_snapshots_are_removed(tmp_path):
+    for name in ('orders_20240101_000000.csv.gz', 'orders_20240102_000000.csv.gz'):
+        (tmp_path / name).write_bytes(b'')
+    save_snapshot([{'ORDERNO': '1'}], directory=str(tmp_path), keep_files=2)
+
+    snapshots = list_snapshots(str(tmp_path))
+    assert len(snapshots) == 2
+    assert not snapshots[0].endswith('orders_20240101_000000.csv.gz')
@@ -0,0 +1,101 @@
+"""
+Тесты политики окна выгрузки (window_policy.py).
+"""
+from datetime import date
+
+import pytest
+
+import window_policy
+from config import DAILY_SUMMARY_CONFIG, SQL_QUERIES_BY_ORDER, SQL_WINDOW_ORDERS, WINDOW_POLICY_CONFIG
+from window_policy import (WINDOW_POLICIES, proddate_range, summary_proddate_range, window_condition, window_params,
+                           window_query)
+
+TODAY = date(2024, 2, 5)
+
+
+@pytest.fixture(autouse=True)
+def proddate_window(monkeypatch):
+    monkeypatch.setitem(WINDOW_POLICY_CONFIG, 'policy', 'datemodified')
+    monkeypatch.setitem(WINDOW_POLICY_CONFIG, 'proddate_days_back', 1)
+    monkeypatch.setitem(WINDOW_POLICY_CONFIG, 'proddate_days_ahead', 7)
+    monkeypatch.setitem(DAILY_SUMMARY_CONFIG, 'enabled', False)
+    monkeypatch.setitem(DAILY_SUMMARY_CONFIG, 'days_back', 7)
+    monkeypatch.setitem(DAILY_SUMMARY_CONFIG, 'days_ahead', 5)
+
+
+def test_proddate_range_is_relative_to_today():
+    assert proddate_range(TODAY) == (date(2024, 2, 4), date(2024, 2, 12))
+
+
+def test_datemodified_policy_keeps_previous_condition():
+    assert window_condition('datemodified') == "o.datemodified between ? and ? and o.proddate is not null"
+    assert window_params('2024-01-29', '2024-02-06', 'datemodified', TODAY) == ('2024-01-29', '2024-02-06')
+
+
+def test_proddate_policy_ignores_datemodified_bounds():
+    assert window_condition('proddate') == "o.proddate between ? and ?"
+    assert window_params('2024-01-29', '2024-02-06', 'proddate', TODAY) == ('2024-02-04', '2024-02-12')
+
+
+@pytest.mark.parametrize('policy, joiner', [('union', ' or '), ('intersection', ' and ')])
+def test_combined_policies_use_both_ranges(policy, joiner):
+    condition = window_condition(policy)
+
+    assert f"o.datemodified between ? and ?{joiner}o.proddate between ? and ?" in condition
+    assert window_params('2024-01-29', '2024-02-06', policy, TODAY) == (
+        '2024-01-29', '2024-02-06', '2024-02-04', '2024-02-12')
+
+
+def test_default_policy_comes_from_config(monkeypatch):
+    monkeypatch.setitem(WINDOW_POLICY_CONFIG, 'policy', 'proddate')
+    assert window_condition() == window_condition('proddate')
+    assert window_params('2024-01-29', '2024-02-06', today=TODAY) == ('2024-02-04', '2024-02-12')
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        window_condition('everything')
+    with pytest.raises(ValueError):
+        window_params('2024-01-29', '2024-02-06', 'everything')
+
+
+@pytest.mark.parametrize('policy', WINDOW_POLICIES)
+def test_window_query_fills_templates(policy):
+    templates = [SQL_WINDOW_ORDERS, *SQL_QUERIES_BY_ORDER.values()]
+    params = window_params('2024-01-29', '2024-02-06', policy, TODAY)
+    for template in templates:
+        query = window_query(template, policy)
+        assert '{window_condition}' not in query
+        assert query.count('?') == len(params)
+
+
+def test_window_params_default_today(monkeypatch):
+    class FixedDate(date):
+        @classmethod
+        def today(cls):
+            return TODAY
+
+    monkeypatch.setattr(window_policy, 'date', FixedDate)
+    assert window_params('2024-01-29', '2024-02-06', 'proddate') == ('2024-02-04', '2024-02-12')
+
+
+def test_summary_extends_default_window_only(monkeypatch):
+    monkeypatch.setitem(DAILY_SUMMARY_CONFIG, 'enabled', True)
+
+    assert summary_proddate_range(TODAY) == (date(2024, 1, 29), date(2024, 2, 10))
+    assert window_condition() == ("((o.datemodified between ? and ? and o.proddate is not null) "
+                                  "or o.proddate between ? and ?)")
+    assert window_params('2024-01-29', '2024-02-06', today=TODAY) == (
+        '2024-01-29', '2024-02-06', '2024-01-29', '2024-02-10')
+    # Явно заданное окно (догрузка, выборочный запуск) выгружается без диапазона сводки
+    assert window_condition('datemodified') == "o.datemodified between ? and ? and o.proddate is not null"
+    assert window_params('2024-01-29', '2024-02-06', 'datemodified', TODAY) == ('2024-01-29', '2024-02-06')
+
+
+@pytest.mark.parametrize('policy', WINDOW_POLICIES)
+def test_summary_window_fills_templates(monkeypatch, policy):
+    monkeypatch.setitem(DAILY_SUMMARY_CONFIG, 'enabled', True)
+    monkeypatch.setitem(WINDOW_POLICY_CONFIG, 'policy', policy)
+    params = window_params('2024-01-29', '2024-02-06', today=TODAY)
+    for template in [SQL_WINDOW_ORDERS, *SQL_QUERIES_BY_ORDER.values()]:
+        assert window_query(template).count('?') == len(params)
@@ -0,0 +1,126 @@
+"""
+Политика окна выгрузки по заказам.
+
+Запросы по заказам отбирают заказы по окну, которое задает цикл (main.job, async_runner):
+границы date1/date2 по o.datemodified. При этом заказы, запланированные в производство
+на ближайшие дни, но давно не менявшиеся, не обновляются, а старые заказы, которые
+кто-то открыл и сохранил, выгружаются заново. Политика (WINDOW_POLICY_CONFIG['policy'])
+определяет, как окно по дате изменения сочетается с диапазоном дат производства
+(относительно сегодняшнего дня):
+    datemodified - только дата изменения (прежнее поведение);
+    proddate     - только дата производства;
+    union        - заказ попадает в окно по любому из условий;
+    intersection - заказ должен попасть в окно по обоим условиям.
+
+Политика применяется только к окну синхронизации по умолчанию. Явно заданный период
+(догрузка backfill.py, выборочный запуск main.py, план с нестандартным окном) выгружается
+с политикой datemodified, иначе при proddate/union вместо заданного периода выгружалось бы
+текущее окно по дате производства.
+
+При включенной сводке "Общий" (DAILY_SUMMARY_CONFIG) окно по умолчанию при любой политике
+дополняется диапазоном дат производства сводки (summary_proddate_range): сводка считается
+из выгрузки цикла и должна содержать все заказы своих дат, а не только измененные.
+Поэтому на лист "Заказы" попадают и давно не менявшиеся заказы этого диапазона, как при union.
+
+Каждое условие - диапазон по одному столбцу без функций над ним, поэтому Firebird
+использует индексы orders по datemodified и proddate; для union условия соединяются
+через OR, и Firebird объединяет выборки двух индексов (битовые карты), не читая
+таблицу целиком. Стоимость политик можно сравнить профилированием:
+    python database.py --profile --window-policy union
+"""
+from datetime import date, timedelta
+from config import DAILY_SUMMARY_CONFIG, WINDOW_POLICY_CONFIG
+
+WINDOW_POLICIES = ('datemodified', 'proddate', 'union', 'intersection')
+
+_DATEMODIFIED_CONDITION = "o.datemodified between ? and ?"
+_PRODDATE_CONDITION = "o.proddate between ? and ?"
+
+
+def _resolve_policy(policy: str | None) -> str:
+    policy = policy or WINDOW_POLICY_CONFIG['policy']
+    if policy not in WINDOW_POLICIES:
+        raise ValueError(f"Неизвестная политика окна выгрузки: {policy} (допустимы: {', '.join(WINDOW_POLICIES)})")
+    return policy
+
+
+def proddate_range(today: date = None) -> tuple[date, date]:
+    """Возвращает диапазон дат производства окна выгрузки (включительно)."""
+    today = today or date.today()
+    return (today - timedelta(days=WINDOW_POLICY_CONFIG['proddate_days_back']),
+            today + timedelta(days=WINDOW_POLICY_CONFIG['proddate_days_ahead']))
+
+
+def summary_proddate_range(today: date = None) -> tuple[date, date]:
+    """Возвращает диапазон дат производства сводки "Общий" (включительно)."""
+    today = today or date.today()
+    return (today - timedelta(days=DAILY_SUMMARY_CONFIG['days_back']),
+            today + timedelta(days=DAILY_SUMMARY_CONFIG['days_ahead']))
+
+
+def _includes_summary(policy: str | None) -> bool:
+    """Окно по умолчанию (политика не задана явно) дополняется диапазоном сводки, если она включена."""
+    return policy is None and DAILY_SUMMARY_CONFIG['enabled']
+
+
+def _policy_condition(policy: str) -> str:
+    if policy == 'datemodified':
+        return f"{_DATEMODIFIED_CONDITION} and o.proddate is not null"
+    if policy == 'proddate':
+        return _PRODDATE_CONDITION
+    if policy == 'intersection':
+        return f"{_DATEMODIFIED_CONDITION} and {_PRODDATE_CONDITION}"
+    return f"({_DATEMODIFIED_CONDITION} or {_PRODDATE_CONDITION}) and o.proddate is not null"
+
+
+def _policy_params(date1_str: str, date2_str: str, policy: str, today: date = None) -> tuple:
+    datemodified_params = (date1_str, date2_str)
+    if policy == 'datemodified':
+        return datemodified_params
+    start, end = proddate_range(today)
+    proddate_params = (start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+    if policy == 'proddate':
+        return proddate_params
+    return datemodified_params + proddate_params
+
+
+def window_condition(policy: str = None) -> str:
+    """
+    Возвращает условие WHERE окна выгрузки для таблицы orders (псевдоним o).
+
+    Args:
+        policy: Политика окна (по умолчанию из WINDOW_POLICY_CONFIG, окно дополняется
+            диапазоном сводки "Общий", если она включена).
+
+    Returns:
+        Условие с параметрами, значения которых возвращает window_params.
+    """
+    condition = _policy_condition(_resolve_policy(policy))
+    if _includes_summary(policy):
+        return f"(({condition}) or {_PRODDATE_CONDITION})"
+    return condition
+
+
+def window_params(date1_str: str, date2_str: str, policy: str = None, today: date = None) -> tuple:
+    """
+    Возвращает параметры условия window_condition.
+
+    Args:
+        date1_str: Начало окна по o.datemodified (ГГГГ-ММ-ДД).
+        date2_str: Конец окна по o.datemodified.
+        policy: Политика окна (по умолчанию из WINDOW_POLICY_CONFIG).
+        today: Текущая дата (для воспроизводимых проверок).
+
+    Returns:
+        Кортеж параметров в порядке условия.
+    """
+    params = _policy_params(date1_str, date2_str, _resolve_policy(policy), today)
+    if _includes_summary(policy):
+        start, end = summary_proddate_range(today)
+        params += (start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+    return params
+
+
+def window_query(template: str, policy: str = None) -> str:
+    """Подставляет условие окна выгрузки в шаблон SQL (поле {window_condition})."""
+    return template.format(window_condition=window_condition(policy))